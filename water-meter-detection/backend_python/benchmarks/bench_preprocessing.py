@@ -0,0 +1,78 @@
+"""
+Microbenchmark del preprocesamiento: `process_image` (recorte + doble
+conversión de color) frente a `PreprocessingEngine` (recorte, gris y
+letterbox fusionados sobre buffers reutilizables).
+
+Uso:
+    python benchmarks/bench_preprocessing.py [--iterations 200] [--batch 8]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+import preprocessing  # noqa: E402
+
+# Resoluciones que envía la ESP32-CAM (ver client_esp32/src/main.cpp)
+FRAME_SIZES = {
+    "UXGA": (1200, 1600),
+    "SVGA": (600, 800),
+}
+
+
+def _legacy_letterbox(image, size=preprocessing.MODEL_INPUT_SIZE):
+    """Flujo actual completo: process_image + letterbox que haría YOLO"""
+    image = preprocessing.process_image(image)
+    h, w = image.shape[:2]
+    scale = size / max(h, w)
+    resized = cv2.resize(image, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_LINEAR)
+    out = np.full((size, size, 3), preprocessing.PAD_VALUE, dtype=np.uint8)
+    top, left = (size - resized.shape[0]) // 2, (size - resized.shape[1]) // 2
+    out[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return out
+
+
+def _timeit(fn, iterations):
+    fn()  # warm-up (asigna buffers del motor)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return sum(samples) / len(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    engine = preprocessing.PreprocessingEngine()
+
+    print(f"{'frame':<6} {'variante':<28} {'media ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for label, shape in FRAME_SIZES.items():
+        frame = rng.integers(0, 256, size=(*shape, 3), dtype=np.uint8)
+        frames = [frame] * args.batch
+
+        cases = {
+            "process_image": lambda: preprocessing.process_image(frame),
+            "process_image + letterbox": lambda: _legacy_letterbox(frame),
+            "engine.process": lambda: engine.process(frame),
+            f"engine.process_batch / {args.batch}": lambda: engine.process_batch(frames),
+        }
+        for name, fn in cases.items():
+            mean, p50, p95 = _timeit(fn, args.iterations)
+            if name.startswith("engine.process_batch"):
+                mean, p50, p95 = mean / args.batch, p50 / args.batch, p95 / args.batch
+            print(f"{label:<6} {name:<28} {mean:>9.3f} {p50:>8.3f} {p95:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
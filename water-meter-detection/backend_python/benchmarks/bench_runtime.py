@@ -0,0 +1,66 @@
+"""
+Benchmark de runtimes del modelo: tiempo de arranque (carga + warm-up) y
+latencia por frame para cada backend disponible (PyTorch, ONNX, OpenVINO).
+
+Los backends exportados deben existir (ver `python src/runtime.py export`);
+los que falten se omiten.
+
+Uso:
+    python benchmarks/bench_runtime.py [--backends pytorch onnx openvino] [--iterations 50] [--batch 8]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+import preprocessing  # noqa: E402
+from runtime import BACKENDS, DEFAULT_MODEL_PATH, ModelRuntime  # noqa: E402
+
+
+def _frames(count, imgsz):
+    rng = np.random.default_rng(0)
+    engine = preprocessing.PreprocessingEngine(input_size=imgsz)
+    # Frame UXGA sintético pasado por el mismo preprocesamiento del servidor
+    raw = rng.integers(0, 256, size=(1200, 1600, 3), dtype=np.uint8)
+    return [engine.process(raw).copy() for _ in range(count)]
+
+
+def _latency(model, frames, imgsz, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        model(frames, conf=0.4, imgsz=imgsz, save=False, verbose=False)
+        samples.append((time.perf_counter() - start) * 1000 / len(frames))
+    samples.sort()
+    return sum(samples) / len(samples), samples[int(len(samples) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", type=Path, default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'backend':<10} {'carga ms':>9} {'warm-up ms':>11} {'frame ms (b=1)':>15} "
+          f"{'p95':>7} {f'frame ms (b={args.batch})':>15} {'p95':>7}")
+    for backend in args.backends:
+        runtime = ModelRuntime(args.model, backend)
+        if not runtime.path.exists():
+            print(f"{backend:<10} (omitido: no existe {runtime.path.name})")
+            continue
+
+        runtime.warmup()
+        model = runtime.get()
+        single_mean, single_p95 = _latency(model, _frames(1, runtime.imgsz), runtime.imgsz, args.iterations)
+        batch_mean, batch_p95 = _latency(model, _frames(args.batch, runtime.imgsz), runtime.imgsz, args.iterations)
+        print(f"{backend:<10} {runtime.load_ms:>9.0f} {runtime.warmup_ms:>11.0f} {single_mean:>15.1f} "
+              f"{single_p95:>7.1f} {batch_mean:>15.1f} {batch_p95:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import cv2
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+
+class ImageArchiver:
+    """
+    Archivo opcional y muestreado de imágenes, fuera del camino crítico.
+
+    Las escrituras se hacen en un hilo de fondo; si el disco no da abasto y hay
+    más de `max_pending` escrituras pendientes, el frame se descarta en lugar
+    de frenar la inferencia.
+
+    Args:
+        directory: Carpeta destino (imágenes crudas; anotadas en `YOLO/`)
+        sample_every: Guarda 1 de cada N frames (0 desactiva el muestreo)
+        keep_failed: Guarda siempre los frames con lectura fallida
+        keep_annotated: Guarda también la imagen anotada por YOLO
+        max_pending: Escrituras en cola antes de descartar
+    """
+
+    def __init__(self, directory:Path, sample_every:int=0, keep_failed:bool=True,
+                 keep_annotated:bool=True, max_pending:int=64):
+        self.directory = Path(directory)
+        self.annotated_dir = self.directory / "YOLO"
+        self.sample_every = sample_every
+        self.keep_failed = keep_failed
+        self.keep_annotated = keep_annotated
+        self.max_pending = max_pending
+
+        self._counter = itertools.count(1)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+        self.saved = 0
+        self.dropped = 0
+
+    def should_archive(self, failed:bool):
+        """Decide (muestreo 1 de N o fallo) si un frame debe archivarse"""
+        if failed and self.keep_failed:
+            return True
+        return self.sample_every > 0 and next(self._counter) % self.sample_every == 0
+
+    def submit(self, data:bytes, origin:str, failed:bool=False, annotated=None):
+        """Programa el guardado de un frame ya seleccionado por `should_archive`"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending += 1
+        self._executor.submit(self._write, data, origin, failed, annotated)
+        return True
+
+    def _write(self, data, origin, failed, annotated):
+        try:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            suffix = "_fail" if failed else ""
+            name = f"img_{timestamp}_{origin}{suffix}.jpg"
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / name).write_bytes(data)
+
+            if self.keep_annotated and annotated is not None:
+                self.annotated_dir.mkdir(parents=True, exist_ok=True)
+                cv2.imwrite(str(self.annotated_dir / name), annotated)
+            self.saved += 1
+        except Exception as e:
+            print(f"⚠️ Error archivando imagen: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            "sample_every": self.sample_every,
+            "keep_failed": self.keep_failed,
+            "pending": self._pending,
+            "saved": self.saved,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,218 @@
+import asyncio
+import random
+import time
+
+import httpx
+
+
+class DjangoForwarder:
+    """
+    Replayer asíncrono que drena el outbox local hacia Django por lotes.
+
+    Reclama lecturas pendientes del `ReadingOutbox` y las envía a
+    `/api/public/readings/bulk/` cuando se acumulan `batch_size` nuevas
+    lecturas o han pasado `flush_interval` segundos, reutilizando conexiones
+    keep-alive de un pool `httpx.AsyncClient`. Solo los rechazos de validación
+    (400 o errores por índice en un 200/201/207) se marcan `rejected`; ante
+    cualquier otra respuesta (5xx, 429, 401/403/404, redirecciones...) o un
+    fallo de conexión las filas vuelven a `pending` y el drenado se pausa con
+    backoff exponencial y jitter; nada se descarta.
+    Los errores inesperados (outbox bloqueado, respuesta 2xx que no es JSON)
+    se tratan igual que un fallo transitorio: el replayer sigue vivo.
+
+    Args:
+        bulk_url: URL del endpoint bulk de Django
+        outbox: ReadingOutbox del que se leen las lecturas
+        batch_size: Lecturas máximas por petición (el endpoint acepta 1000)
+        flush_interval: Segundos máximos que una lectura espera antes de enviarse
+        backoff_base: Espera inicial tras un fallo (segundos)
+        backoff_max: Espera máxima tras fallos consecutivos (segundos)
+        timeout: Timeout por petición (segundos)
+        max_connections: Tamaño del pool de conexiones
+    """
+
+    def __init__(self, bulk_url:str, outbox, batch_size:int=100, flush_interval:float=2.0,
+                 backoff_base:float=0.5, backoff_max:float=60.0, timeout:float=5.0,
+                 max_connections:int=4):
+        self.bulk_url = bulk_url
+        self.outbox = outbox
+        self.batch_size = min(batch_size, 1000)
+        self.flush_interval = flush_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+        self._new = 0
+        self._failures = 0
+        self._wakeup = None
+        self._client = None
+        self._task = None
+        self._closing = False
+
+        self.sent = 0
+        self.rejected = 0
+        self.retries = 0
+        self.last_error = None
+        self.last_flush_ms = None
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+        )
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detiene el replayer; lo pendiente queda en el outbox para el próximo arranque"""
+        self._closing = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def notify(self):
+        """Avisa de una nueva lectura en el outbox (adelanta el envío al llenar un lote)"""
+        self._new += 1
+        if self._new >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        # Al arrancar se drena primero lo que haya quedado pendiente
+        while not self._closing:
+            try:
+                delay = await self.drain()
+            except Exception as e:
+                # Salvaguarda: un error inesperado no debe detener el replayer
+                self.last_error = f"{type(e).__name__}: {e}"
+                delay = self._backoff()
+            if delay:
+                # Backoff: nuevas lecturas no adelantan el reintento, solo stop()
+                await self._sleep(delay, interruptible=False)
+            else:
+                await self._sleep(self.flush_interval)
+            self._new = 0
+
+    async def _sleep(self, seconds, interruptible=True):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + seconds
+        while not self._closing:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return
+            self._wakeup.clear()
+            if interruptible:
+                return
+
+    async def drain(self):
+        """Envía lotes hasta vaciar el outbox; retorna la espera de backoff si hubo fallo"""
+        while not self._closing:
+            try:
+                batch = await asyncio.to_thread(self.outbox.claim, self.batch_size)
+            except Exception as e:
+                # p. ej. "database is locked": nada quedó reclamado, se reintenta
+                self.last_error = f"{type(e).__name__}: {e}"
+                return self._backoff()
+            if not batch:
+                return None
+            if not await self._send(batch):
+                return self._backoff()
+            self._failures = 0
+            if len(batch) < self.batch_size:
+                return None
+        return None
+
+    def _backoff(self):
+        """Registra un fallo y retorna la espera (exponencial con jitter) antes de reintentar"""
+        self._failures += 1
+        self.retries += 1
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (self._failures - 1)))
+        delay *= random.uniform(0.5, 1.0)
+        print(f"❌ Envío a Django fallido ({self.last_error}); reintento en {delay:.1f} s")
+        return delay
+
+    async def _release(self, ids):
+        try:
+            await asyncio.to_thread(self.outbox.release, ids, self.last_error)
+        except Exception as e:
+            # Si no se pueden liberar, vuelven a estar disponibles al vencer el lease
+            print(f"⚠️ No se pudieron liberar {len(ids)} lecturas del outbox: {type(e).__name__}: {e}")
+
+    async def _send(self, batch):
+        payload = {"readings": [
+            {
+                "meter_id": row["meter_id"],
+                "accumulated_value": float(row["reading"]),
+                "timestamp": row["captured_at"],
+            }
+            for row in batch
+        ]}
+        ids = [row["id"] for row in batch]
+
+        start = time.perf_counter()
+        try:
+            response = await self._client.post(self.bulk_url, json=payload)
+        except httpx.HTTPError as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            await self._release(ids)
+            return False
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+        if response.status_code in (200, 201, 207):
+            try:
+                body = response.json()
+                errors = {ids[e["index"]]: e.get("errors") for e in body.get("errors", [])}
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                # 2xx con un cuerpo inesperado (p. ej. un proxy): se reintenta el lote
+                self.last_error = f"{response.status_code} con respuesta no válida: {type(e).__name__}: {e}"
+                await self._release(ids)
+                return False
+        elif response.status_code == 400:
+            # Rechazo de validación del serializer bulk: reenviar no lo arreglaría
+            self.last_error = f"{response.status_code}: {response.text[:200]}"
+            errors = dict.fromkeys(ids, self.last_error)
+        else:
+            # 5xx, 429 y cualquier otro código (401/403/404/413, redirecciones):
+            # URL, token o proxy mal configurados no deben descartar lecturas
+            self.last_error = f"{response.status_code}: {response.text[:200]}"
+            await self._release(ids)
+            return False
+
+        sent = [row_id for row_id in ids if row_id not in errors]
+        try:
+            await asyncio.to_thread(self.outbox.mark_sent, sent)
+            await asyncio.to_thread(self.outbox.mark_rejected, errors)
+        except Exception as e:
+            # Reenviarlas es inocuo: Django descarta duplicados por (contador, timestamp)
+            self.last_error = f"{type(e).__name__}: {e}"
+            await self._release(ids)
+            return False
+        self.sent += len(sent)
+        self.rejected += len(errors)
+
+        if errors:
+            print(f"⚠️ Django rechazó {len(errors)} de {len(batch)} lecturas: {list(errors.values())[:3]}")
+        else:
+            print(f"✅ {len(batch)} lecturas enviadas a Django")
+        return True
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "consecutive_failures": self._failures,
+            "last_error": self.last_error,
+            "last_flush_ms": round(self.last_flush_ms, 1) if self.last_flush_ms is not None else None,
+        }
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """La cola de inferencia alcanzó su capacidad máxima"""
+
+
+class _StageStats:
+    """Ventana deslizante de latencias (ms) para una etapa del pipeline"""
+
+    def __init__(self, window:int=500):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, value_ms:float):
+        self.samples.append(value_ms)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {"count": self.count, "avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return {
+            "count": self.count,
+            "avg_ms": round(sum(ordered) / len(ordered), 2),
+            "p95_ms": round(p95, 2),
+            "max_ms": round(ordered[-1], 2),
+        }
+
+
+class InferenceScheduler:
+    """
+    Planificador de inferencia por micro-lotes.
+
+    Los handlers encolan frames con `submit()` y esperan su propio resultado.
+    Un worker agrupa los frames pendientes hasta `max_batch_size` o hasta que
+    pasan `max_wait_ms` desde el primer frame, y ejecuta `infer_batch` una sola
+    vez por lote en un pool de hilos, fuera del event loop.
+
+    Args:
+        infer_batch: Función síncrona lista[frame] -> lista[resultado]
+        max_batch_size: Número máximo de frames por llamada al modelo
+        max_wait_ms: Tiempo máximo de espera para completar un lote
+        max_queue_size: Capacidad de la cola (rechaza con QueueFullError)
+        workers: Hilos del pool de inferencia
+    """
+
+    def __init__(self, infer_batch, max_batch_size:int=8, max_wait_ms:float=25,
+                 max_queue_size:int=256, workers:int=1):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+        self.workers = workers
+
+        self._queue = None
+        self._executor = None
+        self._tasks = []
+
+        self._batch_sizes = deque(maxlen=500)
+        self._rejected = 0
+        self._queue_wait = _StageStats()
+        self._inference = _StageStats()
+        self._total = _StageStats()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="yolo")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def submit(self, frame):
+        """Encola un frame y espera el resultado de su lote"""
+        if self._queue is None:
+            raise RuntimeError("InferenceScheduler no iniciado")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((frame, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise QueueFullError(f"Cola de inferencia llena ({self.max_queue_size} frames)")
+        return await future
+
+    async def _collect_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self._queue_wait.add((started - enqueued) * 1000)
+
+            frames = [frame for frame, _, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.infer_batch, frames)
+                error = None
+            except Exception as e:
+                results, error = None, e
+
+            finished = time.perf_counter()
+            self._inference.add((finished - started) * 1000)
+            self._batch_sizes.append(len(batch))
+
+            for idx, (_, future, enqueued) in enumerate(batch):
+                self._total.add((finished - enqueued) * 1000)
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results[idx])
+
+    def stats(self):
+        """Métricas para ajustar tamaño de lote y tiempo de espera"""
+        sizes = self._batch_sizes
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "rejected": self._rejected,
+            "batches": self._inference.count,
+            "avg_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+            "latency": {
+                "queue_wait": self._queue_wait.summary(),
+                "inference": self._inference.summary(),
+                "total": self._total.summary(),
+            },
+        }
@@ -1,45 +1,55 @@
+import os
+import asyncio
 import preprocessing
-import pandas as pd
 import uvicorn
-import cv2
-import shutil
-import requests
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, File, UploadFile
-from ultralytics import YOLO
 from pathlib import Path
-from datetime import datetime
-
-# App initialization
-app = FastAPI()
+from inference import InferenceScheduler
+from archive import ImageArchiver
+from runtime import ModelRuntime
+from django_client import DjangoForwarder
+from outbox import ReadingOutbox
 
 # Route configuration with pathlib
 BASE_DIR = Path(__file__).parent
 MODEL_PATH = (BASE_DIR / "../trained_models/local/best_m.pt").resolve()
 CAPTURED_DIR = (BASE_DIR / "../captured_images").resolve()
 CAPTURED_DIR.mkdir(parents=True, exist_ok=True)
-CSV_FILE = Path(__file__).parent / "../medidas_contador.csv"
+OUTBOX_DB = (BASE_DIR / "../outbox.db").resolve()
 
-# Load Model
-model = YOLO(MODEL_PATH)
+# Model runtime (lazy, loaded once per worker process at startup)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "pytorch")  # pytorch | onnx | openvino
+runtime = ModelRuntime(MODEL_PATH, backend=MODEL_BACKEND)
+preprocessor = preprocessing.PreprocessingEngine()
 
 # Django API Configuration
-DJANGO_API_URL = "http://127.0.0.1:8000/api/public/reading/"
+DJANGO_API_URL = "http://127.0.0.1:8000/api/public/readings/bulk/"
+DJANGO_BATCH_SIZE = 100          # Lecturas por petición bulk
+DJANGO_FLUSH_INTERVAL = 2.0      # Segundos máximos antes de enviar un lote parcial
 DEFAULT_METER_ID = "MTR001"  # ID del contador por defecto (cambiar según sea necesario)
 
+# Inference scheduler configuration (micro-batching)
+INFERENCE_MAX_BATCH_SIZE = 8     # Frames máximos por llamada al modelo
+INFERENCE_MAX_WAIT_MS = 25       # Espera máxima para completar un lote
+INFERENCE_MAX_QUEUE_SIZE = 256   # Frames en cola antes de rechazar
+INFERENCE_WORKERS = 1            # Hilos de inferencia (1 por copia del modelo)
+
+# Image archiving (optional, sampled, off the hot path)
+ARCHIVE_SAMPLE_EVERY = 10        # Guarda 1 de cada N frames (0 = solo fallidos)
+ARCHIVE_FAILED = True            # Guarda siempre los frames sin lectura válida
+ARCHIVE_ANNOTATED = True         # Guarda también la imagen anotada por YOLO
+
 # Image processing and Inference
-def process_image_yolo(img_path:Path):
-    processed_image = preprocessing.process_image(img_path)
-    results = model(processed_image, conf=0.4, project=str(CAPTURED_DIR / "YOLO"),save=True)
+def _reading_from_result(result):
     detected = []
-    for r in results:
-        boxes = r.boxes
-        for box in boxes:
-            cls = int(box.cls[0])
-            conf = float(box.conf[0])
-            x1, y1, x2, y2 = box.xyxy[0].tolist()
-
-            print(f"--> Detectado: {cls} | Posicion_x: {x1} | Confianza: {conf:.2f} ")
-            detected.append({"numero":cls, "x_pos":x1, "confianza":conf})
+    for box in result.boxes:
+        cls = int(box.cls[0])
+        conf = float(box.conf[0])
+        x1, y1, x2, y2 = box.xyxy[0].tolist()
+
+        print(f"--> Detectado: {cls} | Posicion_x: {x1} | Confianza: {conf:.2f} ")
+        detected.append({"numero":cls, "x_pos":x1, "confianza":conf})
     
     if not detected:
         return "Error: No se detectaron numeros"
@@ -48,129 +58,146 @@ def process_image_yolo(img_path:Path):
     final_reading = "".join(str(d["numero"]) for d in detected_ordered)
     return final_reading
 
-# Update CSV
-def save_reading(reading):
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    df = pd.DataFrame([["1", timestamp, reading, len(reading)]], columns=["ID","Fecha", "Lectura", "# Digitos"])
-    header = not CSV_FILE.exists()
-    df.to_csv(CSV_FILE, mode='a', header=header, index=False)
+def process_batch_yolo(frames:list):
+    """
+    Preprocesa un lote de imágenes (bytes, buffers NumPy o rutas) y ejecuta
+    una sola inferencia YOLO. Retorna por frame una tupla
+    (lectura, archivar, imagen_anotada).
+    """
+    batch = preprocessor.process_batch(frames)
+    results = runtime.get()(list(batch), conf=0.4, imgsz=runtime.imgsz, save=False, verbose=False)
+
+    # El lote vive en buffers reutilizables del hilo: la imagen anotada de los
+    # frames muestreados se genera aquí, antes de que se sobrescriban
+    outputs = []
+    for r in results:
+        reading = _reading_from_result(r)
+        keep = archiver.should_archive(failed=not is_valid_reading(reading))
+        annotated = r.plot() if keep and ARCHIVE_ANNOTATED else None
+        outputs.append((reading, keep, annotated))
+    return outputs
+
+def process_image_yolo(image):
+    return process_batch_yolo([image])[0][0]
+
+def is_valid_reading(reading):
+    return "Error" not in reading and reading.isdigit()
+
+scheduler = InferenceScheduler(
+    process_batch_yolo,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+    max_queue_size=INFERENCE_MAX_QUEUE_SIZE,
+    workers=INFERENCE_WORKERS,
+)
+
+outbox = ReadingOutbox(OUTBOX_DB)
+
+forwarder = DjangoForwarder(
+    DJANGO_API_URL,
+    outbox,
+    batch_size=DJANGO_BATCH_SIZE,
+    flush_interval=DJANGO_FLUSH_INTERVAL,
+)
+
+archiver = ImageArchiver(
+    CAPTURED_DIR,
+    sample_every=ARCHIVE_SAMPLE_EVERY,
+    keep_failed=ARCHIVE_FAILED,
+    keep_annotated=ARCHIVE_ANNOTATED,
+)
+
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    await asyncio.to_thread(runtime.warmup)
+    await scheduler.start()
+    await forwarder.start()
+    yield
+    await scheduler.stop()
+    await forwarder.stop()
+    outbox.close()
+    archiver.close()
 
-# Send reading to Django API
-def send_to_django(reading, meter_id=DEFAULT_METER_ID):
+# App initialization
+app = FastAPI(lifespan=lifespan)
+
+# Local outbox (respaldo durable + cola de envío a Django)
+def save_reading(reading, meter_id=DEFAULT_METER_ID):
     """
-    Envía la lectura al sistema Django (water_monitoring) para almacenarla en PostgreSQL.
+    Registra la lectura en el outbox local. Las lecturas válidas quedan
+    pendientes y el replayer (DjangoForwarder) las envía a Django por lotes;
+    las inválidas se guardan solo como respaldo.
     
     Args:
         reading: Lectura del contador (string con dígitos)
         meter_id: ID del contador en el sistema Django
     
     Returns:
-        dict: Respuesta del servidor Django o error
+        dict: Estado de sincronización de la lectura
     """
-    try:
-        # Convertir lectura a float (asumiendo que es un valor acumulado)
-        accumulated_value = float(reading)
-        
-        # Preparar payload para el API de Django
-        payload = {
-            "meter_id": meter_id,
-            "accumulated_value": accumulated_value,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Enviar POST request al endpoint público de Django
-        response = requests.post(DJANGO_API_URL, json=payload, timeout=5)
-        
-        if response.status_code == 201:
-            print(f"✅ Lectura enviada exitosamente a Django: {response.json()}")
-            return {"success": True, "data": response.json()}
-        else:
-            print(f"⚠️ Error al enviar a Django ({response.status_code}): {response.text}")
-            return {"success": False, "error": response.text, "status_code": response.status_code}
-            
-    except requests.exceptions.ConnectionError:
-        print(f"❌ No se pudo conectar con Django API en {DJANGO_API_URL}")
-        return {"success": False, "error": "Connection error - Django server not available"}
-    except ValueError as e:
-        print(f"❌ Error de formato en lectura '{reading}': {e}")
-        return {"success": False, "error": f"Invalid reading format: {reading}"}
-    except Exception as e:
-        print(f"❌ Error inesperado al enviar a Django: {e}")
-        return {"success": False, "error": str(e)}
-
-#ESP32 workflow
-@app.post("/upload")
-async def upload_from_esp32(request: Request):
-    data = await request.body()
-
-    if not data or len(data)==0:
-        return {"error":"No data received"}
-    print(f"Recibidos {len(data)} bytes")
+    valid = is_valid_reading(reading)
+    row_id = outbox.append(meter_id, reading, send=valid)
+    if not valid:
+        print(f"⚠️ Lectura inválida, no se enviará a Django: {reading}")
+        return {"success": False, "error": "Invalid reading - not sent to database", "outbox_id": row_id}
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = CAPTURED_DIR / f"img_{timestamp}_esp32.jpg"
-    filename.write_bytes(data)
-    print(f"[ESP32] Imagen guardada en: {filename.name}")
+    return {"success": True, "queued": True, "outbox_id": row_id}
 
-    # Model inference
+# Shared upload workflow
+async def handle_frame(data:bytes, origin:str, tag:str):
+    # Model inference (imagen decodificada en memoria, sin pasar por disco)
     try:
-        reading = process_image_yolo(filename)
+        reading, keep, annotated = await scheduler.submit(data)
         print(f"Lectura detectada: {reading}")
+        valid = is_valid_reading(reading)
+
+        # Archivo muestreado de la imagen (en segundo plano)
+        if keep:
+            archiver.submit(data, tag, failed=not valid, annotated=annotated)
         
-        # Guardar en CSV local (respaldo)
-        save_reading(reading)
-        
-        # Enviar a Django solo si la lectura es válida (no contiene "Error")
-        if "Error" not in reading and reading.isdigit():
-            django_response = send_to_django(reading, meter_id=DEFAULT_METER_ID)
-        else:
-            django_response = {"success": False, "error": "Invalid reading - not sent to database"}
-            print(f"⚠️ Lectura inválida, no se envió a Django: {reading}")
+        # Guardar en el outbox local; el envío a Django ocurre en segundo plano
+        django_response = await asyncio.to_thread(save_reading, reading, DEFAULT_METER_ID)
+        if django_response["success"]:
+            forwarder.notify()
         
         return {
             "status": "ok", 
             "lectura": reading, 
-            "origen": "ESP32",
+            "origen": origin,
             "django_sync": django_response
         }
     except Exception as e:
         print(f"Error: {e}")
-        return {"status": "error", "lectura": "Error", "origen": "ESP32", "error": str(e)}
+        if archiver.should_archive(failed=True):
+            archiver.submit(data, tag, failed=True)
+        return {"status": "error", "lectura": "Error", "origen": origin, "error": str(e)}
 
-@app.post("/test-web")
-async def upload_from_web(file:UploadFile=File(...)):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = CAPTURED_DIR / f"img_{timestamp}_web.jpg"
+#ESP32 workflow
+@app.post("/upload")
+async def upload_from_esp32(request: Request):
+    data = await request.body()
 
-    with open(filename ,"wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    print(f"[WEB] Imagen guardada en: {filename.name}")
+    if not data or len(data)==0:
+        return {"error":"No data received"}
+    print(f"[ESP32] Recibidos {len(data)} bytes")
 
-    # Model inference
-    try:
-        reading = process_image_yolo(filename)
-        print(f"Lectura detectada: {reading}")
-        
-        # Guardar en CSV local (respaldo)
-        save_reading(reading)
-        
-        # Enviar a Django solo si la lectura es válida (no contiene "Error")
-        if "Error" not in reading and reading.isdigit():
-            django_response = send_to_django(reading, meter_id=DEFAULT_METER_ID)
-        else:
-            django_response = {"success": False, "error": "Invalid reading - not sent to database"}
-            print(f"⚠️ Lectura inválida, no se envió a Django: {reading}")
-        
-        return {
-            "status": "ok", 
-            "lectura": reading, 
-            "origen": "WEB TEST",
-            "django_sync": django_response
-        }
-    except Exception as e:
-        print(f"Error: {e}")
-        return {"status": "error", "lectura": "Error", "origen": "WEB TEST", "error": str(e)}
+    return await handle_frame(data, origin="ESP32", tag="esp32")
+
+@app.post("/test-web")
+async def upload_from_web(file:UploadFile=File(...)):
+    data = await file.read()
+    print(f"[WEB] Recibidos {len(data)} bytes")
+
+    return await handle_frame(data, origin="WEB TEST", tag="web")
+
+@app.get("/metrics")
+async def inference_metrics():
+    stats = scheduler.stats()
+    stats["archive"] = archiver.stats()
+    stats["model"] = runtime.stats()
+    stats["django"] = forwarder.stats()
+    stats["outbox"] = await asyncio.to_thread(outbox.counts)
+    return stats
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,201 @@
+"""
+Outbox local y durable de lecturas (SQLite en modo WAL).
+
+Cada lectura detectada se registra con su estado de sincronización con Django:
+
+    pending   -> pendiente de envío
+    inflight  -> reclamada por un replayer (se libera si no se confirma a tiempo)
+    sent      -> aceptada por Django
+    rejected  -> rechazada por validación en Django (no se reintenta)
+    skipped   -> lectura inválida del modelo, solo se guarda como respaldo
+
+Uso como CLI (exporta el formato histórico de `medidas_contador.csv`):
+    python src/outbox.py export-csv [--output medidas_contador.csv] [--status sent pending]
+    python src/outbox.py stats
+"""
+import argparse
+import csv
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_DB_PATH = (BASE_DIR / "../outbox.db").resolve()
+DEFAULT_CSV_PATH = (BASE_DIR / "../medidas_contador.csv").resolve()
+
+STATUSES = ("pending", "inflight", "sent", "rejected", "skipped")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    meter_id TEXT NOT NULL,
+    reading TEXT NOT NULL,
+    captured_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS readings_status_idx ON readings (status, id);
+"""
+
+
+class ReadingOutbox:
+    """
+    Registro append-only de lecturas con estado de sincronización.
+
+    Es seguro entre hilos (una conexión protegida por lock) y entre procesos
+    (varios workers de uvicorn comparten el archivo gracias a WAL y a que
+    `claim()` reserva filas dentro de una transacción `BEGIN IMMEDIATE`).
+
+    Args:
+        path: Archivo SQLite
+        lease_seconds: Tiempo tras el cual una fila `inflight` sin confirmar
+            vuelve a estar disponible (p. ej. si el proceso murió)
+    """
+
+    def __init__(self, path:Path=DEFAULT_DB_PATH, lease_seconds:float=60.0):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), isolation_level=None,
+                                     check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def append(self, meter_id:str, reading:str, captured_at:datetime=None, send:bool=True):
+        """Registra una lectura; `send=False` la guarda solo como respaldo"""
+        captured_at = captured_at or datetime.now()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO readings (meter_id, reading, captured_at, status) VALUES (?, ?, ?, ?)",
+                (meter_id, reading, captured_at.isoformat(), "pending" if send else "skipped"),
+            )
+        return cursor.lastrowid
+
+    def claim(self, limit:int):
+        """Reserva hasta `limit` filas pendientes (o con lease vencido) para envío"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, meter_id, reading, captured_at FROM readings "
+                    "WHERE status = 'pending' OR (status = 'inflight' AND claimed_at < ?) "
+                    "ORDER BY id LIMIT ?",
+                    (now - self.lease_seconds, limit),
+                ).fetchall()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE readings SET status = 'inflight', claimed_at = ?, attempts = attempts + 1 "
+                        "WHERE id = ?",
+                        [(now, row[0]) for row in rows],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [
+            {"id": row[0], "meter_id": row[1], "reading": row[2], "captured_at": row[3]}
+            for row in rows
+        ]
+
+    def _set_status(self, ids, status, error=None):
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE readings SET status = ?, claimed_at = NULL, last_error = ? WHERE id = ?",
+                [(status, error, row_id) for row_id in ids],
+            )
+
+    def mark_sent(self, ids):
+        self._set_status(ids, "sent")
+
+    def mark_rejected(self, errors:dict):
+        """`errors` mapea id de fila -> mensaje de error de Django"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE readings SET status = 'rejected', claimed_at = NULL, last_error = ? WHERE id = ?",
+                [(str(error)[:500], row_id) for row_id, error in errors.items()],
+            )
+
+    def release(self, ids, error:str=None):
+        """Devuelve filas reclamadas a `pending` tras un fallo transitorio"""
+        self._set_status(ids, "pending", error)
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM readings GROUP BY status").fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(dict(rows))
+        return counts
+
+    def iter_rows(self, statuses=None, batch_size:int=1000):
+        """Itera filas en orden de captura, por bloques, sin cargar todo en memoria"""
+        query = "SELECT id, meter_id, reading, captured_at, status FROM readings WHERE id > ?"
+        params = []
+        if statuses:
+            query += f" AND status IN ({', '.join('?' * len(statuses))})"
+            params = list(statuses)
+        query += " ORDER BY id LIMIT ?"
+
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(query, [last_id, *params, batch_size]).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
+
+
+def export_csv(outbox:ReadingOutbox, output:Path=DEFAULT_CSV_PATH, statuses=None):
+    """Genera `medidas_contador.csv` con las columnas históricas (ID, Fecha, Lectura, # Digitos)"""
+    count = 0
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ID", "Fecha", "Lectura", "# Digitos"])
+        for _, _, reading, captured_at, _ in outbox.iter_rows(statuses):
+            fecha = datetime.fromisoformat(captured_at).strftime('%Y-%m-%d %H:%M:%S')
+            # La columna ID del CSV histórico siempre fue "1"
+            writer.writerow(["1", fecha, reading, len(reading)])
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Outbox local de lecturas")
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB_PATH, help="Archivo SQLite del outbox")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export-csv", help="Exporta al formato de medidas_contador.csv")
+    export_parser.add_argument("--output", type=Path, default=DEFAULT_CSV_PATH)
+    export_parser.add_argument("--status", nargs="*", choices=STATUSES, default=None,
+                               help="Filtra por estado (por defecto todas las lecturas)")
+    sub.add_parser("stats", help="Muestra el número de lecturas por estado")
+
+    args = parser.parse_args()
+    outbox = ReadingOutbox(args.db)
+    try:
+        if args.command == "export-csv":
+            count = export_csv(outbox, args.output, args.status)
+            print(f"✅ {count} lecturas exportadas a {args.output}")
+        elif args.command == "stats":
+            for status, count in outbox.counts().items():
+                print(f"{status:<10} {count}")
+    finally:
+        outbox.close()
+
+
+if __name__ == "__main__":
+    main()
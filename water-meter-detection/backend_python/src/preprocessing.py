@@ -1,14 +1,40 @@
 import cv2
-from pathlib import Path
+import threading
+import numpy as np
+from collections import OrderedDict
 
-def process_image(image_path:Path,per_width:int=45, per_height:int=45):
-    image = cv2.imread(str(image_path))
+MODEL_INPUT_SIZE = 640   # Tamaño de entrada del modelo YOLO (imgsz)
+PAD_VALUE = 114          # Color de relleno del letterbox (igual que YOLO)
+MAX_CACHED_SHAPES = 8    # Formas de entrada con buffers en caché por hilo (LRU)
+
+def load_image(source):
+    """
+    Obtiene una imagen BGR a partir de bytes codificados (JPEG/PNG), un buffer
+    NumPy (codificado 1-D o ya decodificado) o una ruta en disco.
+    """
+    if isinstance(source, np.ndarray):
+        image = cv2.imdecode(source, cv2.IMREAD_COLOR) if source.ndim == 1 else source
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        image = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_COLOR)
+    else:
+        image = cv2.imread(str(source))
+
+    if image is None:
+        raise ValueError("No se pudo decodificar la imagen")
+    return image
+
+def process_image(image,per_width:int=45, per_height:int=45):
+    image = load_image(image)
     image = _crop_image(image=image,per_width=per_width, per_height=per_height)
     image = _convert_grayscale(image=image)
     return image
 
 def _crop_image(image, per_width, per_height):
-    img_height, img_width = image.shape[:2]
+    x1, y1, x2, y2 = _crop_box(image.shape[:2], per_width, per_height)
+    return image[y1:y2, x1:x2]
+
+def _crop_box(shape, per_width, per_height):
+    img_height, img_width = shape
 
     crop_width = int(img_width*(per_width/100))
     crop_height = int(img_height*(per_height/100))
@@ -25,8 +51,96 @@ def _crop_image(image, per_width, per_height):
     y1 = max(0, y1)
     x2 = min(img_width, x2)
     y2 = min(img_height, y2)
-    return image[y1:y2, x1:x2]
+    return x1, y1, x2, y2
 
 def _convert_grayscale(image):
     image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
\ No newline at end of file
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+class PreprocessingEngine:
+    """
+    Preprocesamiento fusionado: recorte central, escala de grises y
+    redimensionado con letterbox al tamaño de entrada del modelo.
+
+    El recorte es una vista (sin copia), la conversión a gris y el resize se
+    escriben en buffers preasignados, y la réplica a 3 canales se escribe
+    directamente en la región útil del buffer de salida. Los buffers son por hilo
+    (un juego por worker) y se indexan por la forma de la imagen de entrada,
+    por lo que no hay asignaciones de memoria en estado estable. Solo se
+    conservan las MAX_CACHED_SHAPES formas usadas más recientemente, para que
+    imágenes de tamaños arbitrarios no acumulen buffers sin límite.
+
+    Importante: el array retornado se reutiliza en la siguiente llamada del
+    mismo hilo; consúmelo (o cópialo) antes de procesar otro frame.
+    """
+
+    def __init__(self, per_width:int=45, per_height:int=45, input_size:int=MODEL_INPUT_SIZE):
+        self.per_width = per_width
+        self.per_height = per_height
+        self.input_size = input_size
+        self._local = threading.local()
+
+    def _buffers(self, shape):
+        cache = getattr(self._local, "by_shape", None)
+        if cache is None:
+            cache = self._local.by_shape = OrderedDict()
+
+        plan = cache.get(shape)
+        if plan is not None:
+            cache.move_to_end(shape)
+        else:
+            x1, y1, x2, y2 = _crop_box(shape, self.per_width, self.per_height)
+            crop_h, crop_w = y2 - y1, x2 - x1
+            scale = self.input_size / max(crop_h, crop_w)
+            new_w, new_h = max(1, round(crop_w * scale)), max(1, round(crop_h * scale))
+            top, left = (self.input_size - new_h) // 2, (self.input_size - new_w) // 2
+            plan = cache[shape] = {
+                "crop": (slice(y1, y2), slice(x1, x2)),
+                "size": (new_w, new_h),
+                "dest": (slice(top, top + new_h), slice(left, left + new_w)),
+                "gray": np.empty((crop_h, crop_w), dtype=np.uint8),
+                "resized": np.empty((new_h, new_w), dtype=np.uint8),
+            }
+            if len(cache) > MAX_CACHED_SHAPES:
+                cache.popitem(last=False)
+        return plan
+
+    def _output(self, batch_size):
+        outputs = getattr(self._local, "outputs", None)
+        if outputs is None:
+            outputs = self._local.outputs = {}
+
+        entry = outputs.get(batch_size)
+        if entry is None:
+            size = self.input_size
+            out = np.full((batch_size, size, size, 3), PAD_VALUE, dtype=np.uint8)
+            # Región escrita por última vez en cada slot, para re-pintar el
+            # relleno solo cuando cambia la geometría del letterbox
+            entry = outputs[batch_size] = (out, [None] * batch_size)
+        return entry
+
+    def _fill(self, image, out, painted, idx):
+        plan = self._buffers(image.shape[:2])
+        rows, cols = plan["crop"]
+        gray = cv2.cvtColor(image[rows, cols], cv2.COLOR_BGR2GRAY, dst=plan["gray"])
+        resized = cv2.resize(gray, plan["size"], dst=plan["resized"], interpolation=cv2.INTER_LINEAR)
+
+        slot = out[idx]
+        if painted[idx] != plan["dest"]:
+            slot[...] = PAD_VALUE
+            painted[idx] = plan["dest"]
+        dest_rows, dest_cols = plan["dest"]
+        cv2.cvtColor(resized, cv2.COLOR_GRAY2BGR, dst=slot[dest_rows, dest_cols])
+        return slot
+
+    def process(self, image):
+        """Procesa un frame y retorna un array (input_size, input_size, 3) uint8"""
+        out, painted = self._output(1)
+        return self._fill(load_image(image), out, painted, 0)
+
+    def process_batch(self, images):
+        """Procesa una lista de frames y retorna un array apilado (N, input_size, input_size, 3)"""
+        out, painted = self._output(len(images))
+        for idx, image in enumerate(images):
+            self._fill(load_image(image), out, painted, idx)
+        return out
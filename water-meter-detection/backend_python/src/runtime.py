@@ -0,0 +1,192 @@
+"""
+Runtime del modelo YOLO: carga perezosa y segura entre hilos, warm-up y
+selección de backend (PyTorch `.pt`, ONNX u OpenVINO exportados de `best_m.pt`).
+
+Uso como CLI:
+    python src/runtime.py export --format onnx
+    python src/runtime.py export --format openvino --check img1.jpg img2.jpg
+    python src/runtime.py check --format onnx img1.jpg
+"""
+import argparse
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+import preprocessing
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_MODEL_PATH = (BASE_DIR / "../trained_models/local/best_m.pt").resolve()
+
+BACKENDS = ("pytorch", "onnx", "openvino")
+
+
+def artifact_path(model_path:Path, backend:str):
+    """Ruta del artefacto de un backend, junto al `.pt` (convención de ultralytics)"""
+    model_path = Path(model_path)
+    if backend == "pytorch":
+        return model_path
+    if backend == "onnx":
+        return model_path.with_suffix(".onnx")
+    if backend == "openvino":
+        return model_path.parent / f"{model_path.stem}_openvino_model"
+    raise ValueError(f"Backend desconocido '{backend}'. Opciones: {', '.join(BACKENDS)}")
+
+
+class ModelRuntime:
+    """
+    Singleton perezoso del modelo por proceso (un worker de uvicorn = una copia).
+
+    El modelo se carga en la primera llamada a `get()` (o en `warmup()` al
+    arrancar), nunca al importar el módulo.
+
+    Args:
+        model_path: Ruta al modelo PyTorch `best_m.pt`
+        backend: "pytorch", "onnx" u "openvino"
+        imgsz: Tamaño de entrada del modelo
+    """
+
+    def __init__(self, model_path:Path=DEFAULT_MODEL_PATH, backend:str="pytorch",
+                 imgsz:int=preprocessing.MODEL_INPUT_SIZE):
+        self.backend = backend
+        self.path = artifact_path(model_path, backend)
+        self.imgsz = imgsz
+        self._model = None
+        self._lock = threading.Lock()
+        self.load_ms = None
+        self.warmup_ms = None
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        from ultralytics import YOLO
+
+        if not self.path.exists():
+            raise FileNotFoundError(
+                f"No existe el artefacto '{self.path}'. "
+                f"Genéralo con: python src/runtime.py export --format {self.backend}"
+            )
+        start = time.perf_counter()
+        model = YOLO(str(self.path), task="detect")
+        self.load_ms = (time.perf_counter() - start) * 1000
+        print(f"[MODEL] {self.backend} cargado en {self.load_ms:.0f} ms: {self.path.name}")
+        return model
+
+    def warmup(self, batch_size:int=1):
+        """Carga el modelo y ejecuta una inferencia en blanco para inicializar el runtime"""
+        model = self.get()
+        blank = np.full((self.imgsz, self.imgsz, 3), preprocessing.PAD_VALUE, dtype=np.uint8)
+        start = time.perf_counter()
+        model([blank] * batch_size, imgsz=self.imgsz, save=False, verbose=False)
+        self.warmup_ms = (time.perf_counter() - start) * 1000
+        print(f"[MODEL] Warm-up completado en {self.warmup_ms:.0f} ms")
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "path": str(self.path),
+            "loaded": self._model is not None,
+            "load_ms": round(self.load_ms, 1) if self.load_ms is not None else None,
+            "warmup_ms": round(self.warmup_ms, 1) if self.warmup_ms is not None else None,
+        }
+
+
+# ============= EXPORT / VERIFICATION =============
+
+def export(model_path:Path, backend:str, imgsz:int=preprocessing.MODEL_INPUT_SIZE):
+    """Exporta `best_m.pt` a ONNX u OpenVINO con batch dinámico"""
+    from ultralytics import YOLO
+
+    if backend == "pytorch":
+        raise ValueError("El backend pytorch no requiere exportación")
+    start = time.perf_counter()
+    exported = YOLO(str(model_path)).export(format=backend, imgsz=imgsz, dynamic=True)
+    print(f"✅ Exportado a {backend} en {time.perf_counter() - start:.1f} s: {exported}")
+    return Path(exported)
+
+
+def _detections(model, image, imgsz):
+    result = model(image, conf=0.4, imgsz=imgsz, save=False, verbose=False)[0]
+    boxes = result.boxes
+    return [
+        (int(c), float(cf), box)
+        for c, cf, box in zip(boxes.cls.tolist(), boxes.conf.tolist(), boxes.xyxy.tolist())
+    ]
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def check(model_path:Path, backend:str, images:list, iou_threshold:float=0.9, conf_tolerance:float=0.05):
+    """
+    Compara las detecciones del backend exportado con las del modelo PyTorch.
+
+    Para cada imagen exige la misma lectura (dígitos ordenados por x) y que
+    cada caja tenga pareja de la misma clase con IoU >= `iou_threshold` y
+    confianza dentro de `conf_tolerance`. Retorna True si todas coinciden.
+    """
+    reference = ModelRuntime(model_path, "pytorch")
+    candidate = ModelRuntime(model_path, backend)
+    engine = preprocessing.PreprocessingEngine()
+
+    ok = True
+    for image_path in images:
+        frame = engine.process(Path(image_path)).copy()
+        expected = _detections(reference.get(), frame, reference.imgsz)
+        actual = _detections(candidate.get(), frame, candidate.imgsz)
+
+        read_expected = "".join(str(c) for c, _, b in sorted(expected, key=lambda d: d[2][0]))
+        read_actual = "".join(str(c) for c, _, b in sorted(actual, key=lambda d: d[2][0]))
+
+        unmatched = [
+            d for d in expected
+            if not any(
+                d[0] == a[0] and _iou(d[2], a[2]) >= iou_threshold and abs(d[1] - a[1]) <= conf_tolerance
+                for a in actual
+            )
+        ]
+        matches = read_expected == read_actual and not unmatched and len(expected) == len(actual)
+        ok = ok and matches
+        status = "✅" if matches else "❌"
+        print(f"{status} {Path(image_path).name}: pytorch='{read_expected}' {backend}='{read_actual}' "
+              f"({len(expected)} vs {len(actual)} cajas, {len(unmatched)} sin pareja)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta y verifica runtimes del modelo YOLO")
+    parser.add_argument("--model", type=Path, default=DEFAULT_MODEL_PATH, help="Ruta a best_m.pt")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="Exporta el modelo a ONNX u OpenVINO")
+    export_parser.add_argument("--format", choices=BACKENDS[1:], required=True)
+    export_parser.add_argument("--imgsz", type=int, default=preprocessing.MODEL_INPUT_SIZE)
+    export_parser.add_argument("--check", nargs="*", default=None, metavar="IMAGE",
+                               help="Imágenes para verificar que las salidas coinciden")
+
+    check_parser = sub.add_parser("check", help="Compara un backend exportado con PyTorch")
+    check_parser.add_argument("--format", choices=BACKENDS[1:], required=True)
+    check_parser.add_argument("images", nargs="+")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export(args.model, args.format, imgsz=args.imgsz)
+        if args.check:
+            raise SystemExit(0 if check(args.model, args.format, args.check) else 1)
+    elif args.command == "check":
+        raise SystemExit(0 if check(args.model, args.format, args.images) else 1)
+
+
+if __name__ == "__main__":
+    main()
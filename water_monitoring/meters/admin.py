@@ -1,10 +1,15 @@
 # meters/admin.py
 
+from datetime import datetime
+
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import MeterModel, Meter, ConsumptionReading
+from .detection import resolve_alert
+from .models import MeterModel, Meter, ConsumptionReading, Alert, consumption_between
+from .pagination import EstimatedCountPaginator
 
 
 @admin.register(MeterModel)
@@ -27,11 +32,15 @@ class MeterModelAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(meter_total=Count('meters'))
+    
     def meter_count(self, obj):
-        count = obj.meters.count()
+        count = obj.meter_total
         url = reverse('admin:meters_meter_changelist') + f'?model__id__exact={obj.id}'
         return format_html('<a href="{}">{} contadores</a>', url, count)
     meter_count.short_description = 'Contadores'
+    meter_count.admin_order_field = 'meter_total'
 
 
 @admin.register(Meter)
@@ -39,6 +48,7 @@ class MeterAdmin(admin.ModelAdmin):
     list_display = ['meter_id', 'model', 'address', 'is_active', 'last_reading_display', 'installation_date']
     list_filter = ['is_active', 'model', 'installation_date']
     search_fields = ['meter_id', 'address']
+    list_select_related = ['model']
     readonly_fields = ['created_at', 'updated_at', 'last_reading_info']
     date_hierarchy = 'installation_date'
     
@@ -63,18 +73,20 @@ class MeterAdmin(admin.ModelAdmin):
     )
     
     def last_reading_display(self, obj):
-        last = obj.get_last_reading()
-        if last:
-            return f"{last.accumulated_value} ({last.timestamp.strftime('%Y-%m-%d %H:%M')})"
+        if obj.last_reading_at:
+            return f"{obj.last_reading_value} ({obj.last_reading_at.strftime('%Y-%m-%d %H:%M')})"
         return "Sin lecturas"
     last_reading_display.short_description = 'Última Lectura'
+    last_reading_display.admin_order_field = 'last_reading_at'
     
     def last_reading_info(self, obj):
-        last = obj.get_last_reading()
+        last, previous = obj.get_latest_readings()
         if not last:
             return "No hay lecturas registradas"
         
-        consumption = last.get_consumption_since_last()
+        consumption = None
+        if previous:
+            consumption = consumption_between(last, previous, obj.model.liters_per_unit)
         html = f"""
         <div style="padding: 10px; background: #f8f9fa; border-radius: 5px;">
             <p><strong>Valor acumulado:</strong> {last.accumulated_value} unidades</p>
@@ -102,9 +114,12 @@ class MeterAdmin(admin.ModelAdmin):
 class ConsumptionReadingAdmin(admin.ModelAdmin):
     list_display = ['meter', 'accumulated_value', 'consumption_display', 'timestamp']
     list_filter = ['meter__model', 'timestamp']
-    search_fields = ['meter__meter_id']
+    # Búsqueda exacta por contador: usa el índice (meter, -timestamp)
+    search_fields = ['=meter__meter_id']
     readonly_fields = ['created_at', 'consumption_info']
-    date_hierarchy = 'timestamp'
+    # Sin COUNT(*) sobre toda la tabla (ni date_hierarchy, que recorre todas las fechas)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Lectura', {
@@ -132,6 +147,7 @@ class ConsumptionReadingAdmin(admin.ModelAdmin):
         if not consumption:
             return "Esta es la primera lectura del contador"
         
+        previous = consumption['previous_reading']
         html = f"""
         <div style="padding: 10px; background: #f8f9fa; border-radius: 5px;">
             <h4>Consumo desde lectura anterior</h4>
@@ -142,8 +158,8 @@ class ConsumptionReadingAdmin(admin.ModelAdmin):
             <hr>
             <p><strong>Lectura anterior:</strong></p>
             <ul>
-                <li>Valor: {consumption['previous_reading'].accumulated_value}</li>
-                <li>Fecha: {consumption['previous_reading'].timestamp.strftime('%Y-%m-%d %H:%M:%S')}</li>
+                <li>Valor: {previous['accumulated_value']}</li>
+                <li>Fecha: {datetime.fromisoformat(previous['timestamp']).strftime('%Y-%m-%d %H:%M:%S')}</li>
             </ul>
         </div>
         """
@@ -152,4 +168,28 @@ class ConsumptionReadingAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('meter', 'meter__model')
\ No newline at end of file
+        # Lectura anterior de cada fila con una subconsulta por índice, evaluada
+        # solo para las filas de la página
+        return qs.select_related('meter', 'meter__model').with_previous_reading()
+
+
+@admin.register(Alert)
+class AlertAdmin(admin.ModelAdmin):
+    list_display = ['meter', 'kind', 'started_at', 'value', 'message', 'resolved_at']
+    list_filter = ['kind', ('resolved_at', admin.EmptyFieldListFilter)]
+    search_fields = ['=meter__meter_id']
+    list_select_related = ['meter']
+    actions = ['resolve_alerts']
+    
+    def has_add_permission(self, request):
+        # Las genera el detector de anomalías
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        # Se resuelven con la acción, que también actualiza el estado del detector
+        return False
+    
+    @admin.action(description='Marcar como resueltas')
+    def resolve_alerts(self, request, queryset):
+        resolved = sum(resolve_alert(alert) for alert in queryset.filter(resolved_at__isnull=True))
+        self.message_user(request, f'{resolved} alertas resueltas')
@@ -0,0 +1,137 @@
+# meters/async_views.py
+
+"""
+Versiones asíncronas de los endpoints públicos de ingesta.
+
+Con PUBLIC_INGEST_ASYNC=True las URLs /api/public/reading/ y
+/api/public/readings/bulk/ usan estas vistas, pensadas para desplegar con un
+servidor ASGI (uvicorn, daphne): el parseo y la validación de campos corren
+en el event loop y las consultas usan el ORM asíncrono (`aget`,
+`abulk_create`), así que una petición no ocupa un hilo mientras espera.
+
+Responden con el mismo contrato que las vistas DRF de views.py. En modo cola
+(READING_INGEST_MODE='queue') todo el camino es asíncrono. En modo síncrono
+la escritura (lectura, snapshot del contador y agregados) necesita una
+transacción, que el ORM asíncrono de Django 4.2 no soporta, y se ejecuta con
+un único sync_to_async; lo mismo ocurre con las peticiones que traen
+Idempotency-Key, cuya respuesta se guarda junto con las lecturas.
+
+Solo aceptan JSON. Bajo WSGI siguen funcionando, pero Django las ejecuta con
+un event loop por petición, así que ahí conviene dejar PUBLIC_INGEST_ASYNC
+desactivado.
+"""
+
+import json
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
+
+from .idempotency import HEADER as IDEMPOTENCY_HEADER
+from .ingest import ReadingIngestor, meter_not_found_message, validate_fields
+from .ingest_queue import aenqueue_readings
+from .models import Meter
+from .serializers import BulkReadingSerializer
+from .views import (
+    PUBLIC_READING, PUBLIC_BULK_READINGS, idempotent_response, public_reading_result,
+    public_readings_result, queued_reading_result, queued_readings_result
+)
+
+# Mismo encoder que las respuestas DRF (fechas con microsegundos)
+json_response = partial(JsonResponse, encoder=JSONEncoder)
+
+
+def _respond(result):
+    data, status_code = result
+    return json_response(data, status=status_code)
+
+
+def _error(errors, status_code=status.HTTP_400_BAD_REQUEST):
+    return json_response({'success': False, 'errors': errors}, status=status_code)
+
+
+def _parse_body(request):
+    """Cuerpo JSON de la petición, o None si no es un objeto JSON válido"""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _method_not_allowed():
+    response = json_response({'detail': 'Método no permitido'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    response['Allow'] = 'POST'
+    return response
+
+
+async def create_reading_public(request):
+    """
+    Endpoint público para registrar una lectura (asíncrono)
+    POST /api/public/reading/
+    Body: {"meter_id": "MTR001", "accumulated_value": 12345.67, "timestamp": "..."}
+    """
+    if request.method != 'POST':
+        return _method_not_allowed()
+    body = _parse_body(request)
+    if body is None:
+        return _error({'non_field_errors': ['El cuerpo debe ser un objeto JSON']})
+
+    if request.META.get(IDEMPOTENCY_HEADER):
+        # Guardar la respuesta junto con la lectura requiere una transacción
+        return await sync_to_async(idempotent_response)(
+            PUBLIC_READING, request, lambda: public_reading_result(body), json_response
+        )
+
+    if settings.READING_INGEST_MODE == 'queue':
+        return _respond(queued_reading_result(*await aenqueue_readings([body])))
+
+    valid, errors = validate_fields([body])
+    if errors:
+        return _error(errors[0]['errors'])
+    meter_id = valid[0][1]['meter_id']
+    try:
+        meter = await Meter.objects.aget(meter_id=meter_id, is_active=True)
+    except Meter.DoesNotExist:
+        return _error({'meter_id': [meter_not_found_message(meter_id)]})
+
+    # El contador ya resuelto evita repetir la consulta al insertar
+    ingestor = ReadingIngestor()
+    ingestor.meters[meter_id] = meter
+    return _respond(await sync_to_async(public_reading_result)(body, ingestor))
+
+
+async def bulk_readings_public(request):
+    """
+    Endpoint público para registrar múltiples lecturas (asíncrono)
+    POST /api/public/readings/bulk/
+    Body: {"readings": [{"meter_id": "MTR001", "accumulated_value": 12345.67, "timestamp": "..."}, ...]}
+    """
+    if request.method != 'POST':
+        return _method_not_allowed()
+    body = _parse_body(request)
+    if body is None:
+        return _error({'non_field_errors': ['El cuerpo debe ser un objeto JSON']})
+
+    serializer = BulkReadingSerializer(data=body)
+    if not serializer.is_valid():
+        return _error(serializer.errors)
+    readings = serializer.validated_data['readings']
+
+    if request.META.get(IDEMPOTENCY_HEADER):
+        return await sync_to_async(idempotent_response)(
+            PUBLIC_BULK_READINGS, request, lambda: public_readings_result(readings), json_response
+        )
+
+    if settings.READING_INGEST_MODE == 'queue':
+        return _respond(queued_readings_result(*await aenqueue_readings(readings)))
+
+    return _respond(await sync_to_async(public_readings_result)(readings))
+
+
+# Sin estado de sesión: no aplica la protección CSRF (como las vistas DRF con AllowAny)
+create_reading_public.csrf_exempt = True
+bulk_readings_public.csrf_exempt = True
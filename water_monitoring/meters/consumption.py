@@ -0,0 +1,61 @@
+# meters/consumption.py
+
+"""
+Series de consumo para gráficas.
+
+El consumo de cada lectura respecto a la anterior se calcula en una sola
+pasada sobre las lecturas de la ventana (una consulta ordenada por el índice
+(meter, timestamp)), en lugar de una consulta de "lectura anterior" por fila.
+Las series por día u hora (hora local) se leen de los agregados de
+meters/rollups.py.
+"""
+
+from .models import ConsumptionReading
+from .rollups import rollup_series
+
+
+def reading_deltas(meter, since):
+    """
+    Itera (timestamp, unidades, horas) entre cada lectura desde `since` y la
+    anterior dentro de la misma ventana, en orden cronológico.
+    """
+    rows = (
+        ConsumptionReading.objects
+        .filter(meter=meter, timestamp__gte=since)
+        .order_by('timestamp')
+        .values_list('timestamp', 'accumulated_value')
+    )
+    previous_timestamp = previous_value = None
+    for timestamp, value in rows.iterator(chunk_size=2000):
+        if previous_timestamp is not None:
+            hours = (timestamp - previous_timestamp).total_seconds() / 3600
+            yield timestamp, float(value - previous_value), hours
+        previous_timestamp, previous_value = timestamp, value
+
+
+def consumption_series(meter, since, bucket=None):
+    """
+    Datos de la gráfica de consumo de un contador.
+
+    Args:
+        meter: Meter (con `model` cargado para no consultarlo de nuevo)
+        since: Fecha de inicio de la ventana
+        bucket: None (un punto por lectura), 'day' u 'hour'
+
+    Returns:
+        list: Puntos {'date', 'liters', 'hours'}; con bucket, la suma de litros
+        y horas de cada intervalo y su número de lecturas en 'readings'. La
+        ventana por intervalos empieza al inicio del intervalo de `since`.
+    """
+    if bucket is not None:
+        return rollup_series(meter, since, bucket)
+
+    liters_per_unit = float(meter.model.liters_per_unit)
+    return [
+        {
+            'date': timestamp.date().isoformat(),
+            'liters': round(units * liters_per_unit, 2),
+            'hours': round(hours, 2),
+        }
+        for timestamp, units, hours in reading_deltas(meter, since)
+    ]
@@ -0,0 +1,130 @@
+# meters/csv_import.py
+
+"""
+Importación de lecturas desde CSV por bloques y en streaming.
+
+El archivo se decodifica de forma incremental (nunca se carga completo en
+memoria), las filas se agrupan en bloques de `chunk_size` y cada bloque pasa
+por `ReadingIngestor` (una consulta por contadores nuevos + `bulk_create`).
+
+Formato: meter_id,accumulated_value,timestamp
+"""
+
+import csv
+import io
+import time
+
+from .ingest import ReadingIngestor
+
+REQUIRED_COLUMNS = ('meter_id', 'accumulated_value')
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+
+def open_text(binary_file, encoding='utf-8'):
+    """Envuelve un archivo binario (p. ej. UploadedFile) para decodificarlo incrementalmente"""
+    return io.TextIOWrapper(binary_file, encoding=encoding, newline='')
+
+
+def _format_errors(row_number, errors):
+    details = '; '.join(
+        f"{field}: {' '.join(str(m) for m in messages)}"
+        for field, messages in errors.items()
+    )
+    return f"Fila {row_number}: {details}"
+
+
+class CSVImporter:
+    """
+    Importador por bloques con reporte de progreso.
+
+    `run()` es un generador que produce un dict de progreso tras cada bloque
+    (filas procesadas, creadas, duplicadas, fallidas, filas/s); el último dict tiene
+    `done=True` e incluye los errores (limitados a `max_errors` mensajes).
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, max_errors=MAX_REPORTED_ERRORS):
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.ingestor = ReadingIngestor()
+        self.processed = 0
+        self.created = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors = []
+
+    def _error(self, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(message)
+
+    def _progress(self, started, done=False):
+        elapsed = time.monotonic() - started
+        progress = {
+            'done': done,
+            'processed': self.processed,
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'elapsed_seconds': round(elapsed, 2),
+            'rows_per_second': round(self.processed / elapsed, 1) if elapsed > 0 else 0,
+        }
+        if done:
+            progress.update({
+                'success': self.failed == 0,
+                'errors': self.errors,
+                'errors_truncated': self.failed > len(self.errors),
+            })
+        return progress
+
+    def _flush(self, rows):
+        readings = [data for _, data in rows]
+        created, duplicates, errors = self.ingestor.ingest(readings)
+        self.created += len(created)
+        self.duplicates += len(duplicates)
+        for error in errors:
+            self._error(_format_errors(rows[error['index']][0], error['errors']))
+
+    def run(self, text_stream):
+        started = time.monotonic()
+        reader = csv.DictReader(text_stream)
+
+        missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            for column in missing:
+                self._error(f"Falta columna '{column}'")
+            yield self._progress(started, done=True)
+            return
+
+        rows = []
+        for row_number, row in enumerate(reader, start=1):
+            self.processed += 1
+            empty = [c for c in REQUIRED_COLUMNS if not row.get(c)]
+            if empty:
+                self._error(f"Fila {row_number}: Falta columna '{empty[0]}'")
+                continue
+
+            data = {
+                'meter_id': row['meter_id'].strip(),
+                'accumulated_value': row['accumulated_value'].strip(),
+            }
+            timestamp = (row.get('timestamp') or '').strip()
+            if timestamp:
+                data['timestamp'] = timestamp
+            rows.append((row_number, data))
+
+            if len(rows) >= self.chunk_size:
+                self._flush(rows)
+                rows = []
+                yield self._progress(started)
+
+        if rows:
+            self._flush(rows)
+        yield self._progress(started, done=True)
+
+    def import_all(self, text_stream, on_progress=None):
+        """Ejecuta la importación completa y retorna el resumen final"""
+        for progress in self.run(text_stream):
+            if on_progress is not None:
+                on_progress(progress)
+        return progress
@@ -0,0 +1,140 @@
+# meters/dashboard.py
+
+"""
+Detalle de un contador para el panel lateral del dashboard.
+
+Las estadísticas, las lecturas recientes y la serie de la gráfica salen de un
+solo recorrido de las lecturas del contador, ordenado por el índice
+(meter, timestamp) y desde la lectura anterior a la ventana más amplia que se
+pida (semilla del primer consumo). Cada sección calcula su parte al pasar por
+las lecturas, así que pedir las tres cuesta lo mismo que pedir una.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ReadingPoint, ConsumptionReading, consumption_stats
+
+SECTIONS = ('stats', 'readings', 'chart')
+
+
+def _scan(meter, since):
+    """Lecturas del contador desde `since`, más la inmediatamente anterior, en orden cronológico"""
+    seed = (
+        ConsumptionReading.objects
+        .filter(meter=meter, timestamp__lt=since)
+        .order_by('-timestamp')
+        .values('timestamp')[:1]
+    )
+    return (
+        ConsumptionReading.objects
+        .filter(meter=meter, timestamp__gte=Coalesce(Subquery(seed), Value(since)))
+        .order_by('timestamp', 'id')
+    )
+
+
+def _chart_start(since, bucket, tz):
+    local = since.astimezone(tz)
+    if bucket == 'day':
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == 'hour':
+        return local.replace(minute=0, second=0, microsecond=0)
+    return since
+
+
+def meter_dashboard(meter, sections=SECTIONS, days=30, readings_days=7, bucket=None):
+    """
+    Secciones del detalle de un contador.
+
+    Args:
+        meter: Meter (con `model` cargado)
+        sections: Secciones a incluir ('stats', 'readings', 'chart')
+        days: Ventana de las estadísticas y de la gráfica
+        readings_days: Ventana de las lecturas recientes
+        bucket: None (un punto por lectura), 'day' u 'hour' para la gráfica
+
+    Returns:
+        dict: Solo las secciones pedidas, con el mismo formato que /stats/,
+        /readings/ y /consumption_chart/
+    """
+    tz = timezone.get_current_timezone()
+    now = timezone.now()
+    liters_per_unit = float(meter.model.liters_per_unit)
+
+    stats_since = now - timedelta(days=days)
+    readings_since = now - timedelta(days=readings_days)
+    chart_start = _chart_start(stats_since, bucket, tz)
+
+    want_stats, want_readings, want_chart = (section in sections for section in SECTIONS)
+    starts = [start for start, wanted in ((stats_since, want_stats), (readings_since, want_readings),
+                                          (chart_start, want_chart)) if wanted]
+
+    first_in_window = None
+    window_count = 0
+    readings = []
+    points = []
+    buckets = {}
+
+    previous = None
+    for reading in (_scan(meter, min(starts)) if starts else []):
+        reading.meter = meter
+        timestamp, value = reading.timestamp, reading.accumulated_value
+
+        if want_stats and timestamp >= stats_since:
+            window_count += 1
+            if first_in_window is None:
+                first_in_window = ReadingPoint(reading.pk, value, timestamp)
+
+        if want_readings and timestamp >= readings_since:
+            # Mismos atributos que with_previous_reading(): sin consulta por lectura
+            reading.previous_reading_id = previous.pk if previous else None
+            reading.previous_reading_value = previous.accumulated_value if previous else None
+            reading.previous_reading_at = previous.timestamp if previous else None
+            readings.append(reading)
+
+        if want_chart and timestamp >= chart_start:
+            if bucket is None:
+                if previous is not None and previous.timestamp >= chart_start:
+                    hours = (timestamp - previous.timestamp).total_seconds() / 3600
+                    points.append({
+                        'date': timestamp.date().isoformat(),
+                        'liters': round(float(value - previous.accumulated_value) * liters_per_unit, 2),
+                        'hours': round(hours, 2),
+                    })
+            else:
+                local = timestamp.astimezone(tz)
+                key = local.date() if bucket == 'day' else local.replace(minute=0, second=0, microsecond=0)
+                entry = buckets.setdefault(key, {'units': 0, 'hours': 0.0, 'readings': 0})
+                entry['readings'] += 1
+                if previous is not None:
+                    entry['units'] += value - previous.accumulated_value
+                    entry['hours'] += (timestamp - previous.timestamp).total_seconds() / 3600
+
+        previous = reading
+
+    result = {}
+    if want_stats:
+        last = meter.get_last_reading()
+        if window_count < 2 or last is None:
+            result['stats'] = {}
+        else:
+            result['stats'] = consumption_stats(first_in_window, last, days, meter.model.liters_per_unit)
+    if want_readings:
+        result['readings'] = readings
+    if want_chart:
+        if bucket is None:
+            result['chart'] = points
+        else:
+            result['chart'] = [
+                {
+                    'date': key.isoformat(),
+                    'liters': round(float(entry['units']) * liters_per_unit, 2),
+                    'hours': round(entry['hours'], 2),
+                    'readings': entry['readings'],
+                }
+                for key, entry in buckets.items()
+            ]
+    return result
@@ -0,0 +1,293 @@
+# meters/detection.py
+
+"""
+Detección incremental de anomalías y fugas.
+
+Cada contador tiene un estado (MeterDetectionState) con lo necesario para
+evaluar la siguiente lectura sin releer el historial: la última lectura
+evaluada, la media y la varianza móviles (EWMA) del caudal, desde cuándo no
+consume y el caudal mínimo de la noche en curso. La ingesta lo actualiza
+dentro de su transacción, con los contadores ya bloqueados, con O(1) por
+lectura y dos consultas por lote (leer y guardar los estados).
+
+Alertas (Alert):
+- leak: el caudal mínimo entre lecturas de la ventana nocturna
+  (ALERT_NIGHT_START_HOUR a ALERT_NIGHT_END_HOUR, hora local) no bajó de
+  ALERT_LEAK_MIN_FLOW L/h. Se evalúa con la primera lectura posterior a la
+  ventana y se resuelve tras una noche por debajo del umbral.
+- spike: el caudal de un intervalo supera la media móvil en más de
+  ALERT_SPIKE_SIGMAS desviaciones (y en al menos ALERT_SPIKE_MIN_FLOW L/h).
+  Se resuelve cuando el caudal vuelve al rango normal.
+- no_consumption: el valor acumulado no cambia durante
+  ALERT_NO_CONSUMPTION_HOURS horas (contador detenido o sin uso). Se resuelve
+  al volver a consumir.
+- rollover / regression: lecturas posteriores a la última guardada y
+  rechazadas por ser menores que ella; rollover si parece una vuelta a cero
+  del registro (p. ej. de 99990 a 12). Los rechazos de cargas históricas
+  (fuera de orden respecto a sus vecinas) no generan alerta. Se resuelven a
+  mano.
+
+Cada contador tiene como mucho una alerta abierta por tipo; el estado guarda
+cuáles lo están para no consultarlas. Las lecturas anteriores a la última
+evaluada (cargas históricas) no se evalúan en la ingesta: backfill_alerts
+reconstruye estado y alertas reproduciendo el historial.
+"""
+
+from datetime import datetime, time
+from math import sqrt
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Alert, ConsumptionReading, MeterDetectionState, lock_meters
+
+# Peso de cada intervalo nuevo en la media móvil del caudal
+EWMA_ALPHA = 0.1
+# Intervalos evaluados antes de buscar picos (la media aún no es estable)
+WARMUP_INTERVALS = 10
+# Tipos que se reconstruyen desde el historial (el resto viene de lecturas rechazadas)
+REPLAYED_KINDS = (Alert.LEAK, Alert.SPIKE, Alert.NO_CONSUMPTION)
+STATE_FIELDS = [
+    'last_reading_at', 'last_value', 'intervals', 'flow_mean', 'flow_var',
+    'zero_since', 'night', 'night_min_flow', 'open_alerts',
+]
+
+
+class AlertChanges:
+    """Alertas abiertas y resueltas al evaluar un lote, guardadas al final con `save`"""
+
+    def __init__(self):
+        self.created = []
+        self.pending = {}
+        self.resolutions = []
+
+    def open(self, state, kind, started_at, value, message, details=None):
+        if kind in state.open_alerts:
+            return
+        alert = Alert(meter_id=state.meter_id, kind=kind, started_at=started_at, value=value,
+                      message=message[:255], details=details or {})
+        self.created.append(alert)
+        self.pending[(state.meter_id, kind)] = alert
+        state.open_alerts = [*state.open_alerts, kind]
+
+    def resolve(self, state, kind, resolved_at):
+        if kind not in state.open_alerts:
+            return
+        state.open_alerts = [open_kind for open_kind in state.open_alerts if open_kind != kind]
+        alert = self.pending.pop((state.meter_id, kind), None)
+        if alert is not None:
+            alert.resolved_at = resolved_at
+        else:
+            self.resolutions.append((state.meter_id, kind, resolved_at))
+
+    def save(self):
+        # Las resoluciones son de alertas anteriores al lote: primero, para no
+        # chocar con las nuevas del mismo tipo en la restricción de abiertas
+        for meter_pk, kind, resolved_at in self.resolutions:
+            Alert.objects.filter(meter_id=meter_pk, kind=kind, resolved_at__isnull=True).update(
+                resolved_at=resolved_at
+            )
+        return Alert.objects.bulk_create(self.created, batch_size=1000)
+
+
+def _night_window(day, tz):
+    return (datetime.combine(day, time(settings.ALERT_NIGHT_START_HOUR), tzinfo=tz),
+            datetime.combine(day, time(settings.ALERT_NIGHT_END_HOUR), tzinfo=tz))
+
+
+def observe(state, liters_per_unit, timestamp, value, changes, tz):
+    """
+    Incorpora al estado una lectura posterior a la última evaluada (O(1)).
+
+    Args:
+        state: MeterDetectionState del contador
+        liters_per_unit: Litros por unidad del modelo (float)
+        changes: AlertChanges donde se registran las alertas
+    """
+    last_at, last_value = state.last_reading_at, state.last_value
+    state.last_reading_at, state.last_value = timestamp, value
+    if last_at is None:
+        return
+    hours = (timestamp - last_at).total_seconds() / 3600
+    if hours <= 0:
+        return
+    flow = float(value - last_value) * liters_per_unit / hours
+
+    # Sin consumo
+    if value == last_value:
+        if state.zero_since is None:
+            state.zero_since = last_at
+        idle_hours = (timestamp - state.zero_since).total_seconds() / 3600
+        if idle_hours >= settings.ALERT_NO_CONSUMPTION_HOURS:
+            changes.open(state, Alert.NO_CONSUMPTION, state.zero_since, round(idle_hours, 1),
+                         f"Sin consumo durante {idle_hours:.0f} h")
+    else:
+        state.zero_since = None
+        changes.resolve(state, Alert.NO_CONSUMPTION, timestamp)
+
+    # Picos respecto a la media móvil (antes de incluir este intervalo)
+    std = sqrt(state.flow_var)
+    threshold = state.flow_mean + settings.ALERT_SPIKE_SIGMAS * std
+    if (state.intervals >= WARMUP_INTERVALS and flow > threshold
+            and flow - state.flow_mean >= settings.ALERT_SPIKE_MIN_FLOW):
+        changes.open(state, Alert.SPIKE, timestamp, round(flow, 2),
+                     f"Caudal de {flow:.1f} L/h (media {state.flow_mean:.1f} L/h)",
+                     {'flow_mean': round(state.flow_mean, 2), 'flow_std': round(std, 2)})
+    elif flow <= threshold:
+        changes.resolve(state, Alert.SPIKE, timestamp)
+
+    if state.intervals == 0:
+        state.flow_mean, state.flow_var = flow, 0.0
+    else:
+        diff = flow - state.flow_mean
+        increment = EWMA_ALPHA * diff
+        state.flow_mean += increment
+        state.flow_var = (1 - EWMA_ALPHA) * (state.flow_var + diff * increment)
+    state.intervals += 1
+
+    # Caudal nocturno: se evalúa la noche en curso al pasar su ventana
+    if state.night is not None and timestamp > _night_window(state.night, tz)[1]:
+        night_start = _night_window(state.night, tz)[0]
+        if state.night_min_flow >= settings.ALERT_LEAK_MIN_FLOW:
+            changes.open(state, Alert.LEAK, night_start, round(state.night_min_flow, 2),
+                         f"Caudal nocturno mínimo de {state.night_min_flow:.1f} L/h",
+                         {'night': state.night.isoformat()})
+        else:
+            changes.resolve(state, Alert.LEAK, timestamp)
+        state.night = state.night_min_flow = None
+
+    day = timestamp.astimezone(tz).date()
+    night_start, night_end = _night_window(day, tz)
+    if last_at >= night_start and timestamp <= night_end:
+        if state.night == day:
+            state.night_min_flow = min(state.night_min_flow, flow)
+        else:
+            state.night, state.night_min_flow = day, flow
+
+
+def is_rollover(previous_value, value):
+    """Si pasar de `previous_value` a `value` parece una vuelta a cero del registro del contador"""
+    if previous_value is None or previous_value <= 0:
+        return False
+    capacity = 10 ** len(str(int(previous_value)))
+    return previous_value >= capacity * 0.9 and value < capacity * 0.1
+
+
+def _states(meter_pks):
+    states = {state.pk: state for state in MeterDetectionState.objects.filter(meter_id__in=meter_pks)}
+    created = [MeterDetectionState(meter_id=pk) for pk in meter_pks if pk not in states]
+    states.update((state.meter_id, state) for state in created)
+    return states, created
+
+
+def detect_readings(meters, readings, rejected=()):
+    """
+    Evalúa lecturas recién insertadas y rechazadas. Debe llamarse en la
+    transacción de la ingesta, con los contadores bloqueados.
+
+    Args:
+        meters: pk -> Meter bloqueado (con `model`)
+        readings: Lecturas insertadas
+        rejected: [(lectura, mensaje)] rechazadas por monotonía
+
+    Returns:
+        list: Alertas creadas
+    """
+    meter_pks = {reading.meter_id for reading in readings} | {reading.meter_id for reading, _ in rejected}
+    if not meter_pks:
+        return []
+    tz = timezone.get_current_timezone()
+    states, created = _states(meter_pks)
+    changes = AlertChanges()
+
+    for reading in sorted(readings, key=lambda reading: (reading.meter_id, reading.timestamp)):
+        state = states[reading.meter_id]
+        if state.last_reading_at is not None and reading.timestamp <= state.last_reading_at:
+            continue
+        observe(state, float(meters[reading.meter_id].model.liters_per_unit),
+                reading.timestamp, reading.accumulated_value, changes, tz)
+
+    for reading, message in rejected:
+        meter = meters[reading.meter_id]
+        value = reading.accumulated_value
+        # Solo las posteriores a la última lectura y menores que ella: un rechazo
+        # entre vecinas (carga histórica) no indica un problema del contador
+        if (meter.last_reading_at is None or reading.timestamp <= meter.last_reading_at
+                or value >= meter.last_reading_value):
+            continue
+        if is_rollover(meter.last_reading_value, value):
+            changes.open(states[meter.pk], Alert.ROLLOVER, reading.timestamp, float(value),
+                         f"El contador pasó de {meter.last_reading_value} a {value}: "
+                         f"posible vuelta a cero o cambio de contador",
+                         {'previous_value': float(meter.last_reading_value)})
+        else:
+            changes.open(states[meter.pk], Alert.REGRESSION, reading.timestamp, float(value), message)
+
+    new_pks = {state.meter_id for state in created}
+    MeterDetectionState.objects.bulk_create(created)
+    MeterDetectionState.objects.bulk_update(
+        [state for pk, state in states.items() if pk not in new_pks], STATE_FIELDS, batch_size=500
+    )
+    return changes.save()
+
+
+def resolve_alert(alert):
+    """Resuelve a mano una alerta abierta (p. ej. una regresión ya revisada)"""
+    with transaction.atomic():
+        # Mismo orden de bloqueo que la ingesta, que también modifica el estado
+        lock_meters([alert.meter_id])
+        resolved_at = timezone.now()
+        if not Alert.objects.filter(pk=alert.pk, resolved_at__isnull=True).update(resolved_at=resolved_at):
+            return False
+        state = MeterDetectionState.objects.filter(pk=alert.meter_id).first()
+        if state is not None and alert.kind in state.open_alerts:
+            state.open_alerts = [kind for kind in state.open_alerts if kind != alert.kind]
+            state.save(update_fields=['open_alerts'])
+    alert.resolved_at = resolved_at
+    return True
+
+
+def backfill_alerts(meters, chunk_size=100, on_progress=None):
+    """
+    Reconstruye el estado del detector y las alertas de `meters` reproduciendo
+    su historial, por grupos de `chunk_size` contadores: una consulta que
+    recorre las lecturas del grupo en bloques y una escritura de estados y
+    alertas por grupo. Reemplaza las alertas de fuga, picos y sin consumo
+    (abiertas y resueltas); las regresiones y vueltas a cero se conservan.
+
+    Los contadores de cada grupo quedan bloqueados mientras se reproduce su
+    historial (la ingesta de esos contadores espera). Retorna cuántos
+    contadores se procesaron.
+    """
+    tz = timezone.get_current_timezone()
+    count = 0
+    pks = list(meters.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), chunk_size):
+        group = pks[start:start + chunk_size]
+        with transaction.atomic():
+            locked = lock_meters(group)
+            kept = {
+                state.pk: [kind for kind in state.open_alerts if kind not in REPLAYED_KINDS]
+                for state in MeterDetectionState.objects.filter(meter_id__in=locked)
+            }
+            states = {pk: MeterDetectionState(meter_id=pk, open_alerts=kept.get(pk, [])) for pk in locked}
+            Alert.objects.filter(meter_id__in=locked, kind__in=REPLAYED_KINDS).delete()
+            MeterDetectionState.objects.filter(meter_id__in=locked).delete()
+
+            changes = AlertChanges()
+            rows = (
+                ConsumptionReading.objects.filter(meter_id__in=locked)
+                .order_by('meter_id', 'timestamp', 'id')
+                .values_list('meter_id', 'timestamp', 'accumulated_value')
+            )
+            liters_per_unit = {pk: float(meter.model.liters_per_unit) for pk, meter in locked.items()}
+            for meter_pk, timestamp, value in rows.iterator(chunk_size=5000):
+                observe(states[meter_pk], liters_per_unit[meter_pk], timestamp, value, changes, tz)
+
+            MeterDetectionState.objects.bulk_create(states.values(), batch_size=500)
+            changes.save()
+        count += len(locked)
+        if on_progress is not None:
+            on_progress(count)
+    return count
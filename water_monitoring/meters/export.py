@@ -0,0 +1,160 @@
+# meters/export.py
+
+"""
+Exportación masiva de lecturas en streaming (CSV, NDJSON o Parquet).
+
+Las filas se leen con `.iterator(chunk_size=...)` (cursor del lado del
+servidor en PostgreSQL) y se escriben por bloques, así que la memoria se
+mantiene constante sin importar el tamaño de la exportación. El CSV usa las
+mismas columnas que la importación (meter_id,accumulated_value,timestamp) más
+los litros acumulados.
+
+Parquet requiere `pyarrow` (dependencia opcional).
+"""
+
+import csv
+import json
+
+from .models import ConsumptionReading
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+COLUMNS = ['meter_id', 'accumulated_value', 'timestamp', 'liters']
+DEFAULT_CHUNK_SIZE = 5000
+
+
+class _Buffer:
+    """Destino de escritura que acumula lo escrito hasta que se drena"""
+
+    def __init__(self, empty):
+        self.empty = empty
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = self.empty.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Itera (meter_id, accumulated_value, timestamp, liters_per_unit) en orden cronológico"""
+    return (
+        queryset
+        .order_by('timestamp', 'id')
+        .values_list('meter__meter_id', 'accumulated_value', 'timestamp', 'meter__model__liters_per_unit')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _liters(value, liters_per_unit):
+    return round(float(value) * float(liters_per_unit), 2)
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv_chunks(rows, chunk_size):
+    buffer = _Buffer('')
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for batch in _batches(rows, chunk_size):
+        for meter_id, value, timestamp, liters_per_unit in batch:
+            writer.writerow([meter_id, value, timestamp.isoformat(), _liters(value, liters_per_unit)])
+        yield buffer.drain()
+    yield buffer.drain()
+
+
+def _ndjson_chunks(rows, chunk_size):
+    for batch in _batches(rows, chunk_size):
+        yield ''.join(
+            json.dumps({
+                'meter_id': meter_id,
+                'accumulated_value': float(value),
+                'timestamp': timestamp.isoformat(),
+                'liters': _liters(value, liters_per_unit),
+            }) + '\n'
+            for meter_id, value, timestamp, liters_per_unit in batch
+        )
+
+
+def _parquet_chunks(rows, chunk_size):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('meter_id', pa.string()),
+        ('accumulated_value', pa.decimal128(15, 2)),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+        ('liters', pa.float64()),
+    ])
+    buffer = _Buffer(b'')
+    # Cada bloque es un row group: se drena tras escribirlo
+    with pq.ParquetWriter(buffer, schema, compression='zstd') as writer:
+        for batch in _batches(rows, chunk_size):
+            meter_ids, values, timestamps, liters = [], [], [], []
+            for meter_id, value, timestamp, liters_per_unit in batch:
+                meter_ids.append(meter_id)
+                values.append(value)
+                timestamps.append(timestamp)
+                liters.append(_liters(value, liters_per_unit))
+            writer.write_table(pa.table([meter_ids, values, timestamps, liters], schema=schema))
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def check_format(fmt):
+    """Valida el formato; lanza ValueError con un mensaje para el cliente"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado, use uno de: {', '.join(FORMATS)}")
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("La exportación Parquet requiere instalar pyarrow")
+
+
+def export_chunks(queryset, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Genera el contenido exportado por bloques (str para CSV/NDJSON, bytes para Parquet)"""
+    rows = export_rows(queryset, chunk_size)
+    writers = {'csv': _csv_chunks, 'ndjson': _ndjson_chunks, 'parquet': _parquet_chunks}
+    for chunk in writers[fmt](rows, chunk_size):
+        if chunk:
+            yield chunk
+
+
+def readings_for_export(meter_ids=None, since=None, until=None):
+    queryset = ConsumptionReading.objects.all()
+    if meter_ids:
+        queryset = queryset.filter(meter__meter_id__in=meter_ids)
+    if since is not None:
+        queryset = queryset.filter(timestamp__gte=since)
+    if until is not None:
+        queryset = queryset.filter(timestamp__lt=until)
+    return queryset
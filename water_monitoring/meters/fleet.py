@@ -0,0 +1,112 @@
+# meters/fleet.py
+
+"""
+Agregados de consumo a nivel de red (todos los contadores, un modelo o una
+zona del mapa).
+
+Todo se calcula con consultas agregadas sobre MeterDailyConsumption (una
+fila por contador y día), así que el costo depende del número de días de la
+ventana y no del número de lecturas; decenas de miles de contadores se
+resuelven en unas pocas consultas.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from .geo import in_bbox
+from .models import Meter, MeterDailyConsumption
+
+GROUP_BY = ('model',)
+
+_LITERS = ExpressionWrapper(
+    F('units') * F('meter__model__liters_per_unit'),
+    output_field=DecimalField(max_digits=24, decimal_places=6)
+)
+
+
+def _liters(value, days=1):
+    return round(float(value or 0) / days, 2)
+
+
+def fleet_stats(days=30, model_id=None, bbox=None, top=10, group_by=None):
+    """
+    Consumo agregado de los contadores activos en los últimos `days` días
+    locales completos (incluido hoy).
+
+    Args:
+        days: Tamaño de la ventana en días
+        model_id: Limita a un MeterModel
+        bbox: (min_lon, min_lat, max_lon, max_lat) para limitar a una zona
+        top: Número de mayores consumidores a retornar
+        group_by: None o 'model' para desglosar por modelo de contador
+    """
+    today = timezone.localdate()
+    start_day = today - timedelta(days=days - 1)
+
+    meters = Meter.objects.filter(is_active=True)
+    if model_id is not None:
+        meters = meters.filter(model_id=model_id)
+    if bbox is not None:
+        meters = in_bbox(meters, bbox)
+
+    rollups = MeterDailyConsumption.objects.filter(meter__in=meters, day__gte=start_day)
+    totals = rollups.aggregate(liters=Sum(_LITERS), reporting=Count('meter', distinct=True))
+
+    top_consumers = (
+        rollups.values('meter_id')
+        .annotate(liters=Sum(_LITERS))
+        .order_by('-liters')
+        .values('meter_id', 'meter__meter_id', 'meter__model__name', 'meter__address', 'liters')[:top]
+    )
+
+    reporting = totals['reporting']
+    result = {
+        'days': days,
+        'from': start_day,
+        'to': today,
+        'scope': {
+            'model': model_id,
+            'bbox': list(bbox) if bbox is not None else None,
+        },
+        'meters': meters.count(),
+        'reporting_meters': reporting,
+        'total_liters': _liters(totals['liters']),
+        'avg_daily_liters': _liters(totals['liters'], days),
+        'avg_daily_liters_per_meter': _liters(totals['liters'], days * reporting) if reporting else 0,
+        'top_consumers': [
+            {
+                'id': row['meter_id'],
+                'meter_id': row['meter__meter_id'],
+                'model_name': row['meter__model__name'],
+                'address': row['meter__address'],
+                'total_liters': _liters(row['liters']),
+                'avg_daily_liters': _liters(row['liters'], days),
+            }
+            for row in top_consumers
+        ],
+    }
+
+    if group_by == 'model':
+        meter_counts = dict(
+            meters.order_by().values('model_id').annotate(total=Count('id')).values_list('model_id', 'total')
+        )
+        groups = (
+            rollups.values('meter__model_id', 'meter__model__name')
+            .annotate(liters=Sum(_LITERS), reporting=Count('meter', distinct=True))
+            .order_by('-liters')
+        )
+        result['groups'] = [
+            {
+                'model': group['meter__model_id'],
+                'model_name': group['meter__model__name'],
+                'meters': meter_counts.get(group['meter__model_id'], 0),
+                'reporting_meters': group['reporting'],
+                'total_liters': _liters(group['liters']),
+                'avg_daily_liters': _liters(group['liters'], days),
+            }
+            for group in groups
+        ]
+
+    return result
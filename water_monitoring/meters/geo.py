@@ -0,0 +1,155 @@
+# meters/geo.py
+
+"""
+Consultas espaciales de contadores sin PostGIS.
+
+Cada contador guarda el geohash de su posición (Meter.geohash, índice
+B-tree). Un geohash es una celda de una rejilla jerárquica: los contadores de
+una celda comparten el prefijo, así que
+
+- un bbox se cubre con unas pocas celdas y se filtra con `LIKE 'celda%'`
+  sobre el índice (más el rango exacto de latitud/longitud);
+- agrupar por los primeros N caracteres agrupa por celdas del tamaño
+  adecuado para el zoom, que es como se forman los clusters del mapa.
+"""
+
+import math
+
+from django.db.models import Avg, Count, Max, Min, Q
+from django.db.models.functions import Substr
+
+GEOHASH_PRECISION = 12
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Máximo de celdas usadas para cubrir un bbox
+MAX_COVER_CELLS = 12
+# Ancho aproximado de un cluster en pantalla (px) y zoom desde el que no se agrupa
+CLUSTER_PIXELS = 60
+CLUSTER_MAX_ZOOM = 16
+# Con menos contadores que esto en la vista se envían los puntos sin agrupar
+MAX_POINTS = 500
+
+
+def parse_bbox(value):
+    """Convierte 'min_lon,min_lat,max_lon,max_lat' en tupla de floats (ValueError si no es válido)"""
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError("bbox debe tener 4 valores: min_lon,min_lat,max_lon,max_lat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox inválido: los mínimos deben ser menores que los máximos")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash de un punto"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(alto, ancho) en grados de una celda de geohash"""
+    lon_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision - lon_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def cover_bbox(bbox):
+    """
+    Celdas de geohash que cubren el bbox: la precisión más fina que no pase
+    de MAX_COVER_CELLS celdas.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    cells = ['']
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        height, width = cell_size(precision)
+        rows = math.floor((max_lat + 90) / height) - math.floor((min_lat + 90) / height) + 1
+        columns = math.floor((max_lon + 180) / width) - math.floor((min_lon + 180) / width) + 1
+        if rows * columns > MAX_COVER_CELLS:
+            break
+        start_lat = (math.floor((min_lat + 90) / height) + 0.5) * height - 90
+        start_lon = (math.floor((min_lon + 180) / width) + 0.5) * width - 180
+        cells = [
+            encode_geohash(start_lat + row * height, start_lon + column * width, precision)
+            for row in range(rows) for column in range(columns)
+        ]
+    return cells
+
+
+def cluster_precision(zoom):
+    """Precisión de geohash cuyas celdas miden unos CLUSTER_PIXELS px de ancho a ese zoom"""
+    # En el zoom z el mundo mide 256 * 2^z px: hacen falta z + log2(256 / px) bits de longitud
+    lon_bits = zoom + math.log2(256 / CLUSTER_PIXELS)
+    precision = 1
+    while precision < GEOHASH_PRECISION and math.ceil(5 * (precision + 1) / 2) <= lon_bits:
+        precision += 1
+    return precision
+
+
+def in_bbox(meters, bbox):
+    """Filtra un queryset de contadores al bbox usando el índice de geohash"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    cells = Q()
+    for cell in cover_bbox(bbox):
+        cells |= Q(geohash__startswith=cell)
+    return meters.filter(
+        cells,
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lon, longitude__lte=max_lon,
+    )
+
+
+def clusters(meters, zoom):
+    """Agrupa los contadores en celdas según el zoom: conteo, centro y extensión de cada una"""
+    rows = (
+        meters.order_by()
+        .values(cell=Substr('geohash', 1, cluster_precision(zoom)))
+        .annotate(
+            count=Count('id'),
+            center_lat=Avg('latitude'), center_lon=Avg('longitude'),
+            min_lat=Min('latitude'), min_lon=Min('longitude'),
+            max_lat=Max('latitude'), max_lon=Max('longitude'),
+        )
+        .order_by('cell')
+    )
+    return [
+        {
+            'cell': row['cell'],
+            'count': row['count'],
+            'latitude': round(float(row['center_lat']), 6),
+            'longitude': round(float(row['center_lon']), 6),
+            'bounds': [float(row['min_lon']), float(row['min_lat']),
+                       float(row['max_lon']), float(row['max_lat'])],
+        }
+        for row in rows
+    ]
+
+
+def extent(meters):
+    """[min_lon, min_lat, max_lon, max_lat] de los contadores, o None si no hay"""
+    bounds = meters.aggregate(
+        min_lon=Min('longitude'), min_lat=Min('latitude'),
+        max_lon=Max('longitude'), max_lat=Max('latitude'),
+    )
+    if bounds['min_lon'] is None:
+        return None
+    return [float(bounds[key]) for key in ('min_lon', 'min_lat', 'max_lon', 'max_lat')]
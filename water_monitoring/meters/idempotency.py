@@ -0,0 +1,102 @@
+# meters/idempotency.py
+
+"""
+Encabezado Idempotency-Key de los endpoints públicos de ingesta.
+
+Un dispositivo que reintenta una petición (p. ej. tras un timeout) puede
+enviar la misma clave: la primera respuesta se guarda en la misma transacción
+que las lecturas y los reintentos la reciben tal cual tras buscar la clave,
+sin volver a procesarse. Es útil sobre todo cuando las lecturas no traen `timestamp`
+(se usa la hora del servidor y un reintento no sería un duplicado de la
+clave (meter, timestamp)).
+
+Solo se guardan las respuestas aceptadas (códigos < 400): una petición
+rechazada se puede corregir y reenviar con la misma clave. Las claves
+caducan tras IDEMPOTENCY_KEY_TTL_HOURS horas (ver prune_idempotency_keys).
+"""
+
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def idempotency_key(request):
+    """
+    Clave enviada en el encabezado Idempotency-Key (None si no hay).
+
+    Raises:
+        ValueError: Si la clave es demasiado larga
+    """
+    key = request.META.get(HEADER, '').strip()
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"Idempotency-Key no puede superar {MAX_KEY_LENGTH} caracteres")
+    return key or None
+
+
+def response_data(data):
+    """
+    Datos de la respuesta como JSON plano, igual que se guardan para las
+    repeticiones: con y sin clave la respuesta se serializa del mismo modo.
+    """
+    return json.loads(json.dumps(data, cls=JSONEncoder))
+
+
+def run_idempotent(endpoint, key, process):
+    """
+    Ejecuta `process` una sola vez por (endpoint, clave).
+
+    Una clave ya guardada se responde con una sola consulta, sin procesar de
+    nuevo ni bloquear contadores.
+
+    Args:
+        endpoint: Nombre del endpoint (las claves no se comparten entre endpoints)
+        key: Clave de idempotencia, o None para procesar sin guardar nada
+        process: Función sin argumentos que procesa la petición y retorna
+            (datos de la respuesta, código HTTP)
+
+    Returns:
+        tuple: (datos, código HTTP, repetida) donde repetida indica que es
+        la respuesta guardada de una petición anterior con la misma clave
+    """
+    if key is None:
+        data, status_code = process()
+        return response_data(data), status_code, False
+
+    stored = IdempotencyKey.objects.filter(endpoint=endpoint, key=key).first()
+    if stored is not None:
+        return stored.response, stored.status_code, True
+
+    try:
+        with transaction.atomic():
+            data, status_code = process()
+            data = response_data(data)
+            if status_code < 400:
+                # Si otra petición con la misma clave se adelantó, falla aquí
+                # y se deshace todo lo que hizo esta
+                IdempotencyKey.objects.create(
+                    endpoint=endpoint, key=key, status_code=status_code, response=data
+                )
+    except IntegrityError:
+        stored = IdempotencyKey.objects.filter(endpoint=endpoint, key=key).first()
+        if stored is None:
+            raise
+        return stored.response, stored.status_code, True
+    return data, status_code, False
+
+
+def prune_idempotency_keys(hours=None):
+    """Elimina las claves guardadas hace más de `hours` horas"""
+    hours = settings.IDEMPOTENCY_KEY_TTL_HOURS if hours is None else hours
+    deleted, _ = IdempotencyKey.objects.filter(
+        created_at__lt=timezone.now() - timedelta(hours=hours)
+    ).delete()
+    return deleted
@@ -0,0 +1,203 @@
+# meters/ingest.py
+
+"""
+Ingesta de lecturas basada en conjuntos.
+
+En lugar de validar e insertar lectura por lectura (varias consultas por
+fila), se resuelven todos los contadores en una sola consulta y, dentro de
+una transacción, se bloquean sus filas, se valida la monotonía contra las
+lecturas vecinas (ver check_reading_order) y se escribe con un INSERT por
+lotes que también actualiza el snapshot y los agregados de consumo de los
+contadores. El bloqueo es el mismo que ya exigía actualizar el snapshot, así
+que validar sin carreras entre escrituras concurrentes no añade consultas.
+
+La ingesta es idempotente: (meter, timestamp) es único y el INSERT usa
+ON CONFLICT DO NOTHING, así que reenviar una lectura (reintentos de los
+dispositivos) no crea otra fila; se reporta como duplicada. Si llega otro
+valor para la misma fecha, se conserva el primero.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Meter, ConsumptionReading, check_reading_order, lock_meters, update_reading_snapshots
+from .detection import detect_readings
+from .rollups import refresh_rollups, spans_for_readings
+from .serializers import ReadingIngestSerializer
+
+
+def meter_not_found_message(meter_id):
+    return f"Contador con ID '{meter_id}' no encontrado o inactivo"
+
+
+def validate_fields(readings_data, now=None):
+    """
+    Valida los campos de cada lectura sin consultar la base de datos.
+
+    Las lecturas sin timestamp reciben `now` desplazado un microsegundo por
+    cada una anterior sin timestamp del lote: conservan el orden y no se
+    descartan como duplicadas entre sí al ser (contador, timestamp) único.
+
+    Returns:
+        tuple: (valid, errors) con valid = [(índice, datos validados)] y errors
+        en el formato de `ReadingIngestor.ingest`
+    """
+    now = now or timezone.now()
+    defaulted = 0
+    valid = []
+    errors = []
+    for idx, reading_data in enumerate(readings_data):
+        serializer = ReadingIngestSerializer(data=reading_data)
+        if serializer.is_valid():
+            data = serializer.validated_data
+            if 'timestamp' not in data:
+                data['timestamp'] = now + timedelta(microseconds=defaulted)
+                defaulted += 1
+            valid.append((idx, data))
+        else:
+            errors.append({
+                'index': idx,
+                'meter_id': reading_data.get('meter_id', 'unknown'),
+                'errors': serializer.errors
+            })
+    return valid, errors
+
+
+def resolve_meters(meter_ids):
+    """Resuelve contadores activos por `meter_id` en una sola consulta"""
+    meters = Meter.objects.filter(meter_id__in=set(meter_ids), is_active=True)
+    return {meter.meter_id: meter for meter in meters}
+
+
+class ReadingIngestor:
+    """
+    Ingestor reutilizable entre lotes.
+
+    Mantiene una caché `meter_id -> Meter` para que importaciones largas por
+    bloques resuelvan cada contador una sola vez (el snapshot se relee al
+    bloquearlo en cada lote).
+    """
+
+    def __init__(self):
+        self.meters = {}
+
+    def _resolve(self, meter_ids):
+        missing = set(meter_ids) - self.meters.keys()
+        if missing:
+            found = resolve_meters(missing)
+            for meter_id in missing:
+                self.meters[meter_id] = found.get(meter_id)
+
+    def ingest(self, readings_data):
+        """
+        Valida e inserta un lote de lecturas.
+
+        Args:
+            readings_data: Lista de dicts con meter_id, accumulated_value y timestamp
+
+        Returns:
+            tuple: (created, duplicates, errors) con el mismo contrato por
+            índice del endpoint bulk: created = [{'index', 'reading_id', 'meter_id'}],
+            duplicates = [{'index', 'meter_id'}] (ya existían, no se insertan),
+            errors = [{'index', 'meter_id', 'errors'}]
+        """
+        # 1. Validación de campos (sin consultas a la base de datos)
+        valid, errors = validate_fields(readings_data)
+
+        # 2. Contadores: una consulta (o caché)
+        self._resolve(data['meter_id'] for _, data in valid)
+
+        items = []
+        for idx, data in valid:
+            meter = self.meters.get(data['meter_id'])
+            if meter is None:
+                errors.append({
+                    'index': idx,
+                    'meter_id': data['meter_id'],
+                    'errors': {'meter_id': [meter_not_found_message(data['meter_id'])]}
+                })
+                continue
+            items.append((idx, ConsumptionReading(
+                meter=meter, accumulated_value=data['accumulated_value'], timestamp=data['timestamp']
+            )))
+
+        # 3. Con los contadores bloqueados: monotonía respecto a las lecturas
+        #    vecinas (del snapshot vigente o, para lecturas antiguas, de una
+        #    consulta), escritura (sin las que ya existan), snapshot, agregados
+        #    y detector de anomalías
+        duplicates = []
+        with transaction.atomic():
+            meters = lock_meters(reading.meter_id for _, reading in items)
+            for idx, reading in items:
+                if reading.meter_id not in meters:
+                    # Eliminado después de resolverlo
+                    errors.append({
+                        'index': idx,
+                        'meter_id': reading.meter.meter_id,
+                        'errors': {'meter_id': [meter_not_found_message(reading.meter.meter_id)]}
+                    })
+            items = [(idx, reading) for idx, reading in items if reading.meter_id in meters]
+
+            accepted, repeated, rejected = check_reading_order(meters, [reading for _, reading in items])
+            for position in repeated:
+                idx, reading = items[position]
+                duplicates.append({'index': idx, 'meter_id': reading.meter.meter_id})
+            for position, message in rejected:
+                idx, reading = items[position]
+                errors.append({
+                    'index': idx,
+                    'meter_id': reading.meter.meter_id,
+                    'errors': {'accumulated_value': [message]}
+                })
+            pending = [items[position] for position in accepted]
+
+            readings = ConsumptionReading.objects.insert_new([reading for _, reading in pending])
+            updated = update_reading_snapshots(readings, meters)
+            refresh_rollups(spans_for_readings(readings))
+            detect_readings(meters, readings, [(items[position][1], message) for position, message in rejected])
+
+        for meter in updated.values():
+            self.meters[meter.meter_id] = meter
+
+        created = []
+        for idx, reading in pending:
+            if reading.pk is None:
+                duplicates.append({'index': idx, 'meter_id': reading.meter.meter_id})
+            else:
+                created.append({'index': idx, 'reading_id': reading.pk, 'meter_id': reading.meter.meter_id})
+        for items in (created, duplicates, errors):
+            items.sort(key=lambda item: item['index'])
+        return created, duplicates, errors
+
+
+def ingest_readings(readings_data):
+    """Valida e inserta un lote de lecturas (ver `ReadingIngestor.ingest`)"""
+    return ReadingIngestor().ingest(readings_data)
+
+
+def ingest_reading(reading_data, ingestor=None):
+    """
+    Valida e inserta una lectura (endpoints de una lectura).
+
+    Returns:
+        tuple: (result, errors). result = {'reading_id', 'meter_id',
+        'accumulated_value', 'timestamp', 'duplicate'} (reading_id es None si
+        la lectura ya existía), o None con errors = errores por campo
+    """
+    valid, errors = validate_fields([reading_data])
+    if errors:
+        return None, errors[0]['errors']
+    data = valid[0][1]
+
+    created, duplicates, errors = (ingestor or ReadingIngestor()).ingest([data])
+    if errors:
+        return None, errors[0]['errors']
+    return {
+        'reading_id': created[0]['reading_id'] if created else None,
+        'meter_id': data['meter_id'],
+        'accumulated_value': float(data['accumulated_value']),
+        'timestamp': data['timestamp'],
+        'duplicate': bool(duplicates),
+    }, None
@@ -0,0 +1,199 @@
+# meters/ingest_queue.py
+
+"""
+Cola de ingesta de lecturas.
+
+Con READING_INGEST_MODE='queue' los endpoints públicos solo validan los
+campos de las lecturas (sin consultar contadores ni lecturas), las añaden a
+la tabla PendingReading con un único INSERT y responden 202. El worker
+(comando process_ingest_queue) toma la cola por lotes grandes en orden de
+llegada y los inserta con ReadingIngestor: una consulta de contadores, un
+bulk_create y una actualización de snapshots y agregados por lote, en lugar
+de una transacción por lectura. Mientras el worker espera, las lecturas que
+llegan se acumulan y se escriben juntas en el siguiente lote.
+
+Cada lote queda registrado en IngestBatch con su lag y sus rechazos (contador
+inexistente o inactivo, valor menor que la última lectura), que resume
+ingest_status.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+
+from .idempotency import prune_idempotency_keys
+from .ingest import ingest_readings, validate_fields
+from .models import PendingReading, IngestBatch
+
+# Rechazos guardados por lote (el conteo siempre es completo)
+MAX_STORED_ERRORS = 100
+# Segundos entre limpiezas de lotes registrados y claves de idempotencia vencidos
+PRUNE_INTERVAL = 60 * 60
+
+
+def _pending_readings(valid):
+    return [
+        PendingReading(
+            meter_id=data['meter_id'],
+            accumulated_value=data['accumulated_value'],
+            timestamp=data['timestamp'],
+        )
+        for _, data in valid
+    ]
+
+
+def _queued(valid, pending):
+    return [
+        {'index': idx, 'queue_id': item.id, 'meter_id': item.meter_id}
+        for (idx, _), item in zip(valid, pending)
+    ]
+
+
+def enqueue_readings(readings_data):
+    """
+    Valida los campos de las lecturas y añade las válidas a la cola.
+
+    Returns:
+        tuple: (queued, errors) con queued = [{'index', 'queue_id', 'meter_id'}]
+        y errors en el formato de `ReadingIngestor.ingest`
+    """
+    valid, errors = validate_fields(readings_data)
+    pending = PendingReading.objects.bulk_create(_pending_readings(valid))
+    return _queued(valid, pending), errors
+
+
+async def aenqueue_readings(readings_data):
+    """Versión asíncrona de enqueue_readings (para las vistas de async_views.py)"""
+    valid, errors = validate_fields(readings_data)
+    pending = await PendingReading.objects.abulk_create(_pending_readings(valid))
+    return _queued(valid, pending), errors
+
+
+def process_batch(batch_size=None):
+    """
+    Inserta un lote de la cola y lo elimina de ella en la misma transacción.
+
+    Las filas se bloquean con SKIP LOCKED, así que varios workers pueden
+    trabajar en paralelo sin tomar las mismas lecturas.
+
+    Returns:
+        IngestBatch del lote, o None si la cola está vacía
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    started_at = timezone.now()
+    with transaction.atomic():
+        items = list(
+            PendingReading.objects
+            .select_for_update(skip_locked=True)
+            .order_by('id')[:batch_size]
+        )
+        if not items:
+            return None
+
+        created, duplicates, errors = ingest_readings([
+            {'meter_id': item.meter_id, 'accumulated_value': item.accumulated_value, 'timestamp': item.timestamp}
+            for item in items
+        ])
+        PendingReading.objects.filter(id__in=[item.id for item in items]).delete()
+
+        for error in errors:
+            item = items[error.pop('index')]
+            error.update({
+                'accumulated_value': str(item.accumulated_value),
+                'timestamp': item.timestamp.isoformat(),
+                'received_at': item.received_at.isoformat(),
+            })
+
+        finished_at = timezone.now()
+        return IngestBatch.objects.create(
+            started_at=started_at,
+            finished_at=finished_at,
+            readings=len(items),
+            created=len(created),
+            duplicates=len(duplicates),
+            rejected=len(errors),
+            max_lag=(finished_at - min(item.received_at for item in items)).total_seconds(),
+            errors=errors[:MAX_STORED_ERRORS],
+        )
+
+
+def prune_batches(days=None):
+    """Elimina los lotes registrados hace más de `days` días"""
+    days = settings.INGEST_METRICS_RETENTION_DAYS if days is None else days
+    deleted, _ = IngestBatch.objects.filter(finished_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
+
+
+def run_worker(batch_size=None, interval=None, once=False, on_batch=None):
+    """
+    Procesa la cola hasta vaciarla; sin `once` sigue esperando lecturas nuevas
+    y revisa la cola cada `interval` segundos. Con la cola vacía elimina, como
+    mucho una vez por hora, los lotes registrados y las claves de
+    idempotencia vencidos.
+
+    Args:
+        on_batch: Función llamada con cada IngestBatch procesado
+    """
+    interval = settings.INGEST_POLL_INTERVAL if interval is None else interval
+    last_pruned = None
+    while True:
+        close_old_connections()
+        batch = process_batch(batch_size)
+        if batch is not None:
+            if on_batch:
+                on_batch(batch)
+            continue
+
+        if last_pruned is None or time.monotonic() - last_pruned >= PRUNE_INTERVAL:
+            prune_batches()
+            prune_idempotency_keys()
+            last_pruned = time.monotonic()
+        if once:
+            return
+        time.sleep(interval)
+
+
+def ingest_status(minutes=15):
+    """
+    Estado de la cola y de los lotes de los últimos `minutes` minutos.
+
+    Returns:
+        dict: pendientes y lag actual de la cola, lecturas procesadas,
+        insertadas, duplicadas y rechazadas, rendimiento (lecturas insertadas por segundo)
+        y los rechazos más recientes
+    """
+    now = timezone.now()
+    queue = PendingReading.objects.aggregate(pending=Count('id'), oldest=Min('received_at'))
+    recent = IngestBatch.objects.filter(finished_at__gte=now - timedelta(minutes=minutes))
+    totals = recent.aggregate(
+        batches=Count('id'), processed=Sum('readings'), created=Sum('created'),
+        duplicates=Sum('duplicates'), rejected=Sum('rejected'), max_lag=Max('max_lag'),
+    )
+    last = IngestBatch.objects.only('finished_at').first()
+
+    rejections = []
+    for errors in recent.filter(rejected__gt=0).values_list('errors', flat=True)[:5]:
+        rejections.extend(errors)
+
+    return {
+        'mode': settings.READING_INGEST_MODE,
+        'queue': {
+            'pending': queue['pending'],
+            'oldest_received_at': queue['oldest'],
+            'lag_seconds': round((now - queue['oldest']).total_seconds(), 3) if queue['oldest'] else 0,
+        },
+        'window_minutes': minutes,
+        'batches': totals['batches'],
+        'processed': totals['processed'] or 0,
+        'created': totals['created'] or 0,
+        'duplicates': totals['duplicates'] or 0,
+        'rejected': totals['rejected'] or 0,
+        'max_lag_seconds': totals['max_lag'] or 0,
+        'throughput_per_second': round((totals['created'] or 0) / (minutes * 60), 2),
+        'last_batch_at': last.finished_at if last else None,
+        'recent_rejections': rejections[:20],
+    }
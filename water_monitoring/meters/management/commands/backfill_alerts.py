@@ -0,0 +1,31 @@
+# meters/management/commands/backfill_alerts.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meters.detection import backfill_alerts
+from meters.models import Meter
+
+
+class Command(BaseCommand):
+    help = ('Reconstruye el estado del detector de anomalías y las alertas de fuga, picos y sin consumo '
+            'reproduciendo el historial de lecturas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('meter_ids', nargs='*',
+                            help='IDs de contador a reconstruir (por defecto todos)')
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='Contadores reproducidos por tramo (quedan bloqueados mientras tanto)')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser positivo')
+
+        meters = Meter.objects.all()
+        if options['meter_ids']:
+            meters = meters.filter(meter_id__in=options['meter_ids'])
+
+        def report(count):
+            self.stdout.write(f'{count} contadores procesados...')
+
+        count = backfill_alerts(meters, chunk_size=options['chunk_size'], on_progress=report)
+        self.stdout.write(self.style.SUCCESS(f'Alertas reconstruidas para {count} contadores'))
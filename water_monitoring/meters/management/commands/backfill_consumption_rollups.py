@@ -0,0 +1,40 @@
+# meters/management/commands/backfill_consumption_rollups.py
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from meters.models import Meter
+from meters.rollups import backfill_rollups
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los agregados de consumo diarios y por hora desde el historial de lecturas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('meter_ids', nargs='*',
+                            help='IDs de contador a reconstruir (por defecto todos)')
+        parser.add_argument('--since', help='Fecha inicial YYYY-MM-DD (por defecto la primera lectura)')
+        parser.add_argument('--chunk-days', type=int, default=31,
+                            help='Días recalculados por tramo')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = timezone.make_aware(datetime.strptime(options['since'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('--since debe tener el formato YYYY-MM-DD')
+
+        meters = Meter.objects.order_by('pk')
+        if options['meter_ids']:
+            meters = meters.filter(meter_id__in=options['meter_ids'])
+
+        def report(meter, count):
+            if count % 100 == 0:
+                self.stdout.write(f'{count} contadores procesados...')
+
+        count = backfill_rollups(meters, since=since, chunk_days=options['chunk_days'],
+                                 on_progress=report)
+        self.stdout.write(self.style.SUCCESS(f'Agregados reconstruidos para {count} contadores'))
@@ -0,0 +1,125 @@
+# meters/management/commands/bench_ingest.py
+
+import asyncio
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from meters.models import MeterModel, Meter
+
+
+class Command(BaseCommand):
+    help = ('Mide los endpoints públicos de ingesta de un servidor en marcha con peticiones concurrentes '
+            '(p. ej. para comparar gunicorn/WSGI con uvicorn/ASGI). Escribe lecturas de prueba: '
+            'úsalo contra una base de datos de pruebas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='URL base del servidor, p. ej. http://127.0.0.1:8000')
+        parser.add_argument('--requests', type=int, default=2000, help='Peticiones en total')
+        parser.add_argument('--concurrency', type=int, default=50, help='Peticiones simultáneas')
+        parser.add_argument('--bulk', type=int, default=0,
+                            help='Lecturas por petición al endpoint bulk (0 = endpoint de una lectura)')
+        parser.add_argument('--meters', type=int, default=200,
+                            help='Contadores de prueba (BENCHnnnnn), creados si no existen')
+
+    def handle(self, *args, **options):
+        try:
+            import httpx
+        except ImportError:
+            raise CommandError('bench_ingest requiere instalar httpx')
+
+        concurrency = options['concurrency']
+        if min(options['requests'], concurrency, options['meters']) < 1 or options['bulk'] < 0:
+            raise CommandError('--requests, --concurrency y --meters deben ser positivos')
+        if options['meters'] < concurrency:
+            # Cada cliente usa sus propios contadores para que las lecturas de un
+            # contador lleguen en orden y no se rechacen por regresión
+            raise CommandError('--meters debe ser al menos --concurrency')
+
+        meter_ids = self._bench_meters(options['meters'])
+        url = options['url'].rstrip('/') + (
+            '/api/public/readings/bulk/' if options['bulk'] else '/api/public/reading/'
+        )
+        stats = asyncio.run(self._run(httpx, url, meter_ids, options))
+
+        latencies = sorted(stats['latencies'])
+        elapsed = stats['elapsed']
+        readings = stats['accepted_readings']
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(f'{url}  concurrencia {concurrency}, {len(latencies)} peticiones en {elapsed:.2f} s')
+        self.stdout.write(f'  Peticiones/s: {len(latencies) / elapsed:.1f}   Lecturas aceptadas/s: {readings / elapsed:.1f}')
+        self.stdout.write(
+            f'  Latencia ms: media {statistics.mean(latencies) * 1000:.1f}  p50 {percentile(0.5):.1f}  '
+            f'p95 {percentile(0.95):.1f}  p99 {percentile(0.99):.1f}  máx {latencies[-1] * 1000:.1f}'
+        )
+        codes = ', '.join(f'{code}: {count}' for code, count in sorted(stats['status'].items(), key=str))
+        self.stdout.write(f'  Respuestas: {codes}')
+
+    def _bench_meters(self, count):
+        """meter_id de los contadores de prueba"""
+        model, _ = MeterModel.objects.get_or_create(
+            name='Benchmark', defaults={'manufacturer': 'Benchmark', 'liters_per_unit': Decimal('1')}
+        )
+        ids = [f'BENCH{number:05d}' for number in range(1, count + 1)]
+        existing = set(Meter.objects.filter(meter_id__in=ids).values_list('meter_id', flat=True))
+        for meter_id in ids:
+            if meter_id not in existing:
+                Meter.objects.create(meter_id=meter_id, model=model, latitude=0, longitude=0)
+        Meter.objects.filter(meter_id__in=ids).update(is_active=True)
+        return ids
+
+    async def _run(self, httpx, url, meter_ids, options):
+        concurrency = options['concurrency']
+        bulk = options['bulk']
+        # Valores crecientes entre ejecuciones sin consultar la última lectura
+        # (en modo cola puede no estar insertada todavía)
+        next_value = dict.fromkeys(meter_ids, int(time.time() * 1000))
+        remaining = [options['requests']]
+        stats = {'latencies': [], 'status': {}, 'accepted_readings': 0}
+
+        def reading(meter_id):
+            value = next_value[meter_id]
+            next_value[meter_id] += 1
+            return {'meter_id': meter_id, 'accumulated_value': float(value),
+                    'timestamp': timezone.now().isoformat()}
+
+        async def client_loop(client, own_meters):
+            position = 0
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                if bulk:
+                    body = {'readings': [reading(own_meters[(position + i) % len(own_meters)])
+                                         for i in range(bulk)]}
+                    position += bulk
+                else:
+                    body = reading(own_meters[position % len(own_meters)])
+                    position += 1
+
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json=body)
+                    code = response.status_code
+                except httpx.HTTPError as e:
+                    response, code = None, type(e).__name__
+                stats['latencies'].append(time.perf_counter() - started)
+                stats['status'][code] = stats['status'].get(code, 0) + 1
+                if response is not None and code in (201, 202, 207):
+                    data = response.json()
+                    stats['accepted_readings'] += (
+                        data.get('created', data.get('queued', 0)) if bulk else 1
+                    )
+
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                client_loop(client, meter_ids[index::concurrency]) for index in range(concurrency)
+            ))
+            stats['elapsed'] = time.perf_counter() - started
+        return stats
@@ -0,0 +1,64 @@
+# meters/management/commands/export_readings.py
+
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from meters.export import DEFAULT_CHUNK_SIZE, check_format, export_chunks, readings_for_export
+
+
+class Command(BaseCommand):
+    help = 'Exporta lecturas en streaming a CSV, NDJSON o Parquet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='fmt', default='csv', help='csv, ndjson o parquet')
+        parser.add_argument('--output', '-o', help='Archivo de salida (por defecto stdout; obligatorio para parquet)')
+        parser.add_argument('--meter', action='append', dest='meter_ids',
+                            help='ID de contador (se puede repetir)')
+        parser.add_argument('--from', dest='since', help='Fecha inicial YYYY-MM-DD[THH:MM]')
+        parser.add_argument('--to', dest='until', help='Fecha final (exclusiva) YYYY-MM-DD[THH:MM]')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Filas leídas del cursor por bloque')
+
+    def _parse_date(self, value):
+        if value is None:
+            return None
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Fecha inválida: '{value}'")
+        # Con zona horaria explícita (Z, -05:00) se respeta; sin ella, hora local
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    def handle(self, *args, **options):
+        fmt = options['fmt']
+        try:
+            check_format(fmt)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if fmt == 'parquet' and not options['output']:
+            raise CommandError('La exportación Parquet requiere --output')
+
+        queryset = readings_for_export(
+            meter_ids=options['meter_ids'],
+            since=self._parse_date(options['since']),
+            until=self._parse_date(options['until']),
+        )
+
+        if options['output']:
+            mode = 'wb' if fmt == 'parquet' else 'w'
+            encoding = None if fmt == 'parquet' else 'utf-8'
+            out = open(options['output'], mode, encoding=encoding, newline='' if encoding else None)
+        else:
+            out = sys.stdout
+        try:
+            for chunk in export_chunks(queryset, fmt, chunk_size=options['chunk_size']):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        if options['output']:
+            self.stderr.write(self.style.SUCCESS(f"Exportación escrita en {options['output']}"))
@@ -0,0 +1,44 @@
+# meters/management/commands/import_readings.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meters.csv_import import CSVImporter, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Importa lecturas desde un archivo CSV del servidor (meter_id,accumulated_value,timestamp)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Ruta al archivo CSV')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Filas por bloque de inserción')
+        parser.add_argument('--encoding', default='utf-8')
+        parser.add_argument('--show-errors', type=int, default=20,
+                            help='Número de errores a mostrar al final')
+
+    def handle(self, *args, **options):
+        importer = CSVImporter(chunk_size=options['chunk_size'])
+
+        def report(progress):
+            if not progress['done']:
+                self.stdout.write(
+                    f"{progress['processed']:>12,} filas | {progress['created']:>12,} creadas | "
+                    f"{progress['duplicates']:>10,} duplicadas | {progress['failed']:>8,} fallidas | {progress['rows_per_second']:>10,.0f} filas/s"
+                )
+
+        try:
+            with open(options['path'], encoding=options['encoding'], newline='') as f:
+                result = importer.import_all(f, on_progress=report)
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+
+        for error in result['errors'][:options['show_errors']]:
+            self.stdout.write(self.style.WARNING(error))
+        if result['failed'] > options['show_errors']:
+            self.stdout.write(f"... y {result['failed'] - options['show_errors']} errores más")
+
+        style = self.style.SUCCESS if result['success'] else self.style.WARNING
+        self.stdout.write(style(
+            f"Importación finalizada: {result['created']} creadas, {result['duplicates']} duplicadas, "
+            f"{result['failed']} fallidas de {result['processed']} filas en {result['elapsed_seconds']} s"
+        ))
@@ -0,0 +1,36 @@
+# meters/management/commands/process_ingest_queue.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from meters.ingest_queue import run_worker
+
+
+class Command(BaseCommand):
+    help = ('Worker de la cola de ingesta: inserta por lotes las lecturas recibidas en modo cola '
+            '(READING_INGEST_MODE=queue)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.INGEST_BATCH_SIZE,
+                            help='Lecturas máximas por lote')
+        parser.add_argument('--interval', type=float, default=settings.INGEST_POLL_INTERVAL,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--once', action='store_true',
+                            help='Vacía la cola y termina (p. ej. desde cron)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['interval'] < 0:
+            raise CommandError('--batch-size debe ser positivo y --interval no puede ser negativo')
+
+        def report(batch):
+            self.stdout.write(
+                f'{batch.readings} lecturas: {batch.created} insertadas, {batch.duplicates} duplicadas, '
+                f'{batch.rejected} rechazadas '
+                f'(lag máximo {batch.max_lag:.1f} s)'
+            )
+
+        try:
+            run_worker(options['batch_size'], options['interval'], once=options['once'], on_batch=report)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Cola de ingesta procesada'))
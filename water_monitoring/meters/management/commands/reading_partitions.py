@@ -0,0 +1,45 @@
+# meters/management/commands/reading_partitions.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from meters.partitions import apply_retention, ensure_partitions, is_partitioned, list_partitions
+
+
+class Command(BaseCommand):
+    help = ('Crea las particiones mensuales futuras de lecturas y aplica la política de retención '
+            '(ejecutar a diario, p. ej. con cron)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=settings.READING_PARTITIONS_AHEAD,
+                            help='Meses futuros con partición creada')
+        parser.add_argument('--retention-months', type=int, default=settings.READING_RETENTION_MONTHS,
+                            help='Meses conservados contando el actual (0 = sin retención)')
+        parser.add_argument('--archive-dir', default=settings.READING_ARCHIVE_DIR,
+                            help='Directorio donde archivar (.csv.gz) y eliminar las particiones vencidas; '
+                                 'sin él solo se separan de la tabla')
+        parser.add_argument('--list', action='store_true', help='Solo lista las particiones')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('La tabla de lecturas no está particionada (requiere PostgreSQL y la migración 0004)')
+
+        if options['list']:
+            for name, start, estimate in list_partitions():
+                self.stdout.write(f'{name}  desde {start:%Y-%m-%d}  ~{estimate} lecturas')
+            return
+
+        if options['ahead'] < 0 or options['retention_months'] < 0:
+            raise CommandError('--ahead y --retention-months no pueden ser negativos')
+
+        for name in ensure_partitions(options['ahead']):
+            self.stdout.write(f'Partición creada: {name}')
+
+        if options['retention_months']:
+            for name, path in apply_retention(options['retention_months'], options['archive_dir'] or None):
+                if path:
+                    self.stdout.write(f'Partición archivada en {path} y eliminada: {name}')
+                else:
+                    self.stdout.write(f'Partición separada de la tabla: {name}')
+
+        self.stdout.write(self.style.SUCCESS('Particiones al día'))
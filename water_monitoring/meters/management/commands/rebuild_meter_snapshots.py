@@ -0,0 +1,23 @@
+# meters/management/commands/rebuild_meter_snapshots.py
+
+from django.core.management.base import BaseCommand
+
+from meters.models import Meter
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde el historial el snapshot de última y penúltima lectura de los contadores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('meter_ids', nargs='*',
+                            help='IDs de contador a reparar (por defecto todos)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Contadores por actualización en bloque')
+
+    def handle(self, *args, **options):
+        meters = Meter.objects.all()
+        if options['meter_ids']:
+            meters = meters.filter(meter_id__in=options['meter_ids'])
+
+        count = meters.rebuild_reading_snapshots(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Snapshot reconstruido para {count} contadores'))
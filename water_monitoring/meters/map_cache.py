@@ -0,0 +1,147 @@
+# meters/map_cache.py
+
+"""
+Caché del GeoJSON del mapa (/api/meters/geojson/).
+
+El JSON se genera una vez por versión y se guarda ya comprimido (gzip y, si
+está instalado `brotli`, br) en la caché de Django. La versión cambia cuando
+se modifica un contador o un modelo, o cuando llega una lectura nueva
+(invalidate_map_cache); entonces la siguiente petición regenera el payload.
+Si hay una ráfaga de lecturas, se regenera como mucho una vez cada
+GEOJSON_REBUILD_INTERVAL segundos.
+
+Las respuestas llevan ETag (hash del contenido) y Last-Modified, así que una
+visita repetida sin cambios recibe un 304 tras leer solo los metadatos de la
+caché, sin importar el tamaño de la red.
+"""
+
+import gzip
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+VERSION_KEY = 'meters:geojson:version'
+META_KEY = 'meters:geojson:meta'
+BODY_TIMEOUT = 24 * 60 * 60
+# Orden de preferencia de las codificaciones precomprimidas
+ENCODINGS = ('br', 'gzip')
+
+
+def _body_key(digest, encoding):
+    return f'meters:geojson:{digest}:{encoding}'
+
+
+def _new_version():
+    return f'{time.time_ns():x}'
+
+
+def invalidate_map_cache():
+    """Marca el GeoJSON como desactualizado al confirmarse la transacción en curso"""
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, _new_version(), None))
+
+
+def _compress(content):
+    bodies = {'identity': content, 'gzip': gzip.compress(content, compresslevel=6)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        bodies['br'] = brotli.compress(content)
+    return bodies
+
+
+def _build(version, build, previous):
+    content = JSONRenderer().render(build())
+    digest = hashlib.md5(content).hexdigest()
+    now = time.time()
+    # Si el contenido no cambió se conservan las copias y la fecha de modificación
+    bodies = None
+    if previous is not None and previous['digest'] == digest:
+        meta = dict(previous, version=version, built_at=now)
+    else:
+        bodies = _compress(content)
+        cache.set_many({_body_key(digest, encoding): body for encoding, body in bodies.items()},
+                       BODY_TIMEOUT)
+        meta = {
+            'version': version,
+            'digest': digest,
+            'last_modified': int(now),
+            'built_at': now,
+            'encodings': list(bodies),
+        }
+    cache.set(META_KEY, meta, None)
+    return meta, bodies
+
+
+def _current_meta(build, force=False):
+    """Metadatos vigentes y, si se acaba de regenerar, las copias comprimidas"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), None)
+        version = cache.get(VERSION_KEY)
+
+    meta = cache.get(META_KEY)
+    if meta is None or force:
+        return _build(version, build, None)
+    if meta['version'] != version and time.time() - meta['built_at'] >= settings.GEOJSON_REBUILD_INTERVAL:
+        return _build(version, build, meta)
+    return meta, None
+
+
+def _accepted_encoding(request, available):
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.partition(';')
+        try:
+            quality = float(params.replace(' ', '').removeprefix('q=') or 1)
+        except ValueError:
+            quality = 1
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    for encoding in ENCODINGS:
+        if encoding in available and encoding in accepted:
+            return encoding
+    return 'identity'
+
+
+def map_geojson_response(request, build):
+    """
+    Respuesta del GeoJSON del mapa desde la caché.
+
+    Args:
+        request: Petición (cabeceras If-None-Match/If-Modified-Since y
+            Accept-Encoding)
+        build: Función sin argumentos que retorna los datos a serializar;
+            solo se llama cuando hay que regenerar el payload
+    """
+    meta, bodies = _current_meta(build)
+    etag = f'"{meta["digest"]}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=meta['last_modified'])
+    if response is None:
+        encoding = _accepted_encoding(request, meta['encodings'])
+        body = bodies[encoding] if bodies else cache.get(_body_key(meta['digest'], encoding))
+        if body is None:
+            # Copia expulsada de la caché: se regenera
+            meta, bodies = _current_meta(build, force=True)
+            etag = f'"{meta["digest"]}"'
+            encoding = _accepted_encoding(request, bodies)
+            body = bodies[encoding]
+        response = HttpResponse(body, content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(meta['last_modified'])
+    # El navegador guarda la copia pero la revalida en cada carga
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
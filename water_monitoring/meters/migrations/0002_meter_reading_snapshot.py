@@ -0,0 +1,86 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:41
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_snapshots(apps, schema_editor):
+    """Llena el snapshot de los contadores existentes desde su historial"""
+    Meter = apps.get_model('meters', 'Meter')
+    ConsumptionReading = apps.get_model('meters', 'ConsumptionReading')
+    
+    latest = ConsumptionReading.objects.filter(meter=OuterRef('pk')).order_by('-timestamp', '-id')
+    meters = Meter.objects.select_related('model').annotate(
+        h_last_pk=Subquery(latest.values('id')[:1]),
+        h_last_value=Subquery(latest.values('accumulated_value')[:1]),
+        h_last_at=Subquery(latest.values('timestamp')[:1]),
+        h_previous_pk=Subquery(latest.values('id')[1:2]),
+        h_previous_value=Subquery(latest.values('accumulated_value')[1:2]),
+        h_previous_at=Subquery(latest.values('timestamp')[1:2]),
+    )
+    
+    batch = []
+    for meter in meters.iterator(chunk_size=500):
+        meter.last_reading_pk = meter.h_last_pk
+        meter.last_reading_value = meter.h_last_value
+        meter.last_reading_at = meter.h_last_at
+        meter.previous_reading_pk = meter.h_previous_pk
+        meter.previous_reading_value = meter.h_previous_value
+        meter.previous_reading_at = meter.h_previous_at
+        if meter.h_previous_at is not None:
+            liters = float(meter.h_last_value - meter.h_previous_value) * float(meter.model.liters_per_unit)
+            hours = (meter.h_last_at - meter.h_previous_at).total_seconds() / 3600
+            meter.last_liters_per_hour = round(liters / hours, 2) if hours > 0 else 0
+        batch.append(meter)
+    
+    Meter.objects.bulk_update(batch, [
+        'last_reading_pk', 'last_reading_value', 'last_reading_at',
+        'previous_reading_pk', 'previous_reading_value', 'previous_reading_at',
+        'last_liters_per_hour',
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meter',
+            name='last_liters_per_hour',
+            field=models.FloatField(blank=True, editable=False, help_text='Tasa entre la penúltima y la última lectura', null=True, verbose_name='Consumo reciente (L/h)'),
+        ),
+        migrations.AddField(
+            model_name='meter',
+            name='last_reading_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Fecha de última lectura'),
+        ),
+        migrations.AddField(
+            model_name='meter',
+            name='last_reading_pk',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='meter',
+            name='last_reading_value',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=15, null=True, verbose_name='Última lectura'),
+        ),
+        migrations.AddField(
+            model_name='meter',
+            name='previous_reading_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Fecha de penúltima lectura'),
+        ),
+        migrations.AddField(
+            model_name='meter',
+            name='previous_reading_pk',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='meter',
+            name='previous_reading_value',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=15, null=True, verbose_name='Penúltima lectura'),
+        ),
+        migrations.RunPython(populate_snapshots, migrations.RunPython.noop),
+    ]
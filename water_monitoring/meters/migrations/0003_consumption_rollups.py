@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0002_meter_reading_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterHourlyConsumption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('units', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Unidades consumidas')),
+                ('hours', models.FloatField(default=0, verbose_name='Horas cubiertas')),
+                ('readings', models.PositiveIntegerField(default=0, verbose_name='Lecturas')),
+                ('first_reading_at', models.DateTimeField(verbose_name='Primera lectura')),
+                ('first_value', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('last_reading_at', models.DateTimeField(verbose_name='Última lectura')),
+                ('last_value', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('hour', models.DateTimeField(verbose_name='Hora')),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_consumption', to='meters.meter', verbose_name='Contador')),
+            ],
+            options={
+                'verbose_name': 'Consumo por Hora',
+                'verbose_name_plural': 'Consumos por Hora',
+                'ordering': ['meter', 'hour'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MeterDailyConsumption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('units', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Unidades consumidas')),
+                ('hours', models.FloatField(default=0, verbose_name='Horas cubiertas')),
+                ('readings', models.PositiveIntegerField(default=0, verbose_name='Lecturas')),
+                ('first_reading_at', models.DateTimeField(verbose_name='Primera lectura')),
+                ('first_value', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('last_reading_at', models.DateTimeField(verbose_name='Última lectura')),
+                ('last_value', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('day', models.DateField(verbose_name='Día')),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_consumption', to='meters.meter', verbose_name='Contador')),
+            ],
+            options={
+                'verbose_name': 'Consumo Diario',
+                'verbose_name_plural': 'Consumos Diarios',
+                'ordering': ['meter', 'day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='meterhourlyconsumption',
+            constraint=models.UniqueConstraint(fields=('meter', 'hour'), name='unique_meter_hour_consumption'),
+        ),
+        migrations.AddConstraint(
+            model_name='meterdailyconsumption',
+            constraint=models.UniqueConstraint(fields=('meter', 'day'), name='unique_meter_day_consumption'),
+        ),
+    ]
@@ -0,0 +1,115 @@
+# Particiona meters_consumptionreading por mes (solo PostgreSQL)
+
+from datetime import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+TABLE = 'meters_consumptionreading'
+NEW_TABLE = 'meters_consumptionreading_new'
+SEQUENCE = 'meters_consumptionreading_id_seq'
+COLUMNS = 'id, accumulated_value, "timestamp", created_at, meter_id'
+# El comando reading_partitions se encarga de los meses siguientes
+MONTHS_AHEAD = 3
+
+
+def _add_months(start, months):
+    index = start.year * 12 + start.month - 1 + months
+    return start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _month_start(value, tz):
+    local = value.astimezone(tz)
+    return datetime(local.year, local.month, 1, tzinfo=tz)
+
+
+def partition_readings(apps, schema_editor):
+    """
+    Copia las lecturas a una tabla particionada por rango de timestamp, con
+    una partición por mes local desde la primera lectura hasta MONTHS_AHEAD
+    meses adelante y una partición por defecto.
+
+    La clave primaria pasa a ser (id, timestamp), porque en una tabla
+    particionada debe incluir la clave de partición; el id sigue siendo
+    único porque sale de una secuencia.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    tz = timezone.get_current_timezone()
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min("timestamp"), max(id) FROM {TABLE}')
+        first, max_id = cursor.fetchone()
+
+        cursor.execute(f"""
+            CREATE TABLE {NEW_TABLE} (
+                id bigint NOT NULL,
+                accumulated_value numeric(15, 2) NOT NULL,
+                "timestamp" timestamp with time zone NOT NULL,
+                created_at timestamp with time zone NOT NULL,
+                meter_id bigint NOT NULL
+            ) PARTITION BY RANGE ("timestamp")
+        """)
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {NEW_TABLE} DEFAULT')
+
+        current = _month_start(timezone.now(), tz)
+        start = _month_start(first, tz) if first is not None else current
+        while start <= _add_months(current, MONTHS_AHEAD):
+            end = _add_months(start, 1)
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_p{start:%Y_%m} PARTITION OF {NEW_TABLE} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [start, end]
+            )
+            start = end
+
+        cursor.execute(f'INSERT INTO {NEW_TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {TABLE}')
+        cursor.execute(f'DROP TABLE {TABLE}')
+        cursor.execute(f'ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}')
+
+        # Mismos nombres de índices y restricciones que generó Django
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, "timestamp")')
+        cursor.execute(f'CREATE INDEX {TABLE}_timestamp_da800e43 ON {TABLE} ("timestamp")')
+        cursor.execute(f'CREATE INDEX {TABLE}_meter_id_80a90c73 ON {TABLE} (meter_id)')
+        cursor.execute(f'CREATE INDEX meters_cons_meter_i_7b2aff_idx ON {TABLE} (meter_id, "timestamp" DESC)')
+        cursor.execute(
+            f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_meter_id_80a90c73_fk_meters_meter_id '
+            f'FOREIGN KEY (meter_id) REFERENCES meters_meter (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+        cursor.execute(f'CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+        cursor.execute(f"SELECT setval('{SEQUENCE}', %s, %s)", [max_id or 1, max_id is not None])
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+
+
+def unpartition_readings(apps, schema_editor):
+    """Vuelve a una tabla simple con las lecturas de las particiones adjuntas"""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TEMPORARY TABLE readings_backup AS SELECT {COLUMNS} FROM {TABLE}')
+        cursor.execute(f'DROP TABLE {TABLE} CASCADE')
+
+    schema_editor.create_model(apps.get_model('meters', 'ConsumptionReading'))
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {TABLE} ({COLUMNS}) OVERRIDING SYSTEM VALUE SELECT {COLUMNS} FROM readings_backup')
+        cursor.execute('DROP TABLE readings_backup')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce(max(id), 1), max(id) IS NOT NULL) "
+            f"FROM {TABLE}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0003_consumption_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_readings, unpartition_readings),
+    ]
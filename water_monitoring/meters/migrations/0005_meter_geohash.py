@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:59
+
+from django.db import migrations, models
+
+from meters.geo import encode_geohash
+
+
+def populate_geohash(apps, schema_editor):
+    """Calcula el geohash de los contadores existentes"""
+    Meter = apps.get_model('meters', 'Meter')
+    
+    batch = []
+    for meter in Meter.objects.only('pk', 'latitude', 'longitude').iterator(chunk_size=1000):
+        meter.geohash = encode_geohash(meter.latitude, meter.longitude)
+        batch.append(meter)
+        if len(batch) >= 1000:
+            Meter.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    Meter.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0004_partition_consumption_readings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meter',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0005_meter_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Inicio')),
+                ('finished_at', models.DateTimeField(db_index=True, verbose_name='Fin')),
+                ('readings', models.PositiveIntegerField(verbose_name='Lecturas procesadas')),
+                ('created', models.PositiveIntegerField(verbose_name='Lecturas insertadas')),
+                ('rejected', models.PositiveIntegerField(verbose_name='Lecturas rechazadas')),
+                ('max_lag', models.FloatField(help_text='Segundos entre la recepción más antigua del lote y su inserción', verbose_name='Lag máximo (s)')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Rechazos')),
+            ],
+            options={
+                'verbose_name': 'Lote de Ingesta',
+                'verbose_name_plural': 'Lotes de Ingesta',
+                'ordering': ['-finished_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PendingReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meter_id', models.CharField(max_length=50, verbose_name='ID del contador')),
+                ('accumulated_value', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Valor acumulado')),
+                ('timestamp', models.DateTimeField(verbose_name='Fecha y hora')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Recibida')),
+            ],
+            options={
+                'verbose_name': 'Lectura en Cola',
+                'verbose_name_plural': 'Lecturas en Cola',
+                'ordering': ['id'],
+            },
+        ),
+    ]
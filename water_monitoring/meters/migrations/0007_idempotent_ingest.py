@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:33
+
+import django.core.serializers.json
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_readings(apps, schema_editor):
+    """
+    Elimina las lecturas repetidas (mismo contador y fecha) antes de crear la
+    restricción única; se conserva la de menor id.
+    """
+    ConsumptionReading = apps.get_model('meters', 'ConsumptionReading')
+    groups = (
+        ConsumptionReading.objects.order_by()
+        .values('meter_id', 'timestamp')
+        .annotate(keep=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    deleted = 0
+    for group in groups.iterator():
+        deleted += ConsumptionReading.objects.filter(
+            meter_id=group['meter_id'], timestamp=group['timestamp']
+        ).exclude(id=group['keep']).delete()[0]
+    if deleted:
+        print(f'\n  {deleted} lecturas duplicadas eliminadas: ejecuta rebuild_meter_snapshots '
+              f'y backfill_consumption_rollups para recalcular snapshots y agregados')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0006_ingest_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=50, verbose_name='Endpoint')),
+                ('key', models.CharField(max_length=255, verbose_name='Clave')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Código de respuesta')),
+                ('response', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Respuesta')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Clave de Idempotencia',
+                'verbose_name_plural': 'Claves de Idempotencia',
+            },
+        ),
+        migrations.AddField(
+            model_name='ingestbatch',
+            name='duplicates',
+            field=models.PositiveIntegerField(default=0, verbose_name='Lecturas duplicadas'),
+        ),
+        migrations.RunPython(remove_duplicate_readings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='consumptionreading',
+            constraint=models.UniqueConstraint(fields=('meter', 'timestamp'), name='unique_meter_reading_timestamp'),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('endpoint', 'key'), name='unique_idempotency_key'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:43
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0007_idempotent_ingest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterDetectionState',
+            fields=[
+                ('meter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='detection_state', serialize=False, to='meters.meter', verbose_name='Contador')),
+                ('last_reading_at', models.DateTimeField(blank=True, null=True, verbose_name='Última lectura evaluada')),
+                ('last_value', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('intervals', models.PositiveIntegerField(default=0, verbose_name='Intervalos evaluados')),
+                ('flow_mean', models.FloatField(default=0, verbose_name='Media móvil del caudal (L/h)')),
+                ('flow_var', models.FloatField(default=0, verbose_name='Varianza móvil del caudal')),
+                ('zero_since', models.DateTimeField(blank=True, null=True, verbose_name='Sin consumo desde')),
+                ('night', models.DateField(blank=True, null=True, verbose_name='Noche en curso')),
+                ('night_min_flow', models.FloatField(blank=True, null=True, verbose_name='Caudal nocturno mínimo (L/h)')),
+                ('open_alerts', models.JSONField(blank=True, default=list, verbose_name='Tipos de alerta abiertos')),
+            ],
+            options={
+                'verbose_name': 'Estado del Detector',
+                'verbose_name_plural': 'Estados del Detector',
+            },
+        ),
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('leak', 'Posible fuga (caudal nocturno)'), ('spike', 'Consumo anómalo'), ('no_consumption', 'Sin consumo'), ('rollover', 'Vuelta a cero del contador'), ('regression', 'Lectura menor que la anterior')], max_length=20, verbose_name='Tipo')),
+                ('started_at', models.DateTimeField(verbose_name='Fecha de la lectura')),
+                ('detected_at', models.DateTimeField(auto_now_add=True, verbose_name='Detectada')),
+                ('resolved_at', models.DateTimeField(blank=True, null=True, verbose_name='Resuelta')),
+                ('value', models.FloatField(blank=True, help_text='Caudal (L/h), horas sin consumo o valor acumulado, según el tipo', null=True, verbose_name='Valor')),
+                ('message', models.CharField(max_length=255, verbose_name='Mensaje')),
+                ('details', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Detalles')),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='meters.meter', verbose_name='Contador')),
+            ],
+            options={
+                'verbose_name': 'Alerta',
+                'verbose_name_plural': 'Alertas',
+                'ordering': ['-started_at', '-id'],
+                'indexes': [models.Index(fields=['meter', '-started_at'], name='meters_aler_meter_i_761d7c_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='alert',
+            constraint=models.UniqueConstraint(condition=models.Q(('resolved_at__isnull', True)), fields=('meter', 'kind'), name='unique_open_alert'),
+        ),
+    ]
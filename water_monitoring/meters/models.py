@@ -1,8 +1,63 @@
 # meters/models.py
 
-from django.db import models
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, transaction
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .geo import encode_geohash
+
+
+# Lectura mínima (id, valor acumulado, fecha) usada en cálculos de consumo
+ReadingPoint = namedtuple('ReadingPoint', ['id', 'accumulated_value', 'timestamp'])
+
+
+def consumption_between(current, previous, liters_per_unit):
+    """Consumo entre dos lecturas (mismo formato que get_consumption_since_last)"""
+    units_consumed = float(current.accumulated_value - previous.accumulated_value)
+    liters_consumed = units_consumed * float(liters_per_unit)
+    
+    time_diff = current.timestamp - previous.timestamp
+    hours = time_diff.total_seconds() / 3600
+    
+    return {
+        'units': units_consumed,
+        'liters': round(liters_consumed, 2),
+        'hours': round(hours, 2),
+        'liters_per_hour': round(liters_consumed / hours, 2) if hours > 0 else 0,
+        'previous_reading': {
+            'id': previous.id,
+            'accumulated_value': float(previous.accumulated_value),
+            'timestamp': previous.timestamp.isoformat()
+        }
+    }
+
+
+def consumption_stats(first, last, days, liters_per_unit):
+    """Estadísticas de consumo entre la primera y la última lectura de una ventana"""
+    total_units = float(last.accumulated_value) - float(first.accumulated_value)
+    total_liters = total_units * float(liters_per_unit)
+    
+    # Calcular días reales transcurridos
+    time_diff = last.timestamp - first.timestamp
+    actual_days = max(time_diff.total_seconds() / 86400, 1)  # Mínimo 1 día
+    
+    return {
+        'total_liters': round(total_liters, 2),
+        'total_units': round(total_units, 2),
+        'days': days,
+        'actual_days': round(actual_days, 2),
+        'avg_daily_liters': round(total_liters / actual_days, 2),
+        'first_reading_date': first.timestamp,
+        'last_reading_date': last.timestamp,
+    }
 
 
 class MeterModel(models.Model):
@@ -39,6 +94,80 @@ class MeterModel(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.liters_per_unit} L/unidad)"
+    
+    def save(self, *args, **kwargs):
+        # El L/h del snapshot de los contadores depende del factor de conversión
+        factor_changed = self.pk is not None and MeterModel.objects.filter(
+            pk=self.pk
+        ).exclude(liters_per_unit=self.liters_per_unit).exists()
+        super().save(*args, **kwargs)
+        if factor_changed:
+            self.meters.rebuild_reading_snapshots()
+
+
+class MeterQuerySet(models.QuerySet):
+    
+    def with_reading_summary(self, days=30):
+        """
+        Anota la primera lectura y el número de lecturas de los últimos `days`
+        días con subconsultas correlacionadas sobre el índice (meter, -timestamp).
+        Junto con el snapshot de últimas lecturas del propio contador, las
+        estadísticas se calculan sin consultas adicionales por contador.
+        """
+        cutoff = timezone.now() - timedelta(days=days)
+        window = ConsumptionReading.objects.filter(
+            meter=OuterRef('pk'), timestamp__gte=cutoff
+        ).order_by('timestamp')
+        window_count = (
+            window.order_by().values('meter')
+            .annotate(total=Count('id')).values('total')
+        )
+        return self.annotate(
+            window_first_id=Subquery(window.values('id')[:1]),
+            window_first_value=Subquery(window.values('accumulated_value')[:1]),
+            window_first_timestamp=Subquery(window.values('timestamp')[:1]),
+            window_count=Subquery(window_count[:1]),
+            summary_days=models.Value(days),
+        )
+    
+    def rebuild_reading_snapshots(self, batch_size=500):
+        """
+        Reconstruye desde el historial el snapshot de última y penúltima
+        lectura de los contadores del queryset. Retorna cuántos se procesaron.
+        """
+        latest = ConsumptionReading.objects.filter(meter=OuterRef('pk')).order_by('-timestamp', '-id')
+        meters = self.select_related('model').annotate(
+            history_last_pk=Subquery(latest.values('id')[:1]),
+            history_last_value=Subquery(latest.values('accumulated_value')[:1]),
+            history_last_at=Subquery(latest.values('timestamp')[:1]),
+            history_previous_pk=Subquery(latest.values('id')[1:2]),
+            history_previous_value=Subquery(latest.values('accumulated_value')[1:2]),
+            history_previous_at=Subquery(latest.values('timestamp')[1:2]),
+        ).order_by('pk')
+        
+        count = 0
+        batch = []
+        for meter in meters.iterator(chunk_size=batch_size):
+            last = previous = None
+            if meter.history_last_pk is not None:
+                last = ReadingPoint(meter.history_last_pk, meter.history_last_value,
+                                    meter.history_last_at)
+            if meter.history_previous_pk is not None:
+                previous = ReadingPoint(meter.history_previous_pk, meter.history_previous_value,
+                                        meter.history_previous_at)
+            meter.set_reading_snapshot(last, previous)
+            batch.append(meter)
+            if len(batch) >= batch_size:
+                Meter.objects.bulk_update(batch, Meter.SNAPSHOT_FIELDS)
+                count += len(batch)
+                batch = []
+        if batch:
+            Meter.objects.bulk_update(batch, Meter.SNAPSHOT_FIELDS)
+            count += len(batch)
+        if count:
+            from .map_cache import invalidate_map_cache
+            invalidate_map_cache()
+        return count
 
 
 class Meter(models.Model):
@@ -66,6 +195,13 @@ class Meter(models.Model):
         decimal_places=6,
         verbose_name="Longitud"
     )
+    # Celda de la posición para consultas por zona del mapa (ver meters/geo.py)
+    geohash = models.CharField(
+        max_length=12,
+        blank=True,
+        editable=False,
+        db_index=True
+    )
     installation_date = models.DateField(
         default=timezone.now,
         verbose_name="Fecha de instalación"
@@ -86,6 +222,54 @@ class Meter(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Snapshot desnormalizado de las dos últimas lecturas, mantenido al escribir
+    # lecturas (ver update_reading_snapshots) para no consultar el historial
+    last_reading_pk = models.BigIntegerField(null=True, blank=True, editable=False)
+    last_reading_value = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Última lectura"
+    )
+    last_reading_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Fecha de última lectura"
+    )
+    previous_reading_pk = models.BigIntegerField(null=True, blank=True, editable=False)
+    previous_reading_value = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Penúltima lectura"
+    )
+    previous_reading_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Fecha de penúltima lectura"
+    )
+    last_liters_per_hour = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Consumo reciente (L/h)",
+        help_text="Tasa entre la penúltima y la última lectura"
+    )
+    
+    SNAPSHOT_FIELDS = [
+        'last_reading_pk', 'last_reading_value', 'last_reading_at',
+        'previous_reading_pk', 'previous_reading_value', 'previous_reading_at',
+        'last_liters_per_hour',
+    ]
+    
+    objects = MeterQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Contador"
         verbose_name_plural = "Contadores"
@@ -94,45 +278,177 @@ class Meter(models.Model):
     def __str__(self):
         return f"{self.meter_id} - {self.model.name}"
     
+    def save(self, *args, **kwargs):
+        self.geohash = encode_geohash(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+    
     def get_last_reading(self):
-        """Obtiene la última lectura del contador"""
-        return self.readings.order_by('-timestamp').first()
+        """Obtiene la última lectura del contador (desde el snapshot, sin consultas)"""
+        return self.get_latest_readings()[0]
+    
+    def get_latest_readings(self):
+        """Retorna (última, penúltima) lectura como ReadingPoint (o None)"""
+        last = previous = None
+        if self.last_reading_at is not None:
+            last = ReadingPoint(self.last_reading_pk, self.last_reading_value, self.last_reading_at)
+        if self.previous_reading_at is not None:
+            previous = ReadingPoint(self.previous_reading_pk, self.previous_reading_value,
+                                    self.previous_reading_at)
+        return last, previous
+    
+    def set_reading_snapshot(self, last, previous):
+        """Asigna (sin guardar) el snapshot de última y penúltima lectura"""
+        self.last_reading_pk = last.id if last else None
+        self.last_reading_value = last.accumulated_value if last else None
+        self.last_reading_at = last.timestamp if last else None
+        self.previous_reading_pk = previous.id if previous else None
+        self.previous_reading_value = previous.accumulated_value if previous else None
+        self.previous_reading_at = previous.timestamp if previous else None
+        self.last_liters_per_hour = None
+        if last and previous:
+            consumption = consumption_between(last, previous, self.model.liters_per_unit)
+            self.last_liters_per_hour = consumption['liters_per_hour']
+    
+    def merge_readings(self, readings):
+        """
+        Incorpora lecturas nuevas al snapshot (sin guardar). Las dos últimas
+        del historial son las dos últimas entre el snapshot actual y las
+        nuevas, así que las inserciones fuera de orden no requieren consultas.
+        Retorna True si el snapshot cambió.
+        """
+        current = self.get_latest_readings()
+        candidates = {point.id: point for point in current if point is not None}
+        for reading in readings:
+            candidates[reading.pk] = ReadingPoint(reading.pk, reading.accumulated_value, reading.timestamp)
+        
+        top = sorted(candidates.values(), key=lambda p: (p.timestamp, p.id or 0), reverse=True)[:2]
+        top += [None] * (2 - len(top))
+        if tuple(top) == current:
+            return False
+        self.set_reading_snapshot(*top)
+        return True
     
     def get_consumption_stats(self, days=30):
         """Calcula estadísticas de consumo para los últimos N días"""
-        from django.utils import timezone
-        from datetime import timedelta
-        from decimal import Decimal
+        if getattr(self, 'summary_days', None) == days:
+            if not self.window_count or self.window_count < 2:
+                return None
+            first = ReadingPoint(self.window_first_id, self.window_first_value,
+                                 self.window_first_timestamp)
+            return consumption_stats(first, self.get_last_reading(), days, self.model.liters_per_unit)
         
-        cutoff_date = timezone.now() - timedelta(days=days)
-        readings = self.readings.filter(timestamp__gte=cutoff_date).order_by('timestamp')
-        
-        if readings.count() < 2:
+        # Días completos desde los agregados diarios, solo el día parcial desde lecturas
+        from .rollups import window_summary
+        first, count = window_summary(self, timezone.now() - timedelta(days=days))
+        if count < 2:
             return None
         
-        first_reading = readings.first()
-        last_reading = readings.last()
-        
-        total_units = float(last_reading.accumulated_value) - float(first_reading.accumulated_value)
-        total_liters = total_units * float(self.model.liters_per_unit)
+        return consumption_stats(first, self.get_last_reading(), days, self.model.liters_per_unit)
+
+
+class ConsumptionReadingQuerySet(models.QuerySet):
+    
+    def with_previous_reading(self):
+        """Anota la lectura anterior del mismo contador (usada por get_consumption_since_last)"""
+        previous = ConsumptionReading.objects.filter(
+            meter=OuterRef('meter'), timestamp__lt=OuterRef('timestamp')
+        ).order_by('-timestamp')
+        return self.annotate(
+            previous_reading_id=Subquery(previous.values('id')[:1]),
+            previous_reading_value=Subquery(previous.values('accumulated_value')[:1]),
+            previous_reading_at=Subquery(previous.values('timestamp')[:1]),
+        )
+    
+    def insert_new(self, readings):
+        """
+        Inserta lecturas con INSERT ... ON CONFLICT DO NOTHING sobre la clave
+        única (meter, timestamp): las que ya existen se omiten sin consultar
+        antes por ellas. No actualiza snapshots ni agregados (ver
+        ReadingIngestor).
+
+        Returns:
+            list: Las lecturas insertadas, con pk asignado
+        """
+        if not readings:
+            return []
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        fields = [opts.get_field(name) for name in ('meter', 'accumulated_value', 'timestamp', 'created_at')]
+        row = '(' + ', '.join(['%s'] * len(fields)) + ')'
         
-        # Calcular días reales transcurridos
-        time_diff = last_reading.timestamp - first_reading.timestamp
-        actual_days = max(time_diff.total_seconds() / 86400, 1)  # Mínimo 1 día
+        inserted = []
+        batch_size = connection.ops.bulk_batch_size(fields, readings)
+        for start in range(0, len(readings), batch_size):
+            batch = readings[start:start + batch_size]
+            params = []
+            for reading in batch:
+                params.extend(
+                    field.get_db_prep_save(field.pre_save(reading, True), connection) for field in fields
+                )
+            sql = (
+                f"INSERT INTO {qn(opts.db_table)} ({', '.join(qn(field.column) for field in fields)}) "
+                f"VALUES {', '.join([row] * len(batch))} "
+                f"ON CONFLICT ({qn('meter_id')}, {qn('timestamp')}) DO NOTHING "
+                f"RETURNING {qn('id')}, {qn('meter_id')}, {qn('timestamp')}"
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                returned = cursor.fetchall()
+            
+            by_key = {(reading.meter_id, reading.timestamp): reading for reading in batch}
+            for pk, meter_id, timestamp in returned:
+                # SQLite retorna la fecha guardada en UTC sin zona (texto o datetime)
+                if isinstance(timestamp, str):
+                    timestamp = parse_datetime(timestamp)
+                if timezone.is_naive(timestamp):
+                    timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+                reading = by_key[(meter_id, timestamp)]
+                reading.pk = pk
+                reading._state.adding = False
+                reading._state.db = self.db
+                inserted.append(reading)
+        return inserted
+    
+    def _refresh_meters_after(self, operation, *args, new_timestamp=None, **kwargs):
+        """Ejecuta `operation` y recalcula snapshot y agregados de los contadores afectados"""
+        from .rollups import refresh_rollups
         
-        return {
-            'total_liters': round(total_liters, 2),
-            'total_units': round(total_units, 2),
-            'days': days,
-            'actual_days': round(actual_days, 2),
-            'avg_daily_liters': round(total_liters / actual_days, 2),
-            'first_reading_date': first_reading.timestamp,
-            'last_reading_date': last_reading.timestamp,
+        spans = {
+            meter_id: [(first, last)] for meter_id, first, last in
+            self.order_by().values('meter_id')
+            .annotate(first=Min('timestamp'), last=Max('timestamp'))
+            .values_list('meter_id', 'first', 'last')
         }
+        if new_timestamp is not None:
+            for ranges in spans.values():
+                ranges.append((new_timestamp, new_timestamp))
+        with transaction.atomic():
+            result = operation(*args, **kwargs)
+            Meter.objects.filter(pk__in=spans).rebuild_reading_snapshots()
+            refresh_rollups(spans)
+        return result
+    
+    def delete(self):
+        return self._refresh_meters_after(super().delete)
+    
+    def update(self, **kwargs):
+        timestamp = kwargs.get('timestamp')
+        if not isinstance(timestamp, datetime):
+            timestamp = None
+        return self._refresh_meters_after(super().update, new_timestamp=timestamp, **kwargs)
 
 
 class ConsumptionReading(models.Model):
-    """Registro de lectura de consumo"""
+    """
+    Registro de lectura de consumo.
+
+    En PostgreSQL la tabla está particionada por mes de `timestamp` (ver
+    meters/partitions.py); filtrar por fecha limita las particiones leídas.
+    """
     
     meter = models.ForeignKey(
         Meter,
@@ -153,6 +469,8 @@ class ConsumptionReading(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ConsumptionReadingQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Lectura de Consumo"
         verbose_name_plural = "Lecturas de Consumo"
@@ -160,12 +478,23 @@ class ConsumptionReading(models.Model):
         indexes = [
             models.Index(fields=['meter', '-timestamp']),
         ]
+        constraints = [
+            # Incluye la clave de partición, así que vale en la tabla particionada
+            models.UniqueConstraint(fields=['meter', 'timestamp'], name='unique_meter_reading_timestamp'),
+        ]
     
     def __str__(self):
         return f"{self.meter.meter_id} - {self.accumulated_value} @ {self.timestamp}"
     
     def get_consumption_since_last(self):
         """Calcula el consumo desde la última lectura"""
+        if hasattr(self, 'previous_reading_at'):
+            if self.previous_reading_at is None:
+                return None
+            previous = ReadingPoint(self.previous_reading_id, self.previous_reading_value,
+                                    self.previous_reading_at)
+            return consumption_between(self, previous, self.meter.model.liters_per_unit)
+        
         previous = ConsumptionReading.objects.filter(
             meter=self.meter,
             timestamp__lt=self.timestamp
@@ -174,33 +503,444 @@ class ConsumptionReading(models.Model):
         if not previous:
             return None
         
-        units_consumed = float(self.accumulated_value - previous.accumulated_value)
-        liters_consumed = units_consumed * float(self.meter.model.liters_per_unit)
-        
-        time_diff = self.timestamp - previous.timestamp
-        hours = time_diff.total_seconds() / 3600
-        
-        return {
-            'units': units_consumed,
-            'liters': round(liters_consumed, 2),
-            'hours': round(hours, 2),
-            'liters_per_hour': round(liters_consumed / hours, 2) if hours > 0 else 0,
-            'previous_reading': {
-                'id': previous.id,
-                'accumulated_value': float(previous.accumulated_value),
-                'timestamp': previous.timestamp.isoformat()
-            }
-        }
+        return consumption_between(self, previous, self.meter.model.liters_per_unit)
     
     def save(self, *args, **kwargs):
-        """Override save para validaciones adicionales"""
-        # Validar que el valor acumulado no sea menor que lecturas anteriores
-        if self.pk is None:  # Solo en creación
-            last_reading = self.meter.get_last_reading()
-            if last_reading and self.accumulated_value < last_reading.accumulated_value:
+        """Override save para validaciones adicionales, snapshot, agregados y alertas del contador"""
+        from .detection import detect_readings
+        from .rollups import refresh_rollups
+        
+        if self.pk is not None:
+            # Edición: la lectura puede cambiar de contador y entrar o salir
+            # de las dos últimas de ambos
+            with transaction.atomic():
+                previous_meter_id, previous_timestamp = ConsumptionReading.objects.filter(
+                    pk=self.pk
+                ).values_list('meter_id', 'timestamp').first() or (self.meter_id, self.timestamp)
+                affected = {previous_meter_id, self.meter_id}
+                meters = lock_meters(affected)
+                if self.meter_id not in meters:
+                    raise Meter.DoesNotExist(f"No existe el contador con pk {self.meter_id}")
+                # Monotonía respecto a las vecinas, sin contar la versión guardada
+                _, _, rejected = check_reading_order(meters, [self], exclude={self.pk})
+                if rejected:
+                    from django.core.exceptions import ValidationError
+                    raise ValidationError(rejected[0][1])
+                super().save(*args, **kwargs)
+                Meter.objects.filter(pk__in=affected).rebuild_reading_snapshots()
+                spans = defaultdict(list)
+                spans[previous_meter_id].append((previous_timestamp, previous_timestamp))
+                spans[self.meter_id].append((self.timestamp, self.timestamp))
+                refresh_rollups(spans)
+            return
+        
+        with transaction.atomic():
+            meters = lock_meters([self.meter_id])
+            if not meters:
+                raise Meter.DoesNotExist(f"No existe el contador con pk {self.meter_id}")
+            meter = meters[self.meter_id]
+            # Monotonía respecto a las lecturas vecinas (sin consultas si es la más reciente)
+            _, _, rejected = check_reading_order(meters, [self])
+            if rejected:
                 from django.core.exceptions import ValidationError
-                raise ValidationError(
-                    f"El valor acumulado ({self.accumulated_value}) no puede ser menor "
-                    f"que la última lectura ({last_reading.accumulated_value})"
-                )
-        super().save(*args, **kwargs)
\ No newline at end of file
+                raise ValidationError(rejected[0][1])
+            super().save(*args, **kwargs)
+            if meter.merge_readings([self]):
+                meter.save(update_fields=Meter.SNAPSHOT_FIELDS)
+            refresh_rollups({self.meter_id: [(self.timestamp, self.timestamp)]})
+            detect_readings(meters, [self])
+    
+    def delete(self, *args, **kwargs):
+        from .rollups import refresh_rollups
+        
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Meter.objects.filter(pk=self.meter_id).rebuild_reading_snapshots()
+            refresh_rollups({self.meter_id: [(self.timestamp, self.timestamp)]})
+        return result
+
+
+class ConsumptionRollup(models.Model):
+    """
+    Consumo agregado de un contador en un intervalo (día u hora local).
+
+    El consumo de cada lectura respecto a la anterior se asigna al intervalo
+    de la lectura; se guarda en unidades del contador para que un cambio de
+    `liters_per_unit` no invalide los agregados. Se mantienen al escribir
+    lecturas (ver meters/rollups.py).
+    """
+    
+    units = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0,
+        verbose_name="Unidades consumidas"
+    )
+    hours = models.FloatField(default=0, verbose_name="Horas cubiertas")
+    readings = models.PositiveIntegerField(default=0, verbose_name="Lecturas")
+    first_reading_at = models.DateTimeField(verbose_name="Primera lectura")
+    first_value = models.DecimalField(max_digits=15, decimal_places=2)
+    last_reading_at = models.DateTimeField(verbose_name="Última lectura")
+    last_value = models.DecimalField(max_digits=15, decimal_places=2)
+    
+    class Meta:
+        abstract = True
+
+
+class MeterDailyConsumption(ConsumptionRollup):
+    """Consumo diario agregado de un contador"""
+    
+    meter = models.ForeignKey(
+        Meter,
+        on_delete=models.CASCADE,
+        related_name='daily_consumption',
+        verbose_name="Contador"
+    )
+    day = models.DateField(verbose_name="Día")
+    
+    class Meta:
+        verbose_name = "Consumo Diario"
+        verbose_name_plural = "Consumos Diarios"
+        ordering = ['meter', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['meter', 'day'], name='unique_meter_day_consumption'),
+        ]
+    
+    def __str__(self):
+        return f"{self.meter_id} - {self.day}: {self.units}"
+
+
+class MeterHourlyConsumption(ConsumptionRollup):
+    """Consumo por hora agregado de un contador"""
+    
+    meter = models.ForeignKey(
+        Meter,
+        on_delete=models.CASCADE,
+        related_name='hourly_consumption',
+        verbose_name="Contador"
+    )
+    hour = models.DateTimeField(verbose_name="Hora")
+    
+    class Meta:
+        verbose_name = "Consumo por Hora"
+        verbose_name_plural = "Consumos por Hora"
+        ordering = ['meter', 'hour']
+        constraints = [
+            models.UniqueConstraint(fields=['meter', 'hour'], name='unique_meter_hour_consumption'),
+        ]
+    
+    def __str__(self):
+        return f"{self.meter_id} - {self.hour}: {self.units}"
+
+
+class PendingReading(models.Model):
+    """
+    Lectura recibida en modo cola (READING_INGEST_MODE='queue'), pendiente de
+    que el worker process_ingest_queue la valide e inserte por lotes (ver
+    meters/ingest_queue.py). Solo se validan los campos al recibirla.
+    """
+    
+    meter_id = models.CharField(max_length=50, verbose_name="ID del contador")
+    accumulated_value = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Valor acumulado")
+    timestamp = models.DateTimeField(verbose_name="Fecha y hora")
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name="Recibida")
+    
+    class Meta:
+        verbose_name = "Lectura en Cola"
+        verbose_name_plural = "Lecturas en Cola"
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.meter_id} - {self.accumulated_value} @ {self.timestamp}"
+
+
+class IngestBatch(models.Model):
+    """Lote procesado por el worker de la cola de ingesta (métricas de lag, rendimiento y rechazos)"""
+    
+    started_at = models.DateTimeField(verbose_name="Inicio")
+    finished_at = models.DateTimeField(db_index=True, verbose_name="Fin")
+    readings = models.PositiveIntegerField(verbose_name="Lecturas procesadas")
+    created = models.PositiveIntegerField(verbose_name="Lecturas insertadas")
+    duplicates = models.PositiveIntegerField(default=0, verbose_name="Lecturas duplicadas")
+    rejected = models.PositiveIntegerField(verbose_name="Lecturas rechazadas")
+    max_lag = models.FloatField(verbose_name="Lag máximo (s)",
+                                help_text="Segundos entre la recepción más antigua del lote y su inserción")
+    errors = models.JSONField(default=list, blank=True, verbose_name="Rechazos")
+    
+    class Meta:
+        verbose_name = "Lote de Ingesta"
+        verbose_name_plural = "Lotes de Ingesta"
+        ordering = ['-finished_at']
+    
+    def __str__(self):
+        return f"{self.finished_at}: {self.created} insertadas, {self.rejected} rechazadas"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Respuesta de una petición de ingesta enviada con el encabezado
+    Idempotency-Key; un reintento con la misma clave recibe esta respuesta sin
+    volver a procesarse (ver meters/idempotency.py).
+    """
+    
+    endpoint = models.CharField(max_length=50, verbose_name="Endpoint")
+    key = models.CharField(max_length=255, verbose_name="Clave")
+    status_code = models.PositiveSmallIntegerField(verbose_name="Código de respuesta")
+    response = models.JSONField(encoder=DjangoJSONEncoder, verbose_name="Respuesta")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = "Clave de Idempotencia"
+        verbose_name_plural = "Claves de Idempotencia"
+        constraints = [
+            models.UniqueConstraint(fields=['endpoint', 'key'], name='unique_idempotency_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.endpoint}: {self.key}"
+
+
+class MeterDetectionState(models.Model):
+    """
+    Estado incremental del detector de anomalías de un contador (ver
+    meters/detection.py): lo necesario para evaluar cada lectura nueva sin
+    releer el historial.
+    """
+    
+    meter = models.OneToOneField(
+        Meter,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='detection_state',
+        verbose_name="Contador"
+    )
+    last_reading_at = models.DateTimeField(null=True, blank=True, verbose_name="Última lectura evaluada")
+    last_value = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    intervals = models.PositiveIntegerField(default=0, verbose_name="Intervalos evaluados")
+    flow_mean = models.FloatField(default=0, verbose_name="Media móvil del caudal (L/h)")
+    flow_var = models.FloatField(default=0, verbose_name="Varianza móvil del caudal")
+    zero_since = models.DateTimeField(null=True, blank=True, verbose_name="Sin consumo desde")
+    night = models.DateField(null=True, blank=True, verbose_name="Noche en curso")
+    night_min_flow = models.FloatField(null=True, blank=True, verbose_name="Caudal nocturno mínimo (L/h)")
+    open_alerts = models.JSONField(default=list, blank=True, verbose_name="Tipos de alerta abiertos")
+    
+    class Meta:
+        verbose_name = "Estado del Detector"
+        verbose_name_plural = "Estados del Detector"
+    
+    def __str__(self):
+        return f"{self.meter_id} @ {self.last_reading_at}"
+
+
+class Alert(models.Model):
+    """
+    Alerta de un contador generada por el detector de anomalías. Cada
+    contador tiene como mucho una alerta abierta (sin resolved_at) por tipo.
+    """
+    
+    LEAK = 'leak'
+    SPIKE = 'spike'
+    NO_CONSUMPTION = 'no_consumption'
+    ROLLOVER = 'rollover'
+    REGRESSION = 'regression'
+    KINDS = [
+        (LEAK, 'Posible fuga (caudal nocturno)'),
+        (SPIKE, 'Consumo anómalo'),
+        (NO_CONSUMPTION, 'Sin consumo'),
+        (ROLLOVER, 'Vuelta a cero del contador'),
+        (REGRESSION, 'Lectura menor que la anterior'),
+    ]
+    
+    meter = models.ForeignKey(
+        Meter,
+        on_delete=models.CASCADE,
+        related_name='alerts',
+        verbose_name="Contador"
+    )
+    kind = models.CharField(max_length=20, choices=KINDS, verbose_name="Tipo")
+    started_at = models.DateTimeField(verbose_name="Fecha de la lectura")
+    detected_at = models.DateTimeField(auto_now_add=True, verbose_name="Detectada")
+    resolved_at = models.DateTimeField(null=True, blank=True, verbose_name="Resuelta")
+    value = models.FloatField(null=True, blank=True, verbose_name="Valor",
+                              help_text="Caudal (L/h), horas sin consumo o valor acumulado, según el tipo")
+    message = models.CharField(max_length=255, verbose_name="Mensaje")
+    details = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, verbose_name="Detalles")
+    
+    class Meta:
+        verbose_name = "Alerta"
+        verbose_name_plural = "Alertas"
+        ordering = ['-started_at', '-id']
+        indexes = [
+            models.Index(fields=['meter', '-started_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['meter', 'kind'],
+                condition=models.Q(resolved_at__isnull=True),
+                name='unique_open_alert',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.meter_id} - {self.get_kind_display()} @ {self.started_at}"
+
+
+def lock_meters(pks):
+    """
+    Bloquea (select_for_update) los contadores dentro de la transacción en
+    curso y los retorna con su snapshot vigente. El orden por pk evita
+    interbloqueos entre escrituras que tocan varios contadores.
+
+    Returns:
+        dict: pk -> Meter
+    """
+    return {
+        meter.pk: meter for meter in
+        Meter.objects.select_for_update(of=('self',)).select_related('model')
+        .filter(pk__in=set(pks)).order_by('pk')
+    }
+
+
+def regression_message(value, previous_value):
+    return (
+        f"El valor acumulado ({value}) no puede ser menor "
+        f"que la última lectura ({previous_value})"
+    )
+
+
+def backfill_regression_message(value, previous):
+    return (
+        f"El valor acumulado ({value}) no puede ser menor que la lectura "
+        f"anterior ({previous.accumulated_value} el {timezone.localtime(previous.timestamp).isoformat()})"
+    )
+
+
+def backfill_overflow_message(value, following):
+    return (
+        f"El valor acumulado ({value}) no puede ser mayor que la lectura "
+        f"siguiente ({following.accumulated_value} el {timezone.localtime(following.timestamp).isoformat()})"
+    )
+
+
+def _stored_neighbours(backfills, exclude=()):
+    """
+    Lecturas guardadas entre la anterior a la primera y la siguiente a la
+    última fecha de `backfills` (pk -> fechas) de cada contador, en una sola
+    consulta por el índice (meter, timestamp). Se omiten las de id en `exclude`.
+    """
+    window = models.Q()
+    for pk, timestamps in backfills.items():
+        first, last = min(timestamps), max(timestamps)
+        readings = ConsumptionReading.objects.filter(meter_id=pk).exclude(id__in=exclude)
+        before = readings.filter(timestamp__lt=first).order_by('-timestamp').values('timestamp')[:1]
+        after = readings.filter(timestamp__gt=last).order_by('timestamp').values('timestamp')[:1]
+        window |= models.Q(
+            meter_id=pk,
+            timestamp__gte=Coalesce(Subquery(before), Value(first)),
+            timestamp__lte=Coalesce(Subquery(after), Value(last)),
+        )
+    points = defaultdict(dict)
+    if backfills:
+        for reading_id, meter_id, value, timestamp in (
+            ConsumptionReading.objects.filter(window).exclude(id__in=exclude).order_by()
+            .values_list('id', 'meter_id', 'accumulated_value', 'timestamp')
+        ):
+            points[meter_id][timestamp] = ReadingPoint(reading_id, value, timestamp)
+    return points
+
+
+def check_reading_order(meters, readings, exclude=()):
+    """
+    Comprueba que lecturas nuevas (sin guardar) respeten la monotonía del
+    valor acumulado respecto a sus vecinas cronológicas: no menor que la
+    lectura anterior ni mayor que la siguiente, contando también las demás
+    lecturas nuevas del mismo contador. Al editar una lectura, su id va en
+    `exclude` para que su versión guardada no cuente como vecina.
+
+    Debe llamarse dentro de la transacción con los contadores bloqueados
+    (ver lock_meters): su snapshot es el vigente y ninguna escritura
+    concurrente puede insertar entre la comprobación y el INSERT. Las
+    lecturas posteriores a la última guardada (el caso habitual) se comparan
+    con el snapshot sin consultas; las anteriores (cargas históricas) con
+    sus vecinas reales, leídas en una consulta para todo el lote.
+
+    Args:
+        meters: pk -> Meter bloqueado
+        readings: Lecturas nuevas de esos contadores
+
+    Returns:
+        tuple: (accepted, duplicates, rejected) con índices de `readings`;
+        duplicates son las de fecha ya guardada y rejected = [(índice, mensaje)]
+    """
+    by_meter = defaultdict(list)
+    for index, reading in enumerate(readings):
+        by_meter[reading.meter_id].append(index)
+    
+    backfills = {}
+    for pk, indexes in by_meter.items():
+        last_at = meters[pk].last_reading_at
+        older = [readings[index].timestamp for index in indexes
+                 if last_at is not None and readings[index].timestamp < last_at]
+        if older:
+            backfills[pk] = older
+    stored = _stored_neighbours(backfills, exclude)
+    
+    accepted, duplicates, rejected = [], [], []
+    for pk, indexes in by_meter.items():
+        points = stored[pk]
+        for point in meters[pk].get_latest_readings():
+            if point is not None and point.id not in exclude:
+                points[point.timestamp] = point
+        timeline = sorted(points)
+        
+        for index in sorted(indexes, key=lambda index: (readings[index].timestamp, index)):
+            reading = readings[index]
+            value, timestamp = reading.accumulated_value, reading.timestamp
+            if timestamp in points:
+                duplicates.append(index)
+                continue
+            position = bisect_left(timeline, timestamp)
+            previous = points[timeline[position - 1]] if position > 0 else None
+            following = points[timeline[position]] if position < len(timeline) else None
+            if previous is not None and value < previous.accumulated_value:
+                message = (regression_message(value, previous.accumulated_value) if following is None
+                           else backfill_regression_message(value, previous))
+                rejected.append((index, message))
+                continue
+            if following is not None and value > following.accumulated_value:
+                rejected.append((index, backfill_overflow_message(value, following)))
+                continue
+            accepted.append(index)
+            timeline.insert(position, timestamp)
+            points[timestamp] = ReadingPoint(None, value, timestamp)
+    return sorted(accepted), duplicates, rejected
+
+
+def update_reading_snapshots(readings, meters=None):
+    """
+    Actualiza el snapshot de los contadores afectados por lecturas recién
+    creadas (p. ej. tras `bulk_create`). Debe llamarse dentro de la misma
+    transacción: bloquea las filas de los contadores para que ingestas
+    concurrentes no pierdan actualizaciones.
+
+    Args:
+        meters: pk -> Meter ya bloqueados en la transacción (ver lock_meters),
+            para no volver a consultarlos
+
+    Returns:
+        dict: pk -> Meter con el snapshot actualizado
+    """
+    by_meter = defaultdict(list)
+    for reading in readings:
+        by_meter[reading.meter_id].append(reading)
+    
+    if meters is None:
+        meters = lock_meters(by_meter)
+    else:
+        meters = {pk: meters[pk] for pk in by_meter}
+    changed = [meter for pk, meter in meters.items() if meter.merge_readings(by_meter[pk])]
+    if changed:
+        from .map_cache import invalidate_map_cache
+        Meter.objects.bulk_update(changed, Meter.SNAPSHOT_FIELDS, batch_size=500)
+        invalidate_map_cache()
+    return meters
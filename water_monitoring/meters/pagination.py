@@ -0,0 +1,153 @@
+# meters/pagination.py
+
+import base64
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Por debajo de esta estimación se cuenta de forma exacta
+EXACT_COUNT_THRESHOLD = 50000
+
+
+class ReadingCursorPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre (timestamp, id), de la lectura más
+    reciente a la más antigua.
+
+    Cada página filtra desde la posición del cursor y lee `page_size + 1`
+    filas siguiendo el índice por fecha, sin OFFSET ni COUNT(*), así que la
+    latencia es la misma en la primera página que en la página un millón.
+    """
+    page_size = 100
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, position, reverse):
+        timestamp, pk = position
+        payload = json.dumps({'t': timestamp.isoformat(), 'i': pk, 'r': int(reverse)})
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            timestamp = parse_datetime(payload['t'])
+            if timestamp is None:
+                raise ValueError
+            return timestamp, int(payload['i']), bool(payload['r'])
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.cursor_query_param)
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+
+        if cursor is None:
+            queryset = queryset.order_by('-timestamp', '-id')
+        elif reverse:
+            timestamp, pk, _ = cursor
+            # El rango redundante en timestamp permite recorrer el índice directamente
+            queryset = queryset.filter(
+                Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk),
+                timestamp__gte=timestamp
+            ).order_by('timestamp', 'id')
+        else:
+            timestamp, pk, _ = cursor
+            queryset = queryset.filter(
+                Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk),
+                timestamp__lte=timestamp
+            ).order_by('-timestamp', '-id')
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        has_next = has_more if not reverse else True
+        has_previous = cursor is not None if not reverse else has_more
+        self.next_position = (results[-1].timestamp, results[-1].pk) if has_next and results else None
+        self.previous_position = (results[0].timestamp, results[0].pk) if has_previous and results else None
+        return results
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+def estimated_count(queryset, exact_below=EXACT_COUNT_THRESHOLD):
+    """
+    Número de filas del queryset sin COUNT(*) sobre tablas grandes.
+
+    En PostgreSQL se usa la estimación del planificador: `reltuples` de la
+    tabla (o de sus particiones) si no hay filtros, o las filas estimadas por
+    EXPLAIN si los hay. Si la estimación es menor que `exact_below` se cuenta
+    de forma exacta, que en ese caso es barato.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT coalesce(sum(greatest(reltuples, 0)), 0)::bigint
+                FROM pg_class
+                WHERE relkind <> 'p'
+                  AND (oid = to_regclass(%s)
+                       OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s)))
+                """,
+                [queryset.model._meta.db_table] * 2
+            )
+            estimate = cursor.fetchone()[0]
+    else:
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        estimate = plan[0]['Plan']['Plan Rows']
+
+    if estimate < exact_below:
+        return queryset.count()
+    return int(estimate)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginador (p. ej. para el admin) que estima el total en tablas grandes (ver estimated_count)"""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
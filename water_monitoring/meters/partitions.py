@@ -0,0 +1,189 @@
+# meters/partitions.py
+
+"""
+Particionado mensual de las lecturas (solo PostgreSQL).
+
+La migración 0004 convierte meters_consumptionreading en una tabla
+particionada por rango de `timestamp`: una partición por mes local
+(meters_consumptionreading_pAAAA_MM) y una partición por defecto para las
+lecturas que caen fuera de los meses creados. Las consultas filtradas por
+fecha (`timestamp__gte=...`) solo recorren las particiones del rango, y el
+vacuum y el mantenimiento de índices trabajan sobre tablas de un mes.
+
+Las particiones futuras se crean con anticipación y las antiguas se separan
+de la tabla o se archivan comprimidas según la política de retención (comando
+reading_partitions). Los agregados diarios y por hora no se tocan, así que
+las estadísticas de largo plazo se conservan.
+"""
+
+import gzip
+import os
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Meter, ConsumptionReading
+
+TABLE = ConsumptionReading._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_PREFIX = f'{TABLE}_p'
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned():
+    """Indica si la tabla de lecturas está particionada en esta base de datos"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def month_start(value, tz=None):
+    """Medianoche local del primer día del mes de `value`"""
+    tz = tz or timezone.get_current_timezone()
+    local = value.astimezone(tz)
+    return datetime(local.year, local.month, 1, tzinfo=tz)
+
+
+def add_months(start, months):
+    index = start.year * 12 + start.month - 1 + months
+    return start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(start):
+    return f'{PARTITION_PREFIX}{start:%Y_%m}'
+
+
+def list_partitions():
+    """[(nombre, inicio del mes, filas estimadas)] de las particiones mensuales, en orden"""
+    tz = timezone.get_current_timezone()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, child.reltuples::bigint
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [TABLE]
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, estimate in rows:
+        if not name.startswith(PARTITION_PREFIX):
+            continue
+        year, month = name[len(PARTITION_PREFIX):].split('_')
+        partitions.append((name, datetime(int(year), int(month), 1, tzinfo=tz), max(estimate, 0)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _default_partition_months(tz):
+    """Meses que tienen lecturas en la partición por defecto"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', timestamp AT TIME ZONE %s) FROM {_qn(DEFAULT_PARTITION)}",
+            [timezone.get_current_timezone_name()]
+        )
+        return {datetime(month.year, month.month, 1, tzinfo=tz) for (month,) in cursor.fetchall()}
+
+
+def create_partition(start):
+    """
+    Crea y adjunta la partición del mes que empieza en `start`.
+
+    Se crea como tabla independiente, se le mueven las lecturas del mes que
+    estuvieran en la partición por defecto y luego se adjunta (ATTACH), que
+    no bloquea las lecturas sobre la tabla particionada.
+    """
+    end = add_months(start, 1)
+    name = _qn(partition_name(start))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {name} (LIKE {_qn(TABLE)})")
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {_qn(DEFAULT_PARTITION)}
+                WHERE timestamp >= %s AND timestamp < %s
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """,
+            [start, end]
+        )
+        cursor.execute(
+            f"ALTER TABLE {_qn(TABLE)} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+            [start, end]
+        )
+
+
+def ensure_partitions(months_ahead=3):
+    """
+    Crea las particiones que falten desde el mes actual hasta `months_ahead`
+    meses adelante, y las de los meses con lecturas en la partición por
+    defecto (p. ej. tras importar historial). Retorna los nombres creados.
+    """
+    tz = timezone.get_current_timezone()
+    current = month_start(timezone.now(), tz)
+    existing = {start for _, start, _ in list_partitions()}
+
+    wanted = {add_months(current, offset) for offset in range(months_ahead + 1)}
+    wanted |= _default_partition_months(tz)
+
+    created = []
+    for start in sorted(wanted - existing):
+        create_partition(start)
+        created.append(partition_name(start))
+    return created
+
+
+def archive_partition(name, archive_dir):
+    """
+    Exporta una partición a <archive_dir>/<nombre>.csv.gz con COPY, en el
+    formato de la importación CSV (meter_id,accumulated_value,timestamp).
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'{name}.csv.gz')
+    query = f"""
+        COPY (
+            SELECT meter.meter_id, reading.accumulated_value, reading.timestamp
+            FROM {_qn(name)} reading
+            JOIN {_qn(Meter._meta.db_table)} meter ON meter.id = reading.meter_id
+            ORDER BY reading.timestamp, reading.id
+        ) TO STDOUT WITH (FORMAT csv, HEADER)
+    """
+    with gzip.open(path, 'wb') as output, connection.cursor() as cursor:
+        cursor.copy_expert(query, output)
+    return path
+
+
+def apply_retention(keep_months, archive_dir=None):
+    """
+    Separa de la tabla las particiones anteriores a los últimos `keep_months`
+    meses (contando el actual).
+
+    Con `archive_dir` cada partición se exporta comprimida con
+    archive_partition y se elimina; sin él queda como tabla independiente,
+    fuera de las consultas, para archivarla aparte (pg_dump, otro
+    tablespace...). Retorna [(partición, archivo o None)].
+    """
+    cutoff = add_months(month_start(timezone.now()), -(keep_months - 1))
+    results = []
+    for name, start, _ in list_partitions():
+        if start >= cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {_qn(TABLE)} DETACH PARTITION {_qn(name)}")
+
+        path = None
+        if archive_dir:
+            path = archive_partition(name, archive_dir)
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE {_qn(name)}")
+        results.append((name, path))
+    return results
@@ -0,0 +1,259 @@
+# meters/rollups.py
+
+"""
+Agregados de consumo diarios y por hora (MeterDailyConsumption /
+MeterHourlyConsumption).
+
+Se mantienen de forma incremental al escribir lecturas: para cada contador
+afectado se recalculan, desde las lecturas crudas, solo los días locales
+(con sus horas) que contienen lecturas escritas o borradas, más el de la
+siguiente lectura guardada tras cada una, la única cuyo consumo cambia al
+cambiar su "anterior". En el caso habitual (lecturas nuevas al final) eso es
+solo el día en curso; una lectura tardía añade como mucho un día más, sin
+releer el historial posterior. La lectura inmediatamente anterior a cada
+tramo de días se usa como semilla del primer consumo.
+
+Las gráficas por día/hora y las estadísticas leen estos agregados en lugar
+de recorrer el historial crudo.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import (
+    ReadingPoint, Meter, ConsumptionReading, MeterDailyConsumption, MeterHourlyConsumption
+)
+
+BUCKETS = ('day', 'hour')
+
+
+def _local_midnight(timestamp, tz):
+    return datetime.combine(timestamp.astimezone(tz).date(), time(), tzinfo=tz)
+
+
+def _next_local_midnight(timestamp, tz):
+    return datetime.combine(timestamp.astimezone(tz).date() + timedelta(days=1), time(), tzinfo=tz)
+
+
+def _accumulate(store, key, timestamp, value, previous):
+    bucket = store.get(key)
+    if bucket is None:
+        bucket = store[key] = {
+            'units': Decimal(0), 'hours': 0.0, 'readings': 0,
+            'first_reading_at': timestamp, 'first_value': value,
+        }
+    bucket['readings'] += 1
+    bucket['last_reading_at'] = timestamp
+    bucket['last_value'] = value
+    if previous is not None:
+        previous_timestamp, previous_value = previous
+        bucket['units'] += value - previous_value
+        bucket['hours'] += (timestamp - previous_timestamp).total_seconds() / 3600
+
+
+def _day_runs(days, tz):
+    """Agrupa días locales en tramos consecutivos (inicio, fin) de medianoches locales"""
+    runs = []
+    for day in sorted(days):
+        start = datetime.combine(day, time(), tzinfo=tz)
+        if runs and runs[-1][1] == start:
+            runs[-1][1] = _next_local_midnight(start, tz)
+        else:
+            runs.append([start, _next_local_midnight(start, tz)])
+    return [tuple(run) for run in runs]
+
+
+def _refresh_range(meter_pks, start, end, tz, follow=True, covered=None):
+    """
+    Recalcula los agregados de `meter_pks` en [start, end) (medianoches locales).
+
+    Con `follow`, el rango de cada contador se alarga hasta el día de su
+    siguiente lectura guardada desde `end` (su consumo cambia si cambió la
+    anterior); entre `end` y esa lectura no hay otras, así que no se lee
+    historial de más. Se omite si ese día ya está en `covered` (pk -> días
+    que se recalculan en otro tramo).
+    """
+    before_start = ConsumptionReading.objects.filter(
+        meter=OuterRef('pk'), timestamp__lt=start
+    ).order_by('-timestamp', '-id')
+    annotations = {
+        'seed_at': Subquery(before_start.values('timestamp')[:1]),
+        'seed_value': Subquery(before_start.values('accumulated_value')[:1]),
+    }
+    if follow:
+        annotations['next_at'] = Subquery(
+            ConsumptionReading.objects.filter(meter=OuterRef('pk'), timestamp__gte=end)
+            .order_by('timestamp').values('timestamp')[:1]
+        )
+    seeds = {}
+    ends = defaultdict(list)
+    for meter in Meter.objects.filter(pk__in=meter_pks).annotate(**annotations).values(
+        'pk', *annotations
+    ):
+        if meter['seed_at'] is not None:
+            seeds[meter['pk']] = (meter['seed_at'], meter['seed_value'])
+        meter_end = end
+        next_at = meter.get('next_at')
+        if next_at is not None and next_at.astimezone(tz).date() not in (covered or {}).get(meter['pk'], ()):
+            meter_end = _next_local_midnight(next_at, tz)
+        ends[meter_end].append(meter['pk'])
+    if not ends:
+        return
+
+    readings_window, daily_window, hourly_window = Q(), Q(), Q()
+    for meter_end, pks in ends.items():
+        readings_window |= Q(meter_id__in=pks, timestamp__gte=start, timestamp__lt=meter_end)
+        daily_window |= Q(meter_id__in=pks, day__gte=start.date(), day__lt=meter_end.date())
+        hourly_window |= Q(meter_id__in=pks, hour__gte=start, hour__lt=meter_end)
+
+    rows = (
+        ConsumptionReading.objects
+        .filter(readings_window)
+        .order_by('meter_id', 'timestamp', 'id')
+        .values_list('meter_id', 'timestamp', 'accumulated_value')
+    )
+    daily = {}
+    hourly = {}
+    current_meter = previous = None
+    for meter_pk, timestamp, value in rows.iterator(chunk_size=5000):
+        if meter_pk != current_meter:
+            current_meter = meter_pk
+            previous = seeds.get(meter_pk)
+        local = timestamp.astimezone(tz)
+        _accumulate(daily, (meter_pk, local.date()), timestamp, value, previous)
+        _accumulate(hourly, (meter_pk, local.replace(minute=0, second=0, microsecond=0)),
+                    timestamp, value, previous)
+        previous = (timestamp, value)
+
+    with transaction.atomic():
+        MeterDailyConsumption.objects.filter(daily_window).delete()
+        MeterHourlyConsumption.objects.filter(hourly_window).delete()
+        MeterDailyConsumption.objects.bulk_create([
+            MeterDailyConsumption(meter_id=meter_pk, day=day, **values)
+            for (meter_pk, day), values in daily.items()
+        ], batch_size=1000)
+        MeterHourlyConsumption.objects.bulk_create([
+            MeterHourlyConsumption(meter_id=meter_pk, hour=hour, **values)
+            for (meter_pk, hour), values in hourly.items()
+        ], batch_size=1000)
+
+
+def refresh_rollups(spans):
+    """
+    Actualiza los agregados tras escribir, editar o borrar lecturas.
+
+    Args:
+        spans: dict pk de contador -> lista de (primera, última) fecha de las
+            lecturas afectadas (para una lectura suelta, (fecha, fecha)). Se
+            recalculan los días locales de cada tramo y el de la siguiente
+            lectura guardada tras él, la única cuyo consumo cambia.
+    """
+    if not spans:
+        return
+    tz = timezone.get_current_timezone()
+    days = {}
+    for meter_pk, ranges in spans.items():
+        days[meter_pk] = {
+            first.astimezone(tz).date() + timedelta(days=offset)
+            for first, last in ranges
+            for offset in range((last.astimezone(tz).date() - first.astimezone(tz).date()).days + 1)
+        }
+
+    # Contadores con los mismos tramos se recalculan juntos (lo habitual: el día en curso)
+    groups = defaultdict(list)
+    for meter_pk, meter_days in days.items():
+        for run in _day_runs(meter_days, tz):
+            groups[run].append(meter_pk)
+
+    for (start, end), meter_pks in groups.items():
+        _refresh_range(meter_pks, start, end, tz, covered=days)
+
+
+def spans_for_readings(readings):
+    """Agrupa lecturas por contador en tramos (fecha, fecha), uno por lectura"""
+    spans = defaultdict(list)
+    for reading in readings:
+        spans[reading.meter_id].append((reading.timestamp, reading.timestamp))
+    return spans
+
+
+def backfill_rollups(meters, since=None, chunk_days=31, on_progress=None):
+    """
+    Reconstruye los agregados de `meters` desde el historial, por tramos de
+    `chunk_days` días para acotar la memoria. Retorna cuántos contadores se
+    procesaron.
+    """
+    tz = timezone.get_current_timezone()
+    count = 0
+    for meter in meters.only('pk', 'last_reading_at').iterator(chunk_size=100):
+        if meter.last_reading_at is None:
+            continue
+        first = since or meter.readings.order_by('timestamp').values_list('timestamp', flat=True).first()
+        start = _local_midnight(first, tz)
+        end = _next_local_midnight(meter.last_reading_at, tz)
+        while start < end:
+            chunk_end = min(end, _local_midnight(start + timedelta(days=chunk_days), tz))
+            _refresh_range([meter.pk], start, chunk_end, tz, follow=False)
+            start = chunk_end
+        count += 1
+        if on_progress is not None:
+            on_progress(meter, count)
+    return count
+
+
+def rollup_series(meter, since, bucket):
+    """
+    Serie de consumo por día u hora desde los agregados. La ventana se
+    redondea al inicio del intervalo que contiene `since`.
+    """
+    tz = timezone.get_current_timezone()
+    liters_per_unit = float(meter.model.liters_per_unit)
+
+    if bucket == 'day':
+        rows = meter.daily_consumption.filter(day__gte=since.astimezone(tz).date()).order_by('day')
+        key_field = 'day'
+    else:
+        since = since.astimezone(tz).replace(minute=0, second=0, microsecond=0)
+        rows = meter.hourly_consumption.filter(hour__gte=since).order_by('hour')
+        key_field = 'hour'
+
+    series = []
+    for key, units, hours, readings in rows.values_list(key_field, 'units', 'hours', 'readings'):
+        if bucket == 'hour':
+            key = key.astimezone(tz)
+        series.append({
+            'date': key.isoformat(),
+            'liters': round(float(units) * liters_per_unit, 2),
+            'hours': round(hours, 2),
+            'readings': readings,
+        })
+    return series
+
+
+def window_summary(meter, since):
+    """
+    Primera lectura (ReadingPoint) y número de lecturas desde `since`.
+
+    El tramo hasta la siguiente medianoche local se lee de las lecturas
+    crudas; los días completos, de MeterDailyConsumption.
+    """
+    tz = timezone.get_current_timezone()
+    head_end = _next_local_midnight(since, tz)
+
+    head = meter.readings.filter(timestamp__gte=since, timestamp__lt=head_end).order_by('timestamp')
+    first = head.values_list('accumulated_value', 'timestamp').first()
+    count = head.count()
+
+    days = meter.daily_consumption.filter(day__gte=head_end.date())
+    count += days.aggregate(total=Sum('readings'))['total'] or 0
+    if first is None:
+        first = days.order_by('day').values_list('first_value', 'first_reading_at').first()
+
+    if first is None:
+        return None, count
+    return ReadingPoint(None, *first), count
@@ -1,7 +1,9 @@
 # meters/serializers.py
 
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import MeterModel, Meter, ConsumptionReading
+from .models import MeterModel, Meter, ConsumptionReading, Alert, consumption_between
 
 
 class MeterModelSerializer(serializers.ModelSerializer):
@@ -14,6 +16,9 @@ class MeterModelSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
     
     def get_meter_count(self, obj):
+        # Anotado por MeterModelViewSet para evitar una consulta por modelo
+        if hasattr(obj, 'active_meter_count'):
+            return obj.active_meter_count
         return obj.meters.filter(is_active=True).count()
 
 
@@ -33,6 +38,18 @@ class ConsumptionReadingSerializer(serializers.ModelSerializer):
     
     def get_consumption_info(self, obj):
         return obj.get_consumption_since_last()
+    
+    def update(self, instance, validated_data):
+        # La edición también valida la monotonía respecto a las lecturas vecinas
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'timestamp': ['Ya existe una lectura de este contador con esa fecha y hora']}
+            )
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'accumulated_value': e.messages})
 
 
 class ConsumptionReadingCreateSerializer(serializers.ModelSerializer):
@@ -53,7 +70,24 @@ class ConsumptionReadingCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         meter = validated_data.pop('meter_id')
         validated_data['meter'] = meter
-        return super().create(validated_data)
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'timestamp': ['Ya existe una lectura de este contador con esa fecha y hora']}
+            )
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'accumulated_value': e.messages})
+
+
+class ReadingIngestSerializer(serializers.ModelSerializer):
+    """Validación de campos de una lectura sin consultar la base de datos"""
+    meter_id = serializers.CharField()
+    
+    class Meta:
+        model = ConsumptionReading
+        fields = ['meter_id', 'accumulated_value', 'timestamp']
 
 
 class BulkReadingSerializer(serializers.Serializer):
@@ -99,7 +133,7 @@ class MeterSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
     
     def get_last_reading(self, obj):
-        last = obj.get_last_reading()
+        last, _ = obj.get_latest_readings()
         if last:
             return {
                 'accumulated_value': float(last.accumulated_value),
@@ -138,9 +172,11 @@ class MeterGeoJSONSerializer(serializers.ModelSerializer):
                   'latitude', 'longitude', 'last_reading', 'liters_per_unit']
     
     def get_last_reading(self, obj):
-        last = obj.get_last_reading()
+        last, previous = obj.get_latest_readings()
         if last:
-            consumption = last.get_consumption_since_last()
+            consumption = None
+            if previous:
+                consumption = consumption_between(last, previous, obj.model.liters_per_unit)
             liters = round(float(last.accumulated_value) * float(obj.model.liters_per_unit), 2)
             
             return {
@@ -149,4 +185,15 @@ class MeterGeoJSONSerializer(serializers.ModelSerializer):
                 'liters': liters,
                 'consumption': consumption
             }
-        return None
\ No newline at end of file
+        return None
+
+
+class AlertSerializer(serializers.ModelSerializer):
+    meter_id = serializers.CharField(source='meter.meter_id', read_only=True)
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+    
+    class Meta:
+        model = Alert
+        fields = ['id', 'meter', 'meter_id', 'kind', 'kind_display', 'started_at', 'detected_at',
+                  'resolved_at', 'value', 'message', 'details']
+        read_only_fields = fields
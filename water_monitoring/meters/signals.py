@@ -0,0 +1,14 @@
+# meters/signals.py
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .map_cache import invalidate_map_cache
+from .models import Meter, MeterModel
+
+
+@receiver([post_save, post_delete], sender=Meter)
+@receiver([post_save, post_delete], sender=MeterModel)
+def meter_changed(sender, **kwargs):
+    """Los contadores y sus modelos aparecen en el GeoJSON del mapa"""
+    invalidate_map_cache()
@@ -0,0 +1,382 @@
+# meters/tests.py
+
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .detection import backfill_alerts
+from .idempotency import prune_idempotency_keys
+from .ingest import ingest_readings
+from .models import (
+    MeterModel, Meter, ConsumptionReading, Alert, IdempotencyKey, MeterDailyConsumption,
+    MeterHourlyConsumption, MeterDetectionState
+)
+from .rollups import backfill_rollups
+
+
+class MeterListQueryCountTests(TestCase):
+    """El listado y el GeoJSON de contadores usan un número fijo de consultas"""
+
+    def setUp(self):
+        # Sesión real: las consultas de sesión y usuario cuentan en el total
+        self.client.force_login(User.objects.create_user('operador', password='x'))
+        self.model = MeterModel.objects.create(name='Modelo A', liters_per_unit=1)
+        self.other_model = MeterModel.objects.create(name='Modelo B', liters_per_unit=10)
+        self.created = 0
+
+    def add_meters(self, count):
+        now = timezone.now()
+        for _ in range(count):
+            self.created += 1
+            meter = Meter.objects.create(
+                meter_id=f'MTR{self.created:03d}',
+                model=self.model if self.created % 2 else self.other_model,
+                latitude=4.6 + self.created / 1000,
+                longitude=-74.1,
+            )
+            for hours, value in ((48, 100), (24, 150), (1, 180)):
+                ConsumptionReading.objects.create(
+                    meter=meter, accumulated_value=value, timestamp=now - timedelta(hours=hours)
+                )
+
+    def count_queries(self, url):
+        # Sin caché del mapa: se mide la generación completa del payload
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def assertConstantQueries(self, url, expected):
+        self.add_meters(1)
+        single = self.count_queries(url)
+        self.add_meters(19)
+        many = self.count_queries(url)
+        self.assertEqual(single, expected)
+        self.assertEqual(many, single)
+
+    def test_meter_list(self):
+        self.assertConstantQueries('/api/meters/', 4)
+
+    def test_meter_geojson(self):
+        self.assertConstantQueries('/api/meters/geojson/', 3)
+
+
+ROLLUP_FIELDS = ('meter_id', 'units', 'hours', 'readings', 'first_reading_at', 'first_value',
+                 'last_reading_at', 'last_value')
+
+
+class RollupRefreshTests(TestCase):
+    """Los agregados incrementales coinciden con reconstruirlos desde el historial"""
+
+    def setUp(self):
+        model = MeterModel.objects.create(name='Modelo A', liters_per_unit=1)
+        self.meter = Meter.objects.create(meter_id='MTR001', model=model, latitude=4.6, longitude=-74.1)
+        self.other = Meter.objects.create(meter_id='MTR002', model=model, latitude=4.7, longitude=-74.1)
+        # Cinco días con una lectura cada 6 horas
+        self.start = timezone.now().replace(microsecond=0) - timedelta(days=5)
+        created, _, errors = ingest_readings([
+            {'meter_id': 'MTR001', 'accumulated_value': 10 * step,
+             'timestamp': self.start + timedelta(hours=6 * step)}
+            for step in range(20)
+        ])
+        self.assertEqual((len(created), errors), (20, []))
+
+    def rollups(self):
+        return (
+            sorted(MeterDailyConsumption.objects.values_list('day', *ROLLUP_FIELDS)),
+            sorted(MeterHourlyConsumption.objects.values_list('hour', *ROLLUP_FIELDS)),
+        )
+
+    def assertRollupsRebuilt(self):
+        incremental = self.rollups()
+        MeterDailyConsumption.objects.all().delete()
+        MeterHourlyConsumption.objects.all().delete()
+        backfill_rollups(Meter.objects.all())
+        self.assertEqual(incremental, self.rollups())
+
+    def test_late_reading(self):
+        timestamp = self.start + timedelta(hours=6 * 4 + 3)
+        created, _, errors = ingest_readings([
+            {'meter_id': 'MTR001', 'accumulated_value': 45, 'timestamp': timestamp}
+        ])
+        self.assertEqual((len(created), errors), (1, []))
+        self.assertRollupsRebuilt()
+
+    def test_edited_reading(self):
+        readings = list(self.meter.readings.order_by('timestamp'))
+        # Cambia la fecha dentro del hueco con su vecina siguiente
+        edited = readings[7]
+        edited.timestamp += timedelta(hours=5)
+        edited.save()
+        self.assertRollupsRebuilt()
+
+        # Pasa la última lectura a otro contador
+        latest = readings[-1]
+        latest.meter = self.other
+        latest.save()
+        self.assertRollupsRebuilt()
+        self.meter.refresh_from_db()
+        self.assertEqual(self.meter.last_reading_pk, readings[-2].pk)
+        self.assertEqual(
+            MeterDailyConsumption.objects.filter(meter=self.other).values_list('readings', flat=True).get(), 1
+        )
+
+
+class ReadingOrderTests(TestCase):
+    """Monotonía del valor acumulado respecto a las lecturas vecinas"""
+
+    def setUp(self):
+        model = MeterModel.objects.create(name='Modelo A', liters_per_unit=1)
+        self.meter = Meter.objects.create(meter_id='MTR001', model=model, latitude=4.6, longitude=-74.1)
+        self.start = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        self.ingest([(0, 100), (2, 110), (4, 120)])
+
+    def at(self, hours):
+        return self.start + timedelta(hours=hours)
+
+    def ingest(self, points):
+        return ingest_readings([
+            {'meter_id': 'MTR001', 'accumulated_value': value, 'timestamp': self.at(hours)}
+            for hours, value in points
+        ])
+
+    def error_message(self, errors, index=0):
+        return errors[index]['errors']['accumulated_value'][0]
+
+    def test_backfill_between_neighbours(self):
+        created, duplicates, errors = self.ingest([(1, 105)])
+        self.assertEqual((len(created), duplicates, errors), (1, [], []))
+        self.assertEqual(self.meter.readings.count(), 4)
+
+    def test_backfill_below_previous(self):
+        created, _, errors = self.ingest([(1, 95)])
+        self.assertEqual(created, [])
+        self.assertIn('menor que la lectura anterior', self.error_message(errors))
+
+    def test_backfill_above_next(self):
+        created, _, errors = self.ingest([(3, 125)])
+        self.assertEqual(created, [])
+        self.assertIn('mayor que la lectura siguiente', self.error_message(errors))
+
+    def test_regression_within_batch(self):
+        created, _, errors = self.ingest([(5, 130), (6, 125), (7, 140)])
+        self.assertEqual([item['index'] for item in created], [0, 2])
+        self.assertEqual([error['index'] for error in errors], [1])
+        self.assertIn('no puede ser menor', self.error_message(errors))
+        self.meter.refresh_from_db()
+        self.assertEqual(self.meter.last_reading_value, 140)
+
+    def test_duplicate_timestamp(self):
+        created, duplicates, errors = self.ingest([(2, 110)])
+        self.assertEqual((created, errors), ([], []))
+        self.assertEqual(duplicates, [{'index': 0, 'meter_id': 'MTR001'}])
+
+    def test_edit_checks_neighbours(self):
+        middle = self.meter.readings.get(timestamp=self.at(2))
+        middle.accumulated_value = 125
+        with self.assertRaises(ValidationError):
+            middle.save()
+
+        # Su propia versión guardada no cuenta como vecina
+        middle.accumulated_value = 115
+        middle.timestamp = self.at(3)
+        middle.save()
+        latest = self.meter.readings.get(timestamp=self.at(4))
+        latest.accumulated_value = 121
+        latest.timestamp = self.at(5)
+        latest.save()
+        self.meter.refresh_from_db()
+        self.assertEqual((self.meter.last_reading_value, self.meter.previous_reading_value), (121, 115))
+
+    def test_edit_through_api(self):
+        self.client.force_login(User.objects.create_user('operador', password='x'))
+        middle = self.meter.readings.get(timestamp=self.at(2))
+        response = self.client.patch(f'/api/readings/{middle.pk}/', {'accumulated_value': 90},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('accumulated_value', response.json())
+        middle.refresh_from_db()
+        self.assertEqual(middle.accumulated_value, 110)
+
+
+class IdempotentIngestTests(TestCase):
+    """Idempotency-Key y duplicados por (contador, timestamp) en la ingesta pública"""
+
+    def setUp(self):
+        model = MeterModel.objects.create(name='Modelo A', liters_per_unit=1)
+        self.meter = Meter.objects.create(meter_id='MTR001', model=model, latitude=4.6, longitude=-74.1)
+        self.timestamp = timezone.now().replace(microsecond=123456) - timedelta(hours=1)
+
+    def post(self, url, body, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(url, body, content_type='application/json', **headers)
+
+    def test_replay_returns_stored_response(self):
+        body = {'meter_id': 'MTR001', 'accumulated_value': 10, 'timestamp': self.timestamp.isoformat()}
+        first = self.post('/api/public/reading/', body, key='k1')
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        with CaptureQueriesContext(connection) as context:
+            replay = self.post('/api/public/reading/', body, key='k1')
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        # Solo se busca la clave: ni bloqueos ni ingesta
+        self.assertEqual(len(context), 1)
+        self.assertEqual(self.meter.readings.count(), 1)
+
+    def test_keyed_and_unkeyed_responses_match(self):
+        later = self.timestamp + timedelta(minutes=1)
+        keyed = self.post('/api/public/reading/', {
+            'meter_id': 'MTR001', 'accumulated_value': 10, 'timestamp': self.timestamp.isoformat()
+        }, key='k1').json()
+        unkeyed = self.post('/api/public/reading/', {
+            'meter_id': 'MTR001', 'accumulated_value': 11, 'timestamp': later.isoformat()
+        }).json()
+        # Mismo formato: fechas completas, con microsegundos
+        self.assertEqual(parse_datetime(keyed['timestamp']), self.timestamp)
+        self.assertEqual(parse_datetime(unkeyed['timestamp']), later)
+        self.assertEqual(keyed.keys(), unkeyed.keys())
+
+    def test_rejected_response_is_not_stored(self):
+        body = {'meter_id': 'NOEXISTE', 'accumulated_value': 10}
+        self.assertEqual(self.post('/api/public/reading/', body, key='k2').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        # Corregida, la misma clave se procesa
+        body['meter_id'] = 'MTR001'
+        response = self.post('/api/public/reading/', body, key='k2')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_duplicate_reading_is_not_inserted(self):
+        body = {'readings': [
+            {'meter_id': 'MTR001', 'accumulated_value': 10 + step,
+             'timestamp': (self.timestamp + timedelta(minutes=step)).isoformat()}
+            for step in range(3)
+        ]}
+        self.assertEqual(self.post('/api/public/readings/bulk/', body).json()['created'], 3)
+
+        data = self.post('/api/public/readings/bulk/', body).json()
+        self.assertEqual((data['created'], data['duplicates'], data['failed']), (0, 3, 0))
+        self.assertEqual(data['duplicate_readings'][0], {'index': 0, 'meter_id': 'MTR001'})
+        self.assertEqual(self.meter.readings.count(), 3)
+
+    def test_prune_idempotency_keys(self):
+        old = IdempotencyKey.objects.create(endpoint='reading', key='old', status_code=201, response={})
+        IdempotencyKey.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(hours=25))
+        IdempotencyKey.objects.create(endpoint='reading', key='new', status_code=201, response={})
+
+        self.assertEqual(prune_idempotency_keys(hours=24), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+@override_settings(ALERT_NIGHT_START_HOUR=2, ALERT_NIGHT_END_HOUR=5, ALERT_LEAK_MIN_FLOW=2.0,
+                   ALERT_NO_CONSUMPTION_HOURS=72, ALERT_SPIKE_SIGMAS=4.0, ALERT_SPIKE_MIN_FLOW=50.0)
+class DetectionTests(TestCase):
+    """Alertas del detector incremental al ingerir lecturas"""
+
+    def setUp(self):
+        model = MeterModel.objects.create(name='Modelo A', liters_per_unit=1)
+        self.meter = Meter.objects.create(meter_id='MTR001', model=model, latitude=4.6, longitude=-74.1)
+        # Medianoche local de hace 10 días: las ventanas nocturnas son en hora local
+        day = timezone.localdate() - timedelta(days=10)
+        self.midnight = datetime.combine(day, time(), tzinfo=timezone.get_current_timezone())
+
+    def ingest(self, points):
+        """`points`: [(horas desde self.midnight, valor)]"""
+        return ingest_readings([
+            {'meter_id': 'MTR001', 'accumulated_value': value,
+             'timestamp': self.midnight + timedelta(hours=hours)}
+            for hours, value in points
+        ])
+
+    def alerts(self, kind):
+        return list(Alert.objects.filter(meter=self.meter, kind=kind).order_by('started_at'))
+
+    def test_spike_opens_and_resolves(self):
+        # Diurno (8 h a 20 h): 10 L/h estables, un pico de 200 L/h y vuelta a 10 L/h
+        points = [(8 + step, 10 * step) for step in range(12)]
+        points += [(20, 110 + 200), (21, 110 + 210)]
+        created, _, errors = self.ingest(points)
+        self.assertEqual(errors, [])
+
+        spike, = self.alerts(Alert.SPIKE)
+        self.assertEqual(spike.started_at, self.midnight + timedelta(hours=20))
+        self.assertEqual(spike.value, 200)
+        self.assertEqual(spike.resolved_at, self.midnight + timedelta(hours=21))
+
+    def test_night_leak(self):
+        # 5 L/h toda la noche: se evalúa con la primera lectura tras las 5 h
+        self.ingest([(hour, 5 * hour) for hour in range(7)])
+        leak, = self.alerts(Alert.LEAK)
+        self.assertIsNone(leak.resolved_at)
+        self.assertEqual(leak.value, 5)
+        self.assertIn(Alert.LEAK, MeterDetectionState.objects.get(meter=self.meter).open_alerts)
+
+        # Noche siguiente sin consumo entre las 2 h y las 5 h: se resuelve
+        self.ingest([(24 + hour, 30 + (5 * hour if hour < 2 else 10)) for hour in range(7)])
+        leak.refresh_from_db()
+        self.assertEqual(leak.resolved_at, self.midnight + timedelta(hours=30))
+
+    def test_no_consumption_streak(self):
+        self.ingest([(12 * step, 100) for step in range(6)])
+        self.assertEqual(self.alerts(Alert.NO_CONSUMPTION), [])
+
+        self.ingest([(84, 100)])
+        alert, = self.alerts(Alert.NO_CONSUMPTION)
+        self.assertEqual((alert.started_at, alert.value), (self.midnight, 84))
+
+        self.ingest([(96, 101)])
+        alert.refresh_from_db()
+        self.assertEqual(alert.resolved_at, self.midnight + timedelta(hours=96))
+
+    def test_rollover_and_regression(self):
+        self.ingest([(8, 99990)])
+        _, _, errors = self.ingest([(9, 12)])
+        self.assertEqual(len(errors), 1)
+        rollover, = self.alerts(Alert.ROLLOVER)
+        self.assertEqual(rollover.details, {'previous_value': 99990})
+
+        _, _, errors = self.ingest([(10, 99000)])
+        self.assertEqual(len(errors), 1)
+        regression, = self.alerts(Alert.REGRESSION)
+        self.assertEqual(regression.value, 99000)
+
+    def test_backfill_rejections_do_not_alert(self):
+        self.ingest([(8, 100), (9, 103), (10, 104)])
+        _, _, errors = self.ingest([(8.5, 110), (9.5, 101)])
+        self.assertEqual(len(errors), 2)
+        self.assertFalse(Alert.objects.exists())
+
+    def test_backfill_alerts_reproduces_ingest(self):
+        points = [(hour, 5 * hour) for hour in range(7)]                # fuga
+        points += [(8 + step, 35 + 10 * step) for step in range(12)]   # caudal estable
+        points += [(20, 145 + 200), (21, 355)]                          # pico
+        points += [(21 + 12 * step, 355) for step in range(1, 8)]       # sin consumo
+        points += [(120, 400)]
+        # Por lotes, como llegarían de los dispositivos
+        for start in range(0, len(points), 5):
+            _, _, errors = self.ingest(points[start:start + 5])
+            self.assertEqual(errors, [])
+
+        def snapshot():
+            alerts = sorted(Alert.objects.values_list('kind', 'started_at', 'value', 'resolved_at', 'message'))
+            state = MeterDetectionState.objects.values(
+                'last_reading_at', 'last_value', 'intervals', 'zero_since', 'night', 'open_alerts'
+            ).get(meter=self.meter)
+            return alerts, state
+
+        live = snapshot()
+        self.assertEqual({kind for kind, *_ in live[0]}, {Alert.LEAK, Alert.SPIKE, Alert.NO_CONSUMPTION})
+        self.assertEqual(backfill_alerts(Meter.objects.all()), 1)
+        self.assertEqual(snapshot(), live)
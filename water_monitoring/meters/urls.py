@@ -1,16 +1,21 @@
 # meters/urls.py
 
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'models', views.MeterModelViewSet, basename='metermodel')
 router.register(r'meters', views.MeterViewSet, basename='meter')
 router.register(r'readings', views.ConsumptionReadingViewSet, basename='reading')
+router.register(r'alerts', views.AlertViewSet, basename='alert')
 
 app_name = 'meters'
 
+# Endpoints públicos asíncronos al desplegar con ASGI (ver meters/async_views.py)
+public_views = async_views if settings.PUBLIC_INGEST_ASYNC else views
+
 urlpatterns = [
     # Vistas HTML
     path('', views.dashboard_view, name='dashboard'),
@@ -20,8 +25,9 @@ urlpatterns = [
     path('api/', include(router.urls)),
     
     # API Pública (para sensores/dispositivos)
-    path('api/public/reading/', views.create_reading_public, name='public_reading'),
-    path('api/public/readings/bulk/', views.bulk_readings_public, name='public_bulk_readings'),
+    path('api/public/reading/', public_views.create_reading_public, name='public_reading'),
+    path('api/public/readings/bulk/', public_views.bulk_readings_public, name='public_bulk_readings'),
+    path('api/ingest/status/', views.ingest_status_view, name='ingest_status'),
     
     # Utilidades
     path('api/import-csv/', views.import_csv, name='import_csv'),
@@ -1,24 +1,38 @@
 # meters/views.py
 
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.db.models import Q
-from datetime import datetime, timedelta
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.conf import settings
+from django.db.models import Count, Q
+from datetime import timedelta
 from django.utils import timezone
-import csv
-import io
+import json
 
-from .models import MeterModel, Meter, ConsumptionReading
+from .models import MeterModel, Meter, ConsumptionReading, Alert
 from .serializers import (
     MeterModelSerializer, MeterSerializer, MeterCreateSerializer,
     MeterGeoJSONSerializer, ConsumptionReadingSerializer,
-    ConsumptionReadingCreateSerializer, BulkReadingSerializer
+    ConsumptionReadingCreateSerializer, BulkReadingSerializer, AlertSerializer
 )
+from .idempotency import idempotency_key, run_idempotent
+from .ingest import ingest_reading, ingest_readings
+from .ingest_queue import enqueue_readings, ingest_status
+from .csv_import import CSVImporter, open_text
+from .consumption import consumption_series
+from .dashboard import SECTIONS, meter_dashboard
+from .detection import resolve_alert
+from .fleet import GROUP_BY, fleet_stats
+from .geo import CLUSTER_MAX_ZOOM, MAX_POINTS, clusters, extent, in_bbox, parse_bbox
+from .pagination import ReadingCursorPagination
+from .export import FORMATS as EXPORT_FORMATS, check_format, export_chunks
+from .map_cache import map_geojson_response
+from .rollups import BUCKETS
 
 
 def admin_logout_view(request):
@@ -60,7 +74,9 @@ def admin_panel_view(request):
 
 class MeterModelViewSet(viewsets.ModelViewSet):
     """ViewSet para modelos de contadores"""
-    queryset = MeterModel.objects.all()
+    queryset = MeterModel.objects.annotate(
+        active_meter_count=Count('meters', filter=Q(meters__is_active=True))
+    ).order_by('name')
     serializer_class = MeterModelSerializer
     permission_classes = [IsAuthenticated]
     
@@ -68,7 +84,7 @@ class MeterModelViewSet(viewsets.ModelViewSet):
     def meters(self, request, pk=None):
         """Lista todos los contadores de este modelo"""
         model = self.get_object()
-        meters = model.meters.filter(is_active=True)
+        meters = model.meters.filter(is_active=True).select_related('model').with_reading_summary(days=30)
         serializer = MeterSerializer(meters, many=True)
         return Response(serializer.data)
 
@@ -85,12 +101,83 @@ class MeterViewSet(viewsets.ModelViewSet):
             return MeterGeoJSONSerializer
         return MeterSerializer
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            # Estadísticas a 30 días en la misma consulta (la última lectura
+            # viene del snapshot del contador)
+            queryset = queryset.with_reading_summary(days=30)
+        return queryset
+    
     @action(detail=False, methods=['get'])
     def geojson(self, request):
-        """Retorna todos los contadores en formato GeoJSON para el mapa"""
+        """
+        Retorna todos los contadores en formato GeoJSON para el mapa, desde la
+        caché versionada (ETag/Last-Modified, 304 y gzip/br precomprimido)
+        """
+        return map_geojson_response(
+            request, lambda: MeterGeoJSONSerializer(self.get_queryset(), many=True).data
+        )
+    
+    @action(detail=False, methods=['get'])
+    def viewport(self, request):
+        """
+        Contadores visibles en el mapa: ?bbox=min_lon,min_lat,max_lon,max_lat&zoom=12
+        
+        Con poco zoom y muchos contadores en la vista retorna clusters por
+        celda (conteo, centro y extensión) en lugar de puntos. Sin bbox cubre
+        toda la red e incluye su extensión en 'extent'.
+        """
+        params = request.query_params
+        try:
+            bbox = parse_bbox(params['bbox']) if params.get('bbox') else None
+            zoom = int(params.get('zoom', CLUSTER_MAX_ZOOM))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= zoom <= 22:
+            return Response({'error': 'zoom debe estar entre 0 y 22'}, status=status.HTTP_400_BAD_REQUEST)
+        
         meters = self.get_queryset()
-        serializer = MeterGeoJSONSerializer(meters, many=True)
-        return Response(serializer.data)
+        result = {'zoom': zoom, 'bbox': list(bbox) if bbox is not None else None}
+        if bbox is None:
+            result['extent'] = extent(meters)
+        else:
+            meters = in_bbox(meters, bbox)
+        
+        result['count'] = meters.count()
+        if zoom >= CLUSTER_MAX_ZOOM or result['count'] <= MAX_POINTS:
+            result['clusters'] = []
+            result['meters'] = MeterGeoJSONSerializer(meters, many=True).data
+        else:
+            result['clusters'] = clusters(meters, zoom)
+            result['meters'] = []
+        return Response(result)
+    
+    @action(detail=False, methods=['get'])
+    def fleet_stats(self, request):
+        """
+        Consumo agregado de la red: ?days=30&model=<id>&bbox=min_lon,min_lat,max_lon,max_lat
+        &top=10&group_by=model
+        """
+        params = request.query_params
+        try:
+            days = int(params.get('days', 30))
+            top = min(int(params.get('top', 10)), 100)
+            model_id = int(params['model']) if params.get('model') else None
+            bbox = parse_bbox(params['bbox']) if params.get('bbox') else None
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        group_by = params.get('group_by') or None
+        if group_by is not None and group_by not in GROUP_BY:
+            return Response(
+                {'error': f"group_by debe ser uno de: {', '.join(GROUP_BY)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if days < 1 or top < 0:
+            return Response({'error': 'days y top deben ser positivos'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(fleet_stats(days=days, model_id=model_id, bbox=bbox, top=top, group_by=group_by))
     
     @action(detail=True, methods=['get'])
     def readings(self, request, pk=None):
@@ -115,34 +202,64 @@ class MeterViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def consumption_chart(self, request, pk=None):
-        """Datos para gráfica de consumo diario"""
+        """
+        Datos para gráfica de consumo. Por defecto un punto por lectura;
+        con ?bucket=day|hour suma los litros por día u hora.
+        """
         meter = self.get_object()
         days = int(request.query_params.get('days', 30))
+        bucket = request.query_params.get('bucket') or None
         
-        cutoff_date = timezone.now() - timedelta(days=days)
-        readings = meter.readings.filter(timestamp__gte=cutoff_date).order_by('timestamp')
+        if bucket is not None and bucket not in BUCKETS:
+            return Response(
+                {'error': f"bucket debe ser uno de: {', '.join(BUCKETS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        chart_data = []
-        previous = None
+        cutoff_date = timezone.now() - timedelta(days=days)
+        return Response(consumption_series(meter, cutoff_date, bucket=bucket))
+    
+    @action(detail=True, methods=['get'])
+    def dashboard(self, request, pk=None):
+        """
+        Estadísticas, lecturas recientes y gráfica de un contador en una sola
+        petición: ?sections=stats,readings,chart&days=30&readings_days=7&bucket=day
+        """
+        params = request.query_params
+        try:
+            days = int(params.get('days', 30))
+            readings_days = int(params.get('readings_days', 7))
+        except ValueError:
+            return Response({'error': 'days y readings_days deben ser enteros'}, status=status.HTTP_400_BAD_REQUEST)
         
-        for reading in readings:
-            if previous:
-                consumption = reading.get_consumption_since_last()
-                if consumption:
-                    chart_data.append({
-                        'date': reading.timestamp.date().isoformat(),
-                        'liters': consumption['liters'],
-                        'hours': consumption['hours'],
-                    })
-            previous = reading
+        sections = params.get('sections')
+        sections = sections.split(',') if sections else list(SECTIONS)
+        invalid = [section for section in sections if section not in SECTIONS]
+        if invalid:
+            return Response(
+                {'error': f"sections debe contener solo: {', '.join(SECTIONS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        bucket = params.get('bucket') or None
+        if bucket is not None and bucket not in BUCKETS:
+            return Response(
+                {'error': f"bucket debe ser uno de: {', '.join(BUCKETS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if days < 1 or readings_days < 1:
+            return Response({'error': 'days y readings_days deben ser positivos'}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response(chart_data)
+        data = meter_dashboard(self.get_object(), sections, days=days, readings_days=readings_days, bucket=bucket)
+        if 'readings' in data:
+            data['readings'] = ConsumptionReadingSerializer(data['readings'], many=True).data
+        return Response(data)
 
 
 class ConsumptionReadingViewSet(viewsets.ModelViewSet):
     """ViewSet para lecturas de consumo"""
     queryset = ConsumptionReading.objects.select_related('meter', 'meter__model')
     permission_classes = [IsAuthenticated]
+    pagination_class = ReadingCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -151,16 +268,163 @@ class ConsumptionReadingViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        meter_id = self.request.query_params.get('meter_id')
+        params = self.request.query_params
+        meter_id = params.get('meter_id')
         
         if meter_id:
-            queryset = queryset.filter(meter__meter_id=meter_id)
+            # Uno o varios IDs separados por coma
+            queryset = queryset.filter(meter__meter_id__in=meter_id.split(','))
+        
+        # Rango de fechas opcional: ?from=2024-01-01T00:00:00&to=2024-02-01T00:00:00
+        date_field = serializers.DateTimeField()
+        errors = {}
+        for param, lookup in (('from', 'timestamp__gte'), ('to', 'timestamp__lt')):
+            if params.get(param):
+                try:
+                    queryset = queryset.filter(**{lookup: date_field.to_internal_value(params[param])})
+                except serializers.ValidationError as e:
+                    errors[param] = e.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        
+        if self.action == 'list':
+            queryset = queryset.with_previous_reading()
+        return queryset.order_by('-timestamp', '-id')
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Exporta en streaming las lecturas filtradas (meter_id, from, to) sin
+        paginar: ?fmt=csv|ndjson|parquet. La memoria es constante sin
+        importar el número de filas (ver meters/export.py).
+        """
+        fmt = request.query_params.get('fmt', 'csv')
+        try:
+            check_format(fmt)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        content_type, extension = EXPORT_FORMATS[fmt]
+        filename = f"lecturas_{timezone.localtime().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        response = StreamingHttpResponse(export_chunks(self.get_queryset(), fmt), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class AlertViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet para alertas del detector de anomalías (ver meters/detection.py)
+    
+    Filtros: ?meter_id=MTR001,MTR002&kind=leak,spike&status=open|resolved
+    """
+    queryset = Alert.objects.select_related('meter')
+    serializer_class = AlertSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        
+        if params.get('meter_id'):
+            queryset = queryset.filter(meter__meter_id__in=params['meter_id'].split(','))
+        if params.get('kind'):
+            kinds = params['kind'].split(',')
+            valid = {kind for kind, _ in Alert.KINDS}
+            if not set(kinds) <= valid:
+                raise serializers.ValidationError({'kind': f"Debe ser uno de: {', '.join(sorted(valid))}"})
+            queryset = queryset.filter(kind__in=kinds)
         
-        return queryset.order_by('-timestamp')
+        alert_status = params.get('status')
+        if alert_status not in (None, '', 'open', 'resolved'):
+            raise serializers.ValidationError({'status': 'Debe ser open o resolved'})
+        if alert_status:
+            queryset = queryset.filter(resolved_at__isnull=alert_status == 'open')
+        return queryset
+    
+    @action(detail=True, methods=['post'])
+    def resolve(self, request, pk=None):
+        """Marca como resuelta una alerta abierta"""
+        alert = self.get_object()
+        if not resolve_alert(alert):
+            return Response({'error': 'La alerta ya está resuelta'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(alert).data)
 
 
 # ============= API ENDPOINTS PÚBLICOS (para sensores) =============
 
+PUBLIC_READING = 'public_reading'
+PUBLIC_BULK_READINGS = 'public_bulk_readings'
+
+
+def queued_reading_result(queued, errors):
+    """Respuesta (datos, código) de una lectura encolada"""
+    if errors:
+        return {'success': False, 'errors': errors[0]['errors']}, status.HTTP_400_BAD_REQUEST
+    return {
+        'success': True,
+        'queue_id': queued[0]['queue_id'],
+        'meter_id': queued[0]['meter_id']
+    }, status.HTTP_202_ACCEPTED
+
+
+def queued_readings_result(queued, errors):
+    """Respuesta (datos, código) de un lote encolado"""
+    return {
+        'success': len(errors) == 0,
+        'queued': len(queued),
+        'failed': len(errors),
+        'queued_readings': queued,
+        'errors': errors
+    }, status.HTTP_202_ACCEPTED if len(errors) == 0 else status.HTTP_207_MULTI_STATUS
+
+
+def public_reading_result(reading_data, ingestor=None):
+    """Procesa una lectura del endpoint público: (datos de la respuesta, código)"""
+    if settings.READING_INGEST_MODE == 'queue':
+        return queued_reading_result(*enqueue_readings([reading_data]))
+    
+    result, errors = ingest_reading(reading_data, ingestor)
+    if errors:
+        return {'success': False, 'errors': errors}, status.HTTP_400_BAD_REQUEST
+    # Un reintento de una lectura ya guardada no crea otra fila
+    return {'success': True, **result}, status.HTTP_200_OK if result['duplicate'] else status.HTTP_201_CREATED
+
+
+def public_readings_result(readings_data):
+    """Procesa un lote del endpoint bulk: (datos de la respuesta, código)"""
+    if settings.READING_INGEST_MODE == 'queue':
+        return queued_readings_result(*enqueue_readings(readings_data))
+    
+    created, duplicates, errors = ingest_readings(readings_data)
+    return {
+        'success': len(errors) == 0,
+        'created': len(created),
+        'duplicates': len(duplicates),
+        'failed': len(errors),
+        'created_readings': created,
+        'duplicate_readings': duplicates,
+        'errors': errors
+    }, status.HTTP_201_CREATED if len(errors) == 0 else status.HTTP_207_MULTI_STATUS
+
+
+def idempotent_response(endpoint, request, process, response_class=Response):
+    """
+    Ejecuta `process` respetando el encabezado Idempotency-Key de la petición
+    (ver meters/idempotency.py) y construye la respuesta con `response_class`.
+    """
+    try:
+        key = idempotency_key(request)
+    except ValueError as e:
+        return response_class({'success': False, 'errors': {'idempotency_key': [str(e)]}},
+                              status=status.HTTP_400_BAD_REQUEST)
+    data, status_code, replayed = run_idempotent(endpoint, key, process)
+    response = response_class(data, status=status_code)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def create_reading_public(request):
@@ -172,21 +436,15 @@ def create_reading_public(request):
         "accumulated_value": 12345.67,
         "timestamp": "2024-01-15T10:30:00Z"  # Opcional
     }
+    
+    Reenviar una lectura ya guardada (mismo contador y fecha) responde 200
+    con duplicate=true sin crear otra fila. Con el encabezado Idempotency-Key
+    los reintentos reciben la respuesta original.
+    
+    Con READING_INGEST_MODE='queue' la lectura se encola y se responde 202
+    (ver meters/ingest_queue.py).
     """
-    serializer = ConsumptionReadingCreateSerializer(data=request.data)
-    if serializer.is_valid():
-        reading = serializer.save()
-        return Response({
-            'success': True,
-            'reading_id': reading.id,
-            'meter_id': reading.meter.meter_id,
-            'accumulated_value': float(reading.accumulated_value),
-            'timestamp': reading.timestamp
-        }, status=status.HTTP_201_CREATED)
-    return Response({
-        'success': False,
-        'errors': serializer.errors
-    }, status=status.HTTP_400_BAD_REQUEST)
+    return idempotent_response(PUBLIC_READING, request, lambda: public_reading_result(request.data))
 
 
 @api_view(['POST'])
@@ -205,6 +463,12 @@ def bulk_readings_public(request):
             ...
         ]
     }
+    
+    Las lecturas que ya existían (mismo contador y fecha) se reportan en
+    duplicate_readings sin insertarse. Admite el encabezado Idempotency-Key.
+    
+    Con READING_INGEST_MODE='queue' las lecturas con campos válidos se
+    encolan y se responde 202 (207 si alguna no lo es).
     """
     serializer = BulkReadingSerializer(data=request.data)
     if not serializer.is_valid():
@@ -213,33 +477,28 @@ def bulk_readings_public(request):
             'errors': serializer.errors
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    readings_data = serializer.validated_data['readings']
-    created = []
-    errors = []
-    
-    for idx, reading_data in enumerate(readings_data):
-        reading_serializer = ConsumptionReadingCreateSerializer(data=reading_data)
-        if reading_serializer.is_valid():
-            reading = reading_serializer.save()
-            created.append({
-                'index': idx,
-                'reading_id': reading.id,
-                'meter_id': reading.meter.meter_id
-            })
-        else:
-            errors.append({
-                'index': idx,
-                'meter_id': reading_data.get('meter_id', 'unknown'),
-                'errors': reading_serializer.errors
-            })
+    readings = serializer.validated_data['readings']
+    return idempotent_response(PUBLIC_BULK_READINGS, request, lambda: public_readings_result(readings))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ingest_status_view(request):
+    """
+    Estado de la cola de ingesta
+    GET /api/ingest/status/?minutes=15
     
-    return Response({
-        'success': len(errors) == 0,
-        'created': len(created),
-        'failed': len(errors),
-        'created_readings': created,
-        'errors': errors
-    }, status=status.HTTP_201_CREATED if len(errors) == 0 else status.HTTP_207_MULTI_STATUS)
+    Lecturas pendientes y lag de la cola, y lecturas procesadas, insertadas y
+    rechazadas por el worker en los últimos `minutes` minutos.
+    """
+    try:
+        minutes = int(request.query_params.get('minutes', 15))
+    except ValueError:
+        minutes = 0
+    if not 1 <= minutes <= 1440:
+        return Response({'error': 'minutes debe ser un entero entre 1 y 1440'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return Response(ingest_status(minutes))
 
 
 # ============= IMPORTACIÓN CSV =============
@@ -251,6 +510,9 @@ def import_csv(request):
     Importa lecturas desde un archivo CSV
     CSV Format: meter_id,accumulated_value,timestamp
     Ejemplo: MTR001,12345.67,2024-01-15 10:30:00
+    
+    El archivo se procesa en streaming y por bloques (ver meters/csv_import.py).
+    Con ?stream=1 la respuesta es NDJSON con una línea de progreso por bloque.
     """
     if 'file' not in request.FILES:
         return Response({
@@ -266,50 +528,40 @@ def import_csv(request):
             'error': 'El archivo debe ser CSV'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        decoded_file = csv_file.read().decode('utf-8')
-        io_string = io.StringIO(decoded_file)
-        reader = csv.DictReader(io_string)
-        
-        created = []
-        errors = []
-        
-        for idx, row in enumerate(reader, start=1):
+    importer = CSVImporter()
+    text_stream = open_text(csv_file.file)
+    
+    # ?stream=1: progreso por bloques como NDJSON (una línea por bloque)
+    if request.query_params.get('stream'):
+        def progress_lines():
             try:
-                meter = Meter.objects.get(meter_id=row['meter_id'], is_active=True)
-                
-                # Parsear timestamp
-                timestamp_str = row.get('timestamp', '')
-                if timestamp_str:
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                else:
-                    timestamp = timezone.now()
-                
-                reading = ConsumptionReading.objects.create(
-                    meter=meter,
-                    accumulated_value=float(row['accumulated_value']),
-                    timestamp=timestamp
-                )
-                created.append(reading.id)
-                
-            except Meter.DoesNotExist:
-                errors.append(f"Fila {idx}: Contador '{row.get('meter_id')}' no encontrado")
-            except KeyError as e:
-                errors.append(f"Fila {idx}: Falta columna {str(e)}")
-            except ValueError as e:
-                errors.append(f"Fila {idx}: Error de valor - {str(e)}")
+                for progress in importer.run(text_stream):
+                    yield json.dumps(progress, cls=DjangoJSONEncoder) + '\n'
             except Exception as e:
-                errors.append(f"Fila {idx}: {str(e)}")
+                yield json.dumps({
+                    'done': True,
+                    'success': False,
+                    'error': f'Error procesando archivo: {str(e)}'
+                }) + '\n'
         
+        response = StreamingHttpResponse(progress_lines(), content_type='application/x-ndjson')
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    try:
+        result = importer.import_all(text_stream)
         return Response({
-            'success': len(errors) == 0,
-            'created': len(created),
-            'failed': len(errors),
-            'errors': errors
+            'success': result['success'],
+            'processed': result['processed'],
+            'created': result['created'],
+            'duplicates': result['duplicates'],
+            'failed': result['failed'],
+            'errors': result['errors'],
+            'errors_truncated': result['errors_truncated'],
         })
         
     except Exception as e:
         return Response({
             'success': False,
             'error': f'Error procesando archivo: {str(e)}'
-        }, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        }, status=status.HTTP_400_BAD_REQUEST)
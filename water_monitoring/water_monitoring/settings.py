@@ -1,6 +1,7 @@
 # water_monitoring/settings.py
 
 import os
+import tempfile
 from pathlib import Path
 from decouple import config
 
@@ -107,6 +108,48 @@ ADMIN_USERNAME = config('ADMIN_USERNAME', default='admin')
 ADMIN_EMAIL = config('ADMIN_EMAIL', default='admin@example.com')
 ADMIN_PASSWORD = config('ADMIN_PASSWORD', default='admin123')
 
+# Caché (GeoJSON del mapa). El backend por archivos se comparte entre los
+# workers de gunicorn de un servidor; con varios servidores usa Redis
+# (CACHE_BACKEND=django.core.cache.backends.redis.RedisCache,
+# CACHE_LOCATION=redis://127.0.0.1:6379/1, requiere pip install redis)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'water_monitoring_cache')),
+    }
+}
+# Segundos mínimos entre regeneraciones del GeoJSON cuando llegan lecturas seguidas
+GEOJSON_REBUILD_INTERVAL = config('GEOJSON_REBUILD_INTERVAL', default=5, cast=int)
+
+# Particiones mensuales de lecturas (PostgreSQL): meses creados por adelantado
+# y meses conservados (0 = sin retención); con READING_ARCHIVE_DIR las
+# particiones vencidas se archivan como CSV comprimido antes de eliminarlas
+READING_PARTITIONS_AHEAD = config('READING_PARTITIONS_AHEAD', default=3, cast=int)
+READING_RETENTION_MONTHS = config('READING_RETENTION_MONTHS', default=0, cast=int)
+READING_ARCHIVE_DIR = config('READING_ARCHIVE_DIR', default='')
+
+# Ingesta de los endpoints públicos: 'sync' inserta en la petición; 'queue'
+# encola las lecturas (respuesta 202) para el worker process_ingest_queue
+READING_INGEST_MODE = config('READING_INGEST_MODE', default='sync')
+INGEST_BATCH_SIZE = config('INGEST_BATCH_SIZE', default=5000, cast=int)
+INGEST_POLL_INTERVAL = config('INGEST_POLL_INTERVAL', default=1.0, cast=float)
+INGEST_METRICS_RETENTION_DAYS = config('INGEST_METRICS_RETENTION_DAYS', default=7, cast=int)
+# Horas que se guarda la respuesta de una petición con Idempotency-Key
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int)
+# Endpoints públicos de ingesta asíncronos (desplegando con uvicorn/daphne)
+PUBLIC_INGEST_ASYNC = config('PUBLIC_INGEST_ASYNC', default=False, cast=bool)
+
+# Detector de anomalías (meters/detection.py): ventana nocturna en horas
+# locales y caudal nocturno mínimo (L/h) que se considera posible fuga, horas
+# sin consumo antes de alertar, y desviaciones sobre la media móvil del caudal
+# (con un exceso mínimo en L/h) que cuentan como consumo anómalo
+ALERT_NIGHT_START_HOUR = config('ALERT_NIGHT_START_HOUR', default=2, cast=int)
+ALERT_NIGHT_END_HOUR = config('ALERT_NIGHT_END_HOUR', default=5, cast=int)
+ALERT_LEAK_MIN_FLOW = config('ALERT_LEAK_MIN_FLOW', default=2.0, cast=float)
+ALERT_NO_CONSUMPTION_HOURS = config('ALERT_NO_CONSUMPTION_HOURS', default=72, cast=int)
+ALERT_SPIKE_SIGMAS = config('ALERT_SPIKE_SIGMAS', default=4.0, cast=float)
+ALERT_SPIKE_MIN_FLOW = config('ALERT_SPIKE_MIN_FLOW', default=50.0, cast=float)
+
 # Authentication URLs
 LOGIN_URL = '/admin/'
 LOGIN_REDIRECT_URL = '/'